@@ -0,0 +1,84 @@
+"""Watchlist-alerts: gevolgde producten server-side matchen tegen nieuwe product_history rijen.
+
+Tijdens de ingest (_update_catalog_and_history) gaan de net geschreven history-rijen naar
+publish(): die haalt alleen de watchlist-regels op van de producten die gewijzigd zijn (index
+op watchlists.product_id), groepeert ze per product en schrijft elke treffer als rij in de
+inbox (alerts) van de gebruiker. Kosten per ingest: O(wijzigingen + treffers), los van het
+aantal gebruikers; clients lezen alleen hun eigen inbox.
+
+Regels:
+  any_change          elke history-entry (prijs, naam, bonus, ingrediënten, uit assortiment)
+  price_change        de prijs is gewijzigd
+  price_drop          de prijs is gedaald, met minstens threshold_pct procent (standaard elke daling)
+  bonus_start         het product is in de bonus gegaan
+  ingredients_change  de ingrediënten zijn gewijzigd
+"""
+import logging
+from collections import defaultdict
+
+import database
+
+logger = logging.getLogger(__name__)
+
+
+def _price_drop_pct(changes):
+    price = changes.get("price") or {}
+    old, new = price.get("old"), price.get("new")
+    if not old or new is None or new >= old:
+        return None
+    return (old - new) / old * 100
+
+
+RULES = {
+    "any_change": lambda changes, event_type, threshold: event_type != "unchanged",
+    "price_change": lambda changes, event_type, threshold: "price" in changes,
+    "price_drop": lambda changes, event_type, threshold: (
+        _price_drop_pct(changes) is not None and _price_drop_pct(changes) >= float(threshold or 0)
+    ),
+    "bonus_start": lambda changes, event_type, threshold: bool((changes.get("bonus") or {}).get("new")),
+    "ingredients_change": lambda changes, event_type, threshold: "ingredients" in changes,
+}
+
+
+def rule_matches(watch, history):
+    """Of een watchlist-regel matcht op een history-rij."""
+    check = RULES.get(watch.get("rule"))
+    if check is None:
+        return False
+    return check(history.get("changes") or {}, history.get("event_type"), watch.get("threshold_pct"))
+
+
+def match_alerts(watches, history):
+    """Alert-rijen voor de history-rijen die op een watchlist-regel matchen."""
+    by_product = defaultdict(list)
+    for watch in watches:
+        by_product[watch["product_id"]].append(watch)
+    rows = []
+    for h in history:
+        for watch in by_product.get(h["product_id"], ()):
+            if rule_matches(watch, h):
+                rows.append({
+                    "user_id": watch["user_id"],
+                    "watchlist_id": watch["id"],
+                    "product_id": h["product_id"],
+                    "history_id": h.get("id"),
+                    "rule": watch["rule"],
+                    "event_type": h["event_type"],
+                    "changes": h.get("changes") or {},
+                })
+    return rows
+
+
+def publish(history):
+    """Schrijf alerts voor net ingevoegde history-rijen. Retourneert het aantal alerts."""
+    if not history or not database._check_watchlists():
+        return 0
+    watches = database.get_watchers({h["product_id"] for h in history})
+    rows = match_alerts(watches, history)
+    database.insert_alerts(rows)
+    if rows:
+        logger.info(
+            "alerts: %d voor %d gebruikers (%d wijzigingen, %d regels)",
+            len(rows), len({r["user_id"] for r in rows}), len(history), len(watches),
+        )
+    return len(rows)
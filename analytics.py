@@ -0,0 +1,227 @@
+"""Prijsstatistieken en anomalieën per product, berekend na elke ingest.
+
+product_history bevat alleen wijzigingen; de prijs (en bonusstatus) van een product is daarmee
+een trapfunctie in de tijd. compute_price_stats() zet die voor alle producten van een retailer
+in één keer om naar een dagrooster (producten x dagen) met NumPy (searchsorted op
+(product, dag)) en berekent daaruit per product:
+  - min/max/mediaan over 30, 90 en 365 dagen;
+  - volatiliteit over 90 dagen (standaardafwijking / gemiddelde van de dagprijzen);
+  - het aantal prijswijzigingen in 365 dagen, de laatste wijziging en dagen sindsdien;
+  - het aandeel bonusdagen over 90 dagen;
+  - de laatste prijssprong als robuuste z-score (0.6745 * afwijking / MAD) ten opzichte van de
+    dagprijzen in de 90 dagen vóór die sprong; boven ANOMALY_K is het een anomalie.
+Het resultaat staat in product_price_stats, zodat het dashboard erop kan sorteren en filteren.
+
+Alles opnieuw berekenen:
+  python3 analytics.py [retailer ...]
+"""
+import logging
+import warnings
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import database
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = (30, 90, 365)
+BASELINE_DAYS = 90
+# Dagrooster: het langste venster plus de basisperiode vóór een sprong aan het begin daarvan.
+GRID_DAYS = max(WINDOWS) + BASELINE_DAYS
+ANOMALY_K = 3.5
+# Ondergrens voor de MAD als fractie van de mediaan: bij een maandenlang vaste prijs is de MAD 0
+# en zou elke wijziging een anomalie zijn.
+MAD_FLOOR = 0.02
+MIN_BASELINE_DAYS = 7
+CATALOG_FIELDS = ("id", "retailer", "price", "is_bonus", "first_seen_at")
+HISTORY_COLUMNS = "product_id, created_at, event_type, changes, price_at_snapshot"
+
+
+def _days(timestamps):
+    """ISO-timestamps (UTC) -> dagen sinds epoch als float-array."""
+    values = np.array([t[:19] for t in timestamps], dtype="datetime64[s]")
+    return values.astype(np.float64) / 86400.0
+
+
+def _step_grid(product_idx, times, values, n_products, start_day):
+    """Waarde per product per dag (n_products x GRID_DAYS) uit gesorteerde events (product, tijd).
+    Elke dag krijgt de waarde van het laatste event op of vóór die dag; events vóór het rooster
+    tellen als dag -1. Elk product moet minstens één event hebben."""
+    span = GRID_DAYS + 2
+    rel = np.clip(np.floor(times - start_day), -1, GRID_DAYS)
+    keys = product_idx * span + rel
+    queries = (np.arange(n_products)[:, None] * span + np.arange(GRID_DAYS)[None, :]).ravel()
+    idx = np.searchsorted(keys, queries, side="right") - 1
+    return values[idx].reshape(n_products, GRID_DAYS)
+
+
+def _events(history, index, catalog, now_day):
+    """Prijs- en bonus-events per product als arrays, inclusief een beginwaarde (dag -inf) per product.
+    Retourneert (price_events, bonus_events, changes); changes zijn de echte prijswijzigingen
+    (product, tijd, oude prijs, nieuwe prijs)."""
+    first_price_old = {}
+    first_bonus_old = {}
+    p_idx, p_t, p_v = [], [], []
+    b_idx, b_t, b_v = [], [], []
+    c_idx, c_t, c_old, c_new = [], [], [], []
+    times = _days([h["created_at"] for h in history]) if history else np.empty(0)
+    # De beginwaarde moet de oude waarde van de vroegste wijziging zijn; niet afhankelijk maken van
+    # de volgorde waarin de aanroeper de history aanlevert.
+    order = np.argsort(times, kind="stable")
+    for k in order:
+        h, t = history[k], times[k]
+        i = index.get(h["product_id"])
+        if i is None:
+            continue
+        changes = h.get("changes") or {}
+        price = changes.get("price")
+        if h.get("event_type") == "first_seen" and h.get("price_at_snapshot") is not None:
+            p_idx.append(i), p_t.append(t), p_v.append(float(h["price_at_snapshot"]))
+        elif price and price.get("new") is not None:
+            first_price_old.setdefault(i, price.get("old"))
+            p_idx.append(i), p_t.append(t), p_v.append(float(price["new"]))
+            if price.get("old") is not None:
+                c_idx.append(i), c_t.append(t), c_old.append(float(price["old"])), c_new.append(float(price["new"]))
+        bonus = changes.get("bonus")
+        if bonus:
+            first_bonus_old.setdefault(i, bool(bonus.get("old")))
+            b_idx.append(i), b_t.append(t), b_v.append(float(bool(bonus.get("new"))))
+
+    # Beginwaarde: de oude waarde van de eerste wijziging, anders de huidige catalogwaarde.
+    for i, row in enumerate(catalog):
+        start_price = first_price_old.get(i)
+        if start_price is None:
+            start_price = row.get("price")
+        p_idx.append(i), p_t.append(-np.inf), p_v.append(np.nan if start_price is None else float(start_price))
+        start_bonus = first_bonus_old.get(i, bool(row.get("is_bonus")))
+        b_idx.append(i), b_t.append(-np.inf), b_v.append(float(start_bonus))
+
+    def arrays(idx, t, v):
+        idx, t, v = np.array(idx, dtype=np.int64), np.array(t, dtype=np.float64), np.array(v, dtype=np.float64)
+        order = np.lexsort((t, idx))
+        return idx[order], t[order], v[order]
+
+    changes = tuple(np.array(a, dtype=np.float64) for a in (c_idx, c_t, c_old, c_new))
+    return arrays(p_idx, p_t, p_v), arrays(b_idx, b_t, b_v), changes
+
+
+def _round(values, digits=4):
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+def compute_price_stats(catalog, history, now=None):
+    """Statistieken per catalog-rij (zie de moduledocstring). catalog: rijen met CATALOG_FIELDS;
+    history: product_history rijen (product_id, created_at, event_type, changes, price_at_snapshot)
+    van ten minste de laatste GRID_DAYS dagen. Retourneert product_price_stats rijen."""
+    if not catalog:
+        return []
+    now = now or datetime.now(timezone.utc)
+    now_day = now.timestamp() / 86400.0
+    start_day = np.floor(now_day) - (GRID_DAYS - 1)
+    n = len(catalog)
+    index = {row["id"]: i for i, row in enumerate(catalog)}
+    (p_idx, p_t, p_v), (b_idx, b_t, b_v), (c_idx, c_t, c_old, c_new) = _events(history, index, catalog, now_day)
+
+    prices = _step_grid(p_idx, p_t, p_v, n, start_day)
+    bonus = _step_grid(b_idx, b_t, b_v, n, start_day)
+    # Dagen vóór first_seen_at bestaan niet voor het product.
+    first_seen = np.array(
+        [_days([r["first_seen_at"]])[0] if r.get("first_seen_at") else -np.inf for r in catalog]
+    )
+    day_numbers = start_day + np.arange(GRID_DAYS)
+    missing = day_numbers[None, :] < np.floor(first_seen)[:, None]
+    prices[missing] = np.nan
+    bonus[missing] = np.nan
+
+    # Laatste prijswijziging per product en het aantal wijzigingen in 365 dagen.
+    c_idx = c_idx.astype(np.int64)
+    last_change = np.full(n, -np.inf)
+    np.maximum.at(last_change, c_idx, c_t)
+    recent = c_t >= now_day - 365
+    change_count = np.bincount(c_idx[recent], minlength=n)
+    is_last = np.zeros(len(c_idx), dtype=bool)
+    if len(c_idx):
+        is_last = c_t == last_change[c_idx]
+    jump_old = np.full(n, np.nan)
+    jump_new = np.full(n, np.nan)
+    jump_old[c_idx[is_last]] = c_old[is_last]
+    jump_new[c_idx[is_last]] = c_new[is_last]
+    has_change = np.isfinite(last_change)
+
+    # Basisperiode: de BASELINE_DAYS dagen vóór de laatste wijziging.
+    change_day = np.where(has_change, np.floor(last_change), -np.inf)
+    in_baseline = (day_numbers[None, :] < change_day[:, None]) & (day_numbers[None, :] >= change_day[:, None] - BASELINE_DAYS)
+    baseline = np.where(in_baseline, prices, np.nan)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # lege vensters geven NaN
+        stats = {}
+        for w in WINDOWS:
+            window = prices[:, -w:]
+            stats[f"min_{w}d"] = np.nanmin(window, axis=1)
+            stats[f"max_{w}d"] = np.nanmax(window, axis=1)
+            stats[f"median_{w}d"] = np.nanmedian(window, axis=1)
+        window = prices[:, -90:]
+        volatility = np.nanstd(window, axis=1) / np.nanmean(window, axis=1)
+        bonus_share = np.nanmean(bonus[:, -90:], axis=1)
+
+        base_median = np.nanmedian(baseline, axis=1)
+        mad = np.nanmedian(np.abs(baseline - base_median[:, None]), axis=1)
+        mad = np.maximum(mad, MAD_FLOOR * base_median)
+        zscore = 0.6745 * (jump_new - base_median) / mad
+        baseline_days = np.sum(~np.isnan(baseline), axis=1)
+    zscore[baseline_days < MIN_BASELINE_DAYS] = np.nan
+    jump_pct = (jump_new - jump_old) / jump_old * 100
+    since = np.where(has_change, last_change, first_seen)
+    days_since = np.where(np.isfinite(since), np.floor(now_day - since), np.nan)
+
+    computed_at = now.isoformat()
+    columns = {name: _round(values) for name, values in stats.items()}
+    columns["volatility_90d"] = _round(volatility)
+    columns["bonus_share_90d"] = _round(bonus_share, 3)
+    columns["last_change_pct"] = _round(jump_pct, 1)
+    columns["change_zscore"] = _round(zscore, 2)
+    result = []
+    for i, row in enumerate(catalog):
+        item = {
+            "product_id": row["id"],
+            "retailer": row["retailer"],
+            "price": row.get("price"),
+            **{name: values[i] for name, values in columns.items()},
+            "price_changes_365d": int(change_count[i]),
+            "last_price_change_at": (
+                (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=float(last_change[i]))).isoformat()
+                if has_change[i] else None
+            ),
+            "days_since_change": None if np.isnan(days_since[i]) else int(days_since[i]),
+            "is_anomaly": bool(abs(zscore[i]) > ANOMALY_K) if not np.isnan(zscore[i]) else False,
+            "computed_at": computed_at,
+        }
+        result.append(item)
+    return result
+
+
+def update_price_stats(retailer, now=None):
+    """Bereken en bewaar de statistieken van alle producten van een retailer. Retourneert het aantal rijen."""
+    now = now or datetime.now(timezone.utc)
+    catalog = list(database.iter_catalog_products(retailer, fields=CATALOG_FIELDS))
+    since = (now - timedelta(days=GRID_DAYS)).isoformat()
+    history = list(database.iter_product_history(retailer, since=since, columns=HISTORY_COLUMNS))
+    rows = compute_price_stats(catalog, history, now=now)
+    database.upsert_price_stats(rows)
+    anomalies = sum(1 for r in rows if r["is_anomaly"])
+    logger.info("prijsstatistieken %s: %d producten, %d anomalieën", retailer, len(rows), anomalies)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    from retailers import RETAILERS
+    for slug in sys.argv[1:] or [slug for slug, info in RETAILERS.items() if info["active"]]:
+        print(f"{slug}: {update_price_stats(slug)} producten bijgewerkt")
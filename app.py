@@ -1,30 +1,71 @@
+import hashlib
+import hmac
 import os
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime
 from functools import wraps
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, render_template, redirect, url_for, flash, request, abort, session, jsonify, send_from_directory
+from flask import Flask, render_template, redirect, url_for, flash, request, abort, session, jsonify, send_from_directory, g, stream_with_context
+
+try:
+    import brotli
+except ImportError:  # optioneel: zonder brotli wordt alleen gzip aangeboden
+    brotli = None
 import database
-from retailers import RETAILERS, get_fetcher, enrich_products_with_ingredients
+import instrumentation
+import search
+from retailers import RETAILERS
 
 FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "frontend", "dist")
 
 app = Flask(__name__, static_folder=FRONTEND_DIR, static_url_path="")
 app.secret_key = os.environ.get("SECRET_KEY", "broodradar-dev-key")
+instrumentation.init_app(app)
 
 app.jinja_env.globals["RETAILERS"] = RETAILERS
 
 
+def _store_session(response):
+    """Bewaar tokens en e-mail uit een Supabase auth-response in de Flask-sessie."""
+    session["access_token"] = response.session.access_token
+    session["refresh_token"] = response.session.refresh_token
+    session["user_email"] = response.user.email
+
+
+def _session_user():
+    """Valideer de access token uit de sessie; ververs hem met de refresh token als hij verlopen is.
+    Retourneert de user dict, of None (sessie gewist) als er geen geldige sessie is."""
+    access_token = session.get("access_token")
+    if not access_token:
+        return None
+    try:
+        return database.get_user_from_token(access_token)
+    except Exception:
+        pass
+    refresh_token = session.get("refresh_token")
+    if refresh_token:
+        try:
+            response = database.refresh_session(refresh_token)
+            _store_session(response)
+            return database.get_user_from_token(response.session.access_token)
+        except Exception:
+            pass
+    session.clear()
+    return None
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        access_token = session.get("access_token")
-        if not access_token:
-            return redirect(url_for("login"))
-        try:
-            database.get_user_from_token(access_token)
-        except Exception:
-            session.clear()
+        with instrumentation.span("auth"):
+            g.user = _session_user()
+        if not g.user:
             return redirect(url_for("login"))
         return f(*args, **kwargs)
     return decorated_function
@@ -37,12 +78,8 @@ def inject_user_email():
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
-    if session.get("access_token"):
-        try:
-            database.get_user_from_token(session["access_token"])
-            return redirect(url_for("dashboard"))
-        except Exception:
-            session.clear()
+    if _session_user():
+        return redirect(url_for("dashboard"))
     if request.method == "POST":
         email = (request.form.get("email") or "").strip()
         password = request.form.get("password") or ""
@@ -51,9 +88,7 @@ def login():
             return render_template("login.html")
         try:
             response = database.sign_in(email, password)
-            session["access_token"] = response.session.access_token
-            session["refresh_token"] = response.session.refresh_token
-            session["user_email"] = response.user.email
+            _store_session(response)
             return redirect(url_for("dashboard"))
         except Exception as e:
             flash("Inloggen mislukt. Controleer je gegevens.", "error")
@@ -89,8 +124,13 @@ def retailer_detail(slug):
     info = RETAILERS[slug]
     snapshots = database.get_snapshots(retailer=slug)
     snapshot = snapshots[0] if snapshots else None
-    products = database.get_latest_snapshot_products(retailer=slug) if snapshot else []
-
+    if not snapshot:
+        products = []
+    elif database._check_product_catalog():
+        # De catalog bevat ook de partiële refreshes na het laatste snapshot.
+        products = database.get_catalog_products(slug, filters={"is_available": True})
+    else:
+        products = database.get_latest_snapshot_products(retailer=slug)
     categories = sorted(set(p["sub_category"] for p in products if p.get("sub_category")))
     brands = sorted(set(p["brand"] for p in products if p.get("brand")))
 
@@ -108,6 +148,7 @@ def retailer_detail(slug):
 @app.route("/retailer/<slug>/snapshot/new", methods=["POST"])
 @login_required
 def snapshot_new(slug):
+    import pipeline
     if slug not in RETAILERS:
         abort(404)
 
@@ -117,11 +158,8 @@ def snapshot_new(slug):
         return redirect(url_for("retailer_detail", slug=slug))
 
     try:
-        fetcher = get_fetcher(slug)
-        products = fetcher.fetch_all_products()
-        enrich_products_with_ingredients(fetcher, products)
-        database.create_snapshot(products, retailer=slug)
-        flash(f"Snapshot aangemaakt met {len(products)} producten.", "success")
+        run = pipeline.run_snapshot(slug)
+        flash(f"Snapshot aangemaakt met {run['product_count']} producten.", "success")
     except NotImplementedError as e:
         flash(str(e), "error")
     except Exception as e:
@@ -197,18 +235,240 @@ def vergelijk():
 def api_login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        access_token = session.get("access_token")
-        if not access_token:
+        if not session.get("access_token"):
             return jsonify({"error": "Not authenticated"}), 401
-        try:
-            database.get_user_from_token(access_token)
-        except Exception:
-            session.clear()
+        with instrumentation.span("auth"):
+            g.user = _session_user()
+        if not g.user:
             return jsonify({"error": "Token expired"}), 401
         return f(*args, **kwargs)
     return decorated_function
 
 
+# ---------------------------------------------------------------------------
+# Streaming JSON en compressie
+# ---------------------------------------------------------------------------
+
+STREAM_CHUNK_SIZE = 64 * 1024
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/csv"}
+
+
+def _json_chunks(value):
+    """Serialiseer value incrementeel naar JSON-bytes. Lijsten en generators worden
+    element voor element geschreven, dicts sleutel voor sleutel; de rest in één keer."""
+    if isinstance(value, dict):
+        yield b"{"
+        for i, (key, item) in enumerate(value.items()):
+            yield (b"," if i else b"") + app.json.dumps(str(key)).encode() + b":"
+            yield from _json_chunks(item)
+        yield b"}"
+    elif isinstance(value, (list, tuple)) or hasattr(value, "__next__"):
+        yield b"["
+        for i, item in enumerate(value):
+            if i:
+                yield b","
+            yield from _json_chunks(item)
+        yield b"]"
+    else:
+        yield app.json.dumps(value).encode()
+
+
+def _buffered(chunks, size=STREAM_CHUNK_SIZE):
+    """Bundel kleine stukjes tot blokken van ongeveer size bytes."""
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        if len(buf) >= size:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
+
+
+def json_stream(value):
+    """Streaming JSON-response (chunked) zonder het volledige resultaat te bufferen."""
+    return app.response_class(
+        stream_with_context(_buffered(_json_chunks(value))),
+        mimetype="application/json",
+    )
+
+
+def _negotiate_encoding():
+    """Kies de content-encoding op basis van Accept-Encoding (brotli voor gzip). None = geen compressie."""
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(available)
+
+
+def _compressor(encoding):
+    if encoding == "br":
+        c = brotli.Compressor(quality=4)
+        return c.process, c.finish
+    c = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return c.compress, c.flush
+
+
+def _compress_chunks(chunks, encoding):
+    compress, finish = _compressor(encoding)
+    for chunk in chunks:
+        out = compress(chunk)
+        if out:
+            yield out
+    yield finish()
+
+
+@app.after_request
+def _compress_response(response):
+    """Comprimeer JSON- en CSV-responses (ook gestreamde) met de onderhandelde encoding."""
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.status_code != 200:
+        return response
+    response.vary.add("Accept-Encoding")
+    if "Content-Encoding" in response.headers:
+        return response
+    encoding = _negotiate_encoding()
+    if not encoding:
+        return response
+    if response.is_streamed:
+        response.response = _compress_chunks(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        compress, finish = _compressor(encoding)
+        response.set_data(compress(data) + finish())
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        # Strong ETags moeten per content-encoding verschillen.
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
+
+
+# ---------------------------------------------------------------------------
+# Response cache (ETag per data-generatie)
+# ---------------------------------------------------------------------------
+
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+RESPONSE_CACHE_MAX_ENTRY_BYTES = 4 * 1024 * 1024
+# Headers die samen met de body in de cache worden bewaard.
+CACHED_HEADERS = ("X-Next-Cursor",)
+
+
+class _ResponseCache:
+    """LRU-cache van (body, headers) voor JSON-responses, begrensd op aantal entries en totaal aantal bytes."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body, headers):
+        if len(body) > RESPONSE_CACHE_MAX_ENTRY_BYTES:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = (body, headers)
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _key, (evicted, _headers) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+_response_cache = _ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+
+
+def _tee_into_cache(chunks, key, headers):
+    """Geef gestreamde chunks door en bewaar de body in de cache als hij klein genoeg blijft.
+    Een fout in de stream breekt de response af en komt niet in de cache (geen afgekapte 200)."""
+    parts = []
+    size = 0
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size > RESPONSE_CACHE_MAX_ENTRY_BYTES:
+                parts = None
+            else:
+                parts.append(chunk)
+        yield chunk
+    if parts is not None:
+        _response_cache.put(key, b"".join(parts), headers)
+
+
+def _cache_lookup(generation):
+    """(etag, response) voor de huidige request: response is een 304, de gecachte body of
+    None als het antwoord nog berekend moet worden."""
+    key = request.full_path
+    # De generatie komt uit retailer_generations, die elk schrijfpad ophoogt (zie
+    # database.get_generation): dezelfde ETag betekent in elk proces dezelfde data en een 304 werkt
+    # ook na een wissel van instance. Een ander proces ziet een wijziging binnen
+    # GENERATION_SYNC_INTERVAL.
+    etag = hashlib.sha1(f"{generation}|{key}".encode()).hexdigest()
+    encoding = _negotiate_encoding()
+    if request.if_none_match.contains(etag) or request.if_none_match.contains(f"{etag}-{encoding}"):
+        if encoding and request.if_none_match.contains(f"{etag}-{encoding}"):
+            etag = f"{etag}-{encoding}"
+        return etag, app.response_class(status=304)
+    entry = _response_cache.get((key, generation))
+    if entry is None:
+        return etag, None
+    body, headers = entry
+    return etag, app.response_class(body, mimetype="application/json", headers=headers)
+
+
+def _cache_store(response, generation):
+    """Bewaar een vers berekend 200-antwoord (gestreamd: zodra de stream klaar is)."""
+    key = (request.full_path, generation)
+    headers = {h: response.headers[h] for h in CACHED_HEADERS if h in response.headers}
+    if response.is_streamed:
+        response.response = _tee_into_cache(response.response, key, headers)
+    else:
+        _response_cache.put(key, response.get_data(), headers)
+
+
+def _cache_headers(response, etag):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cached_response(scope=None):
+    """Cache een GET-endpoint op de data-generatie van een retailer.
+
+    scope(**view_kwargs) geeft de retailer waarvan het antwoord afhangt, of None voor alle
+    retailers. Een bijpassende If-None-Match krijgt een 304 zonder databasequery."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            retailer = scope(**kwargs) if scope else None
+            generation = database.get_generation(retailer)
+            etag, response = _cache_lookup(generation)
+            if response is None:
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                _cache_store(response, generation)
+            return _cache_headers(response, etag)
+        return decorated_function
+    return decorator
+
+
+def _retailer_arg(**_kwargs):
+    return request.args.get("retailer", "").strip() or None
+
+
 @app.route("/api/auth/login", methods=["POST"])
 def api_login():
     data = request.get_json() or {}
@@ -218,10 +478,8 @@ def api_login():
         return jsonify({"error": "Vul e-mail en wachtwoord in."}), 400
     try:
         response = database.sign_in(email, password)
-        session["access_token"] = response.session.access_token
-        session["refresh_token"] = response.session.refresh_token
-        session["user_email"] = response.user.email
-        return jsonify({"email": response.user.email})
+        _store_session(response)
+        return jsonify({"email": response.user.email, "id": response.user.id})
     except Exception:
         return jsonify({"error": "Inloggen mislukt. Controleer je gegevens."}), 401
 
@@ -234,21 +492,22 @@ def api_logout():
 
 @app.route("/api/auth/me")
 def api_me():
-    access_token = session.get("access_token")
-    if not access_token:
+    if not session.get("access_token"):
         return jsonify({"error": "Not authenticated"}), 401
-    try:
-        database.get_user_from_token(access_token)
-        return jsonify({"email": session.get("user_email")})
-    except Exception:
-        session.clear()
+    user = _session_user()
+    if not user:
         return jsonify({"error": "Token expired"}), 401
+    return jsonify({"email": session.get("user_email"), "id": user["id"]})
 
 
 @app.route("/api/retailers")
 @api_login_required
+@cached_response()
 def api_retailers():
-    stats = database.get_retailer_stats()
+    return jsonify(_retailers_payload(database.get_retailer_stats()))
+
+
+def _retailers_payload(stats):
     result = []
     for slug, info in RETAILERS.items():
         stat = stats.get(slug, {})
@@ -264,51 +523,166 @@ def api_retailers():
             "lastUpdate": last_snap["created_at"] if last_snap else None,
             "snapshotCount": stat.get("snapshot_count", 0),
         })
-    return jsonify(result)
+    return result
 
 
 @app.route("/api/retailers/refresh-all", methods=["POST"])
 @api_login_required
 def api_refresh_all():
-    """Handmatig snapshots maken voor alle actieve retailers."""
-    results = {}
-    for slug, info in RETAILERS.items():
-        if not info["active"]:
-            continue
-        try:
-            fetcher = get_fetcher(slug)
-            products = fetcher.fetch_all_products()
-            enrich_products_with_ingredients(fetcher, products)
-            snapshot_id = database.create_snapshot(products, retailer=slug)
-            results[slug] = {"ok": True, "product_count": len(products), "snapshot_id": snapshot_id}
-        except Exception as e:
-            results[slug] = {"ok": False, "error": str(e)}
-    return jsonify({"results": results})
+    """Handmatig snapshots maken voor alle actieve retailers (tegelijk, zie pipeline.run_all)."""
+    import pipeline
+    slugs = [slug for slug, info in RETAILERS.items() if info["active"]]
+    return jsonify({"results": pipeline.run_all(slugs)})
+
+
+CATALOG_PAGE_MAX_LIMIT = 500
+
+
+def _bool_arg(value):
+    return value.strip().lower() in ("1", "true", "ja")
+
+
+UNIT_VALUES = ("kg", "l", "piece")
+
+
+def _catalog_filters_from_args(args):
+    """Lees filters uit de querystring. Raises ValueError bij ongeldige waarden."""
+    filters = {}
+    for field in database.FACET_FIELDS:
+        values = [v.strip() for v in args.getlist(field) if v.strip()]
+        if field == "sub_category":
+            values += [v.strip() for v in args.getlist("category") if v.strip()]
+        if values:
+            filters[field] = values
+    for arg, key in (("is_bonus", "is_bonus"), ("available", "is_available")):
+        if args.get(arg, "").strip():
+            filters[key] = _bool_arg(args[arg])
+    bucket = args.get("price_bucket", "").strip()
+    if bucket:
+        if bucket not in {label for label, _low, _high in database.PRICE_BUCKETS}:
+            raise ValueError(f"Onbekende prijsklasse: {bucket}")
+        filters["price_bucket"] = bucket
+    for arg in ("min_price", "max_price"):
+        if args.get(arg, "").strip():
+            try:
+                filters[arg] = float(args[arg])
+            except ValueError:
+                raise ValueError(f"Ongeldige waarde voor {arg}")
+    unit = args.get("unit", "").strip()
+    if unit:
+        if unit not in UNIT_VALUES:
+            raise ValueError(f"Onbekende eenheid: {unit}")
+        filters["unit"] = unit
+    if args.get("q", "").strip():
+        filters["q"] = args["q"].strip()
+    return filters
+
+
+def _catalog_query_from_args(args):
+    """Sortering (sort=price of sort=-price) en fields-projectie uit de querystring."""
+    sort = args.get("sort", "title").strip() or "title"
+    descending = sort.startswith("-")
+    sort = sort.lstrip("-")
+    if sort not in database.CATALOG_SORT_KEYS:
+        raise ValueError(f"Onbekende sortering: {sort}")
+    fields = None
+    if args.get("fields", "").strip():
+        fields = [f.strip() for f in args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in database.CATALOG_FIELDS]
+        if unknown:
+            raise ValueError(f"Onbekende velden: {', '.join(unknown)}")
+    return {"sort": sort, "descending": descending, "fields": fields}
 
 
 @app.route("/api/retailers/<slug>/products")
 @api_login_required
+@cached_response(lambda slug: slug)
 def api_retailer_products(slug):
+    """Catalogus van een retailer. Zonder limit/cursor de volledige lijst (gestreamd);
+    met limit/cursor één pagina, met de cursor van de volgende pagina in X-Next-Cursor."""
+    if slug not in RETAILERS:
+        return jsonify({"error": "Retailer niet gevonden"}), 404
+    try:
+        filters, query, limit, cursor = _catalog_request_args()
+        if limit is None:
+            return json_stream(database.iter_catalog_products(slug, filters=filters, **query))
+        rows, next_cursor = database.get_catalog_page(slug, filters=filters, limit=limit, cursor=cursor, **query)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return _catalog_page_response(rows, next_cursor)
+
+
+def _catalog_request_args():
+    """(filters, query, limit, cursor) uit de querystring; limit None = de volledige lijst.
+    Raises ValueError bij ongeldige waarden."""
+    filters = _catalog_filters_from_args(request.args)
+    query = _catalog_query_from_args(request.args)
+    cursor = request.args.get("cursor", "").strip() or None
+    limit = request.args.get("limit", type=int)
+    if limit is None and not cursor:
+        return filters, query, None, None
+    return filters, query, min(max(limit or 100, 1), CATALOG_PAGE_MAX_LIMIT), cursor
+
+
+def _catalog_page_response(rows, next_cursor):
+    response = json_stream(rows)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+@app.route("/api/retailers/<slug>/facets")
+@api_login_required
+@cached_response(lambda slug: slug)
+def api_retailer_facets(slug):
+    """Facet-aantallen (merk, subcategorie, nutriscore, bonus, prijsklasse), berekend bij de laatste
+    snapshot en bijgewerkt na partiële refreshes."""
     if slug not in RETAILERS:
         return jsonify({"error": "Retailer niet gevonden"}), 404
-    products = database.get_catalog_products(slug)
-    return jsonify(products)
+    stored = database.get_retailer_facets(slug)
+    if not stored:
+        return jsonify({"error": "Nog geen facetten beschikbaar"}), 404
+    return jsonify({
+        "retailer": slug,
+        "snapshot_id": stored.get("snapshot_id"),
+        "updated_at": stored.get("updated_at"),
+        **stored["facets"],
+    })
+
+
+@app.route("/api/retailers/<slug>/price-stats")
+@api_login_required
+@cached_response(lambda slug: slug)
+def api_retailer_price_stats(slug):
+    """Prijsstatistieken per product (zie analytics.py). ?sort=volatility|-zscore|..., een - voor
+    aflopend (zoals bij de catalogus); standaard -volatility. ?anomalies=1 voor alleen de anomalieën."""
+    if slug not in RETAILERS:
+        return jsonify({"error": "Retailer niet gevonden"}), 404
+    sort = request.args.get("sort", "-volatility").strip() or "-volatility"
+    descending = sort.startswith("-")
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
+    anomalies_only = request.args.get("anomalies", "").strip() in ("1", "true")
+    try:
+        rows = database.get_price_stats(
+            slug, anomalies_only=anomalies_only, sort=sort.lstrip("-"), descending=descending, limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(rows)
 
 
 @app.route("/api/retailers/<slug>/snapshot", methods=["POST"])
 @api_login_required
 def api_snapshot_new(slug):
+    import pipeline
     if slug not in RETAILERS:
         return jsonify({"error": "Retailer niet gevonden"}), 404
     info = RETAILERS[slug]
     if not info["active"]:
         return jsonify({"error": f"{info['name']} is nog niet beschikbaar."}), 400
     try:
-        fetcher = get_fetcher(slug)
-        products = fetcher.fetch_all_products()
-        enrich_products_with_ingredients(fetcher, products)
-        snapshot_id = database.create_snapshot(products, retailer=slug)
-        return jsonify({"snapshot_id": snapshot_id, "product_count": len(products)})
+        run = pipeline.run_snapshot(slug)
+        return jsonify(run)
     except NotImplementedError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
@@ -317,34 +691,44 @@ def api_snapshot_new(slug):
 
 @app.route("/api/cron/snapshots")
 def cron_snapshots():
-    """Vercel cron: dagelijkse snapshot voor alle actieve retailers. Beveiligd met CRON_SECRET."""
+    """Vercel cron: volledige snapshot voor alle actieve retailers (tegelijk, zie pipeline.run_all).
+    Beveiligd met CRON_SECRET."""
     auth = request.headers.get("Authorization", "")
     expected = os.environ.get("CRON_SECRET", "")
     if not expected or auth != f"Bearer {expected}":
         return jsonify({"error": "Unauthorized"}), 401
 
-    results = {}
-    for slug, info in RETAILERS.items():
-        if not info["active"]:
-            continue
-        try:
-            fetcher = get_fetcher(slug)
-            products = fetcher.fetch_all_products()
-            enrich_products_with_ingredients(fetcher, products)
-            snapshot_id = database.create_snapshot(products, retailer=slug)
-            results[slug] = {"ok": True, "product_count": len(products), "snapshot_id": snapshot_id}
-        except Exception as e:
-            results[slug] = {"ok": False, "error": str(e)}
+    import pipeline
+    slugs = [slug for slug, info in RETAILERS.items() if info["active"]]
+    return jsonify({"results": pipeline.run_all(slugs)})
+
+
+@app.route("/api/cron/refresh")
+def cron_refresh():
+    """Vercel cron: partiële refresh van de hot of warm producten (?tier=) van alle actieve
+    retailers via de detail-endpoints, zonder snapshot (zie scheduler.py). Beveiligd met CRON_SECRET."""
+    auth = request.headers.get("Authorization", "")
+    expected = os.environ.get("CRON_SECRET", "")
+    if not expected or auth != f"Bearer {expected}":
+        return jsonify({"error": "Unauthorized"}), 401
 
-    return jsonify({"results": results})
+    import pipeline
+    import scheduler
+    tier = request.args.get("tier", "hot")
+    if tier not in scheduler.TIERS:
+        return jsonify({"error": f"Onbekende tier: {tier}"}), 400
+    if not database._check_refresh_tiers():
+        return jsonify({"error": "Migratie voor refresh tiers ontbreekt."}), 400
+    slugs = [slug for slug, info in RETAILERS.items() if info["active"]]
+    return jsonify({"tier": tier, "results": pipeline.run_all(slugs, tier=tier)})
 
 
 @app.route("/api/snapshots")
 @api_login_required
+@cached_response(_retailer_arg)
 def api_snapshots():
     retailer_filter = request.args.get("retailer", "")
-    all_snapshots = database.get_snapshots(retailer=retailer_filter or None)
-    return jsonify(all_snapshots)
+    return json_stream(database.iter_snapshots(retailer=retailer_filter or None, with_runs=True))
 
 
 @app.route("/api/snapshots/compare")
@@ -356,13 +740,86 @@ def api_compare_snapshots():
         return jsonify({"error": "Geef 'old' en 'new' snapshot IDs mee."}), 400
     try:
         changes = database.compare_snapshots(old_id, new_id)
-        return jsonify(changes)
+        return json_stream(changes)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _export_response(chunks, mimetype, filename):
+    response = app.response_class(chunks, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _export_range_args():
+    """retailer, since en until (ISO-datums) uit de querystring. Raises ValueError bij ongeldige waarden."""
+    retailer = request.args.get("retailer", "").strip() or None
+    if retailer and retailer not in RETAILERS:
+        raise ValueError(f"Retailer niet gevonden: {retailer}")
+    bounds = []
+    for arg in ("since", "until"):
+        value = request.args.get(arg, "").strip() or None
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"Ongeldige datum voor {arg}")
+        bounds.append(value)
+    return retailer, bounds[0], bounds[1]
+
+
+@app.route("/api/export/snapshots/<snapshot_id>/products")
+@api_login_required
+def api_export_snapshot_products(snapshot_id):
+    """Alle producten van een snapshot als ?format=csv|parquet|arrow; ?raw_json=1 neemt raw_json mee."""
+    import export
+    try:
+        return _export_response(*export.export_snapshot_products(
+            snapshot_id,
+            fmt=request.args.get("format", "csv"),
+            include_raw_json=_bool_arg(request.args.get("raw_json", "false")),
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/export/history")
+@api_login_required
+def api_export_history():
+    """product_history als CSV/Parquet/Arrow, optioneel ?retailer= en ?since=/?until= (ISO-datums)."""
+    import export
+    try:
+        retailer, since, until = _export_range_args()
+        return _export_response(*export.export_product_history(
+            retailer, since, until, fmt=request.args.get("format", "csv"),
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/export/timeline")
+@api_login_required
+def api_export_timeline():
+    """timeline_events als CSV/Parquet/Arrow, optioneel ?retailer= en ?since=/?until= (ISO-datums)."""
+    import export
+    try:
+        retailer, since, until = _export_range_args()
+        return _export_response(*export.export_timeline_events(
+            retailer, since, until, fmt=request.args.get("format", "csv"),
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/timeline")
 @api_login_required
+@cached_response(_retailer_arg)
 def api_timeline():
     retailer_filter = request.args.get("retailer", "")
     type_filter = request.args.get("type", "")
@@ -374,6 +831,30 @@ def api_timeline():
     return jsonify(events)
 
 
+@app.route("/api/search")
+@api_login_required
+def api_search():
+    """Zoek in de catalogus van alle retailers (titel, merk, ingrediënten, categorie)."""
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "Geef een zoekterm mee (q)."}), 400
+    retailer = request.args.get("retailer", "").strip() or None
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    results, source = search.search(q, retailer=retailer, limit=limit)
+    return jsonify({"query": q, "source": source, "results": results})
+
+
+@app.route("/api/search/autocomplete")
+@api_login_required
+def api_search_autocomplete():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"suggestions": []})
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 50)
+    suggestions, source = search.autocomplete(q, limit=limit)
+    return jsonify({"query": q, "source": source, "suggestions": suggestions})
+
+
 @app.route("/api/products/by-ref")
 @api_login_required
 def api_product_by_ref():
@@ -391,6 +872,50 @@ def api_product_by_ref():
     return jsonify(product)
 
 
+@app.route("/api/products/batch", methods=["POST"])
+@api_login_required
+def api_products_batch():
+    """Meerdere producten in één request: body {"ids": [...], "refs": [{"retailer", "webshop_id"}],
+    "history_limit": 1, "price_series": false}. Retourneert {"products": [...], "missing": {...}}."""
+    body = request.get_json(silent=True) or {}
+    ids = body.get("ids") or []
+    refs = body.get("refs") or []
+    if not isinstance(ids, list) or not isinstance(refs, list):
+        return jsonify({"error": "ids en refs moeten lijsten zijn."}), 400
+    try:
+        ids = [str(i) for i in ids if i]
+        refs = [(str(r["retailer"]), str(r["webshop_id"])) for r in refs]
+    except (KeyError, TypeError):
+        return jsonify({"error": "Elke ref heeft retailer en webshop_id."}), 400
+    if not ids and not refs:
+        return jsonify({"error": "Geef ids of refs mee."}), 400
+    if len(ids) + len(refs) > database.BATCH_MAX_PRODUCTS:
+        return jsonify({"error": f"Maximaal {database.BATCH_MAX_PRODUCTS} producten per request."}), 400
+    unknown = sorted({retailer for retailer, _wid in refs} - set(RETAILERS))
+    if unknown:
+        return jsonify({"error": f"Retailer niet gevonden: {', '.join(unknown)}"}), 404
+    try:
+        history_limit = min(max(int(body.get("history_limit", 1)), 0), 200)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Ongeldige waarde voor history_limit"}), 400
+    # Eén ongeldige uuid laat Postgres de hele in()-query weigeren; die ids gelden direct als missing.
+    invalid = [i for i in ids if not _is_uuid(i)]
+    items, missing = database.get_products_batch(
+        [i for i in ids if _is_uuid(i)], refs,
+        history_limit=history_limit, price_series=bool(body.get("price_series")),
+    )
+    missing["ids"] = invalid + missing["ids"]
+    return jsonify({"products": items, "missing": missing})
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+
 @app.route("/api/products/<product_id>")
 @api_login_required
 def api_product(product_id):
@@ -400,30 +925,222 @@ def api_product(product_id):
     return jsonify(product)
 
 
+@app.route("/api/products/<product_id>/matches")
+@api_login_required
+def api_product_matches(product_id):
+    """Gelijkwaardige producten bij andere retailers, goedkoopste eerst."""
+    return jsonify(database.get_product_matches(product_id))
+
+
+@app.route("/api/products/<product_id>/price-stats")
+@api_login_required
+def api_product_price_stats(product_id):
+    """Prijsstatistieken en anomalievlag van één product."""
+    stats = database.get_product_price_stats(product_id)
+    if not stats:
+        return jsonify({"error": "Nog geen prijsstatistieken voor dit product"}), 404
+    return jsonify(stats)
+
+
+@app.route("/api/watchlist")
+@api_login_required
+def api_watchlist():
+    """Gevolgde producten van de ingelogde gebruiker met hun alertregels."""
+    return jsonify(database.get_watchlist(g.user["id"]))
+
+
+@app.route("/api/watchlist", methods=["POST"])
+@api_login_required
+def api_watchlist_add():
+    """Volg een product: body {"product_id", "rule": "any_change", "threshold_pct": null}.
+    Regels: zie alerts.RULES."""
+    import alerts
+
+    body = request.get_json(silent=True) or {}
+    product_id = str(body.get("product_id") or "").strip()
+    rule = str(body.get("rule") or "any_change").strip()
+    if not product_id:
+        return jsonify({"error": "Geef een product_id mee."}), 400
+    if rule not in alerts.RULES:
+        return jsonify({"error": f"Onbekende regel: {rule}"}), 400
+    threshold = body.get("threshold_pct")
+    if threshold is not None:
+        try:
+            threshold = float(threshold)
+        except (TypeError, ValueError):
+            return jsonify({"error": "threshold_pct moet een getal zijn."}), 400
+    if not database.get_product(product_id):
+        return jsonify({"error": "Product niet gevonden"}), 404
+    watch = database.add_watch(g.user["id"], product_id, rule=rule, threshold_pct=threshold)
+    if not watch:
+        return jsonify({"error": "Watchlists zijn niet beschikbaar"}), 503
+    return jsonify(watch), 201
+
+
+@app.route("/api/watchlist/<product_id>", methods=["DELETE"])
+@api_login_required
+def api_watchlist_remove(product_id):
+    """Ontvolg een product (alle regels, of alleen ?rule=...)."""
+    rule = request.args.get("rule", "").strip() or None
+    database.remove_watch(g.user["id"], product_id, rule=rule)
+    return jsonify({"ok": True})
+
+
+@app.route("/api/alerts")
+@api_login_required
+def api_alerts():
+    """Inbox van de ingelogde gebruiker, nieuwste eerst (?unread=1 voor alleen ongelezen)."""
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 200)
+    unread_only = request.args.get("unread", "").strip() in ("1", "true")
+    return jsonify(database.get_alerts(g.user["id"], unread_only=unread_only, limit=limit))
+
+
+@app.route("/api/alerts/read", methods=["POST"])
+@api_login_required
+def api_alerts_read():
+    """Markeer alerts als gelezen: body {"ids": [...]}, zonder ids alle ongelezen alerts."""
+    body = request.get_json(silent=True) or {}
+    ids = body.get("ids")
+    if ids is not None and not isinstance(ids, list):
+        return jsonify({"error": "ids moet een lijst zijn."}), 400
+    if ids is not None:
+        ids = [str(i) for i in ids if i]
+        if not ids:
+            return jsonify({"ok": True})
+    database.mark_alerts_read(g.user["id"], ids)
+    return jsonify({"ok": True})
+
+
+@app.route("/api/cheapest-per-unit")
+@api_login_required
+@cached_response()
+def api_cheapest_per_unit():
+    """Goedkoopste producten per kg, liter of stuk over alle retailers (optioneel ?retailer= en ?q=)."""
+    unit = request.args.get("unit", "kg").strip() or "kg"
+    if unit not in UNIT_VALUES:
+        return jsonify({"error": f"Onbekende eenheid: {unit}"}), 400
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+    retailer = request.args.get("retailer", "").strip() or None
+    q = request.args.get("q", "").strip() or None
+    return jsonify(database.get_cheapest_per_unit(unit, retailer=retailer, q=q, limit=limit))
+
+
+CHANGE_STREAM_HEARTBEAT = 15  # seconden
+# Daarna sluit de server; EventSource verbindt zelf opnieuw. Onder maxDuration (300 s) in
+# vercel.json, zodat de stream netjes eindigt in plaats van door het platform te worden afgebroken.
+CHANGE_STREAM_MAX_SECONDS = float(os.environ.get("CHANGE_STREAM_MAX_SECONDS", 240))
+CHANGE_STREAM_KINDS = ("timeline", "history", "snapshot")
+
+
+def _sse(kind, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {kind}", f"data: {app.json.dumps(data)}"]
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+@app.route("/api/changes/stream")
+@api_login_required
+def api_changes_stream():
+    """Server-Sent Events met nieuwe timeline_events en product_history rijen na elke ingest.
+    Hervat na een reconnect via Last-Event-ID (of ?last_event_id=); ?retailer= en ?kinds= filteren.
+    Wachtende clients blokkeren op de in-process broker. Alleen ingests in dit proces komen als
+    rijen binnen; een ingest in een ander proces komt via de generatie (hoogstens eens per
+    GENERATION_SYNC_INTERVAL bekeken) alleen binnen als reset-event (zie changefeed.py)."""
+    import changefeed
+
+    retailer = request.args.get("retailer", "").strip() or None
+    kinds = {k.strip() for k in request.args.get("kinds", "").split(",") if k.strip()} or set(CHANGE_STREAM_KINDS)
+    unknown = kinds - set(CHANGE_STREAM_KINDS)
+    if unknown:
+        return jsonify({"error": f"Onbekende event-soorten: {', '.join(sorted(unknown))}"}), 400
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id", "")
+
+    def generate():
+        yield b"retry: 3000\n\n"
+        seq = changefeed.parse_id(last_event_id) if last_event_id else changefeed.last_id()
+        if seq is None:
+            # Onbekend of verlopen id: de client moet zijn lijsten opnieuw ophalen.
+            seq = changefeed.last_id()
+            yield _sse("reset", {}, changefeed.format_id(seq))
+        generation = database.get_generation(retailer)
+        next_poll = time.monotonic() + database.GENERATION_SYNC_INTERVAL
+        deadline = time.monotonic() + CHANGE_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            events = changefeed.wait(seq, CHANGE_STREAM_HEARTBEAT)
+            if events is None:
+                seq = changefeed.last_id()
+                yield _sse("reset", {}, changefeed.format_id(seq))
+                continue
+            if events:
+                for event in events:
+                    seq = event["seq"]
+                    if event["kind"] in kinds and (not retailer or event["retailer"] == retailer):
+                        yield _sse(event["kind"], event["rows"], changefeed.format_id(seq))
+                generation = database.get_generation(retailer)
+                continue
+            # Geen events in dit proces: is er elders een ingest geweest? Niet vaker bekijken dan
+            # de generatie met de database wordt gesynchroniseerd.
+            if time.monotonic() >= next_poll:
+                next_poll = time.monotonic() + database.GENERATION_SYNC_INTERVAL
+                current = database.get_generation(retailer)
+                if current != generation:
+                    generation = current
+                    yield _sse("reset", {}, changefeed.format_id(seq))
+                    continue
+            yield b": ping\n\n"
+
+    response = app.response_class(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/api/metrics")
+def api_metrics():
+    """Prometheus-metrics van dit proces (alleen met INSTRUMENTATION=1). Met een ingelogde sessie,
+    of voor een scraper met Authorization: Bearer <METRICS_TOKEN>."""
+    if not instrumentation.ENABLED:
+        return jsonify({"error": "Instrumentatie staat uit (INSTRUMENTATION=1)."}), 404
+    token = os.environ.get("METRICS_TOKEN", "")
+    scraper = token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not scraper and not _session_user():
+        return jsonify({"error": "Not authenticated"}), 401
+    return app.response_class(instrumentation.metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/api/recent-changes")
 @api_login_required
 def api_recent_changes():
-    limit = request.args.get("limit", 50, type=int)
-    limit = min(max(limit, 1), 200)
-    retailer = request.args.get("retailer", "").strip() or None
-    event_type = request.args.get("type", "").strip() or None
-    since = request.args.get("since", "").strip() or None
-    changes = database.get_recent_changes(limit=limit, retailer=retailer, event_type=event_type, since=since)
+    changes = database.get_recent_changes(**_recent_changes_args())
     return jsonify(changes)
 
 
+def _recent_changes_args():
+    limit = request.args.get("limit", 50, type=int)
+    return {
+        "limit": min(max(limit, 1), 200),
+        "retailer": request.args.get("retailer", "").strip() or None,
+        "event_type": request.args.get("type", "").strip() or None,
+        "since": request.args.get("since", "").strip() or None,
+    }
+
+
 @app.route("/api/products/<product_id>/history")
 @api_login_required
+@cached_response()
 def api_product_history(product_id):
-    limit = request.args.get("limit", 50, type=int)
-    limit = min(max(limit, 1), 200)
     product = database.get_product(product_id)
     if not product:
         return jsonify({"error": "Product niet gevonden"}), 404
-    history = database.get_product_history(product_id, limit=limit)
+    history = database.get_product_history(product_id, limit=_history_limit())
     return jsonify(history)
 
 
+def _history_limit():
+    limit = request.args.get("limit", 50, type=int)
+    return min(max(limit, 1), 200)
+
+
 @app.route("/api/products/<product_id>/at-snapshot/<snapshot_id>")
 @api_login_required
 def api_product_at_snapshot(product_id, snapshot_id):
@@ -0,0 +1,197 @@
+"""ASGI-modus: de drukste leesendpoints async, de rest via de bestaande Flask-app.
+
+/api/retailers, /api/recent-changes, /api/retailers/<slug>/products,
+/api/products/<id>/history en /api/products/<id>/at-snapshot/<snapshot_id> worden hier
+afgehandeld met database_async: terwijl een request op Supabase wacht, gaat de event loop
+verder met andere requests, en onafhankelijke queries binnen een request lopen tegelijk.
+Ze draaien binnen een Flask request context, zodat sessie-auth, de response-cache (ETag per
+data-generatie), compressie en instrumentatie precies hetzelfde werken als in app.py.
+Alle andere routes (en andere methodes) gaan ongewijzigd naar de Flask-app, in een thread pool
+van ASGI_WSGI_WORKERS threads (a2wsgi). Dat geldt ook voor de volledige catalogus (products zonder
+limit en cursor): die streamt Flask pagina voor pagina, in plaats van alles eerst in het geheugen
+te verzamelen.
+
+Draaien:
+  uvicorn asgi:app --port 5001 [--workers 2]
+  python3 asgi.py
+"""
+import asyncio
+import io
+import logging
+import os
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import g, jsonify, session
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+
+import app as flask_module
+import database
+import database_async
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+flask_app = flask_module.app
+WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", 10))
+
+_wsgi = WSGIMiddleware(flask_app, workers=WSGI_WORKERS)
+
+
+def _not_found(message):
+    return jsonify({"error": message}), 404
+
+
+async def api_retailers():
+    return jsonify(flask_module._retailers_payload(await database_async.get_retailer_stats()))
+
+
+async def api_recent_changes():
+    return jsonify(await database_async.get_recent_changes(**flask_module._recent_changes_args()))
+
+
+async def api_retailer_products(slug):
+    if slug not in flask_module.RETAILERS:
+        return _not_found("Retailer niet gevonden")
+    try:
+        filters, query, limit, cursor = flask_module._catalog_request_args()
+        rows, next_cursor = await database_async.get_catalog_page(slug, filters=filters, limit=limit, cursor=cursor, **query)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return flask_module._catalog_page_response(rows, next_cursor)
+
+
+async def api_product_history(product_id):
+    product, history = await asyncio.gather(
+        database_async.get_product(product_id),
+        database_async.get_product_history(product_id, limit=flask_module._history_limit()),
+    )
+    if not product:
+        return _not_found("Product niet gevonden")
+    return jsonify(history)
+
+
+async def api_product_at_snapshot(product_id, snapshot_id):
+    result = await database_async.get_product_at_snapshot(product_id, snapshot_id)
+    if not result:
+        return _not_found("Product niet gevonden in dit snapshot")
+    return jsonify(result)
+
+
+# Flask-endpoint -> (async view, gecachet, scope). Zelfde cache-instellingen als de
+# cached_response-decorators in app.py.
+ASYNC_VIEWS = {
+    "api_retailers": (api_retailers, True, None),
+    "api_recent_changes": (api_recent_changes, False, None),
+    "api_retailer_products": (api_retailer_products, True, lambda slug: slug),
+    "api_product_history": (api_product_history, True, None),
+    "api_product_at_snapshot": (api_product_at_snapshot, False, None),
+}
+
+
+async def _authenticate():
+    """Als api_login_required; None als de gebruiker ingelogd is, anders de 401-response."""
+    if not session.get("access_token"):
+        return jsonify({"error": "Not authenticated"}), 401
+    with instrumentation.span("auth"):
+        # Lokale JWT-verificatie is snel, maar de terugval (Supabase Auth, refresh) is een
+        # blocking call; asyncio.to_thread neemt de request context mee.
+        g.user = await asyncio.to_thread(flask_module._session_user)
+    if not g.user:
+        return jsonify({"error": "Token expired"}), 401
+    return None
+
+
+async def _dispatch(view, cached, scope, view_args):
+    denied = await _authenticate()
+    if denied is not None:
+        return denied
+    if not cached:
+        return await view(**view_args)
+    retailer = scope(**view_args) if scope else None
+    generation = await asyncio.to_thread(database.get_generation, retailer)
+    etag, response = flask_module._cache_lookup(generation)
+    if response is None:
+        response = flask_app.make_response(await view(**view_args))
+        if response.status_code != 200:
+            return response
+        flask_module._cache_store(response, generation)
+    return flask_module._cache_headers(response, etag)
+
+
+async def _send_response(response, send):
+    headers = [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in response.headers.items()]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    try:
+        for chunk in response.iter_encoded():
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        response.close()
+
+
+async def _handle(scope, send, endpoint, view_args):
+    """Als Flask.full_dispatch_request, met een async view."""
+    view, cached, cache_scope = ASYNC_VIEWS[endpoint]
+    environ = build_environ(scope, io.BytesIO(b""))
+    with flask_app.request_context(environ):
+        try:
+            try:
+                rv = flask_app.preprocess_request()
+                if rv is None:
+                    rv = await _dispatch(view, cached, cache_scope, view_args)
+            except Exception as e:
+                rv = flask_app.handle_user_exception(e)
+            response = flask_app.finalize_request(rv)
+        except Exception as e:
+            response = flask_app.make_response(flask_app.handle_exception(e))
+        await _send_response(response, send)
+
+
+def _match(scope):
+    """(endpoint, view_args) als dit een async endpoint is, anders None."""
+    if scope["type"] != "http" or scope["method"] != "GET":
+        return None
+    adapter = flask_app.url_map.bind("localhost")
+    try:
+        endpoint, view_args = adapter.match(scope["path"], method="GET")
+    except HTTPException:
+        return None
+    if endpoint not in ASYNC_VIEWS:
+        return None
+    if endpoint == "api_retailer_products" and _full_listing(scope):
+        return None
+    return endpoint, view_args
+
+
+def _full_listing(scope):
+    """Vraagt dit request de volledige catalogus op (geen limit en geen cursor, zie
+    app._catalog_request_args)?"""
+    args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin1"), keep_blank_values=True))
+    return args.get("limit", type=int) is None and not args.get("cursor", "").strip()
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    matched = _match(scope)
+    if matched is None:
+        return await _wsgi(scope, receive, send)
+    await _handle(scope, send, *matched)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.environ.get("PORT", 5001))
+    print(f"\n  Broodradar (ASGI) draait op http://localhost:{port}\n")
+    uvicorn.run("asgi:app", port=port, log_level="info")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Meet de latency van tokenverificatie: Supabase Auth round trip vs. lokale JWT-verificatie.
+
+Gebruik:
+  Zet SUPABASE_URL, SUPABASE_KEY en (optioneel) SUPABASE_JWT_SECRET in .env, plus
+  BENCH_EMAIL en BENCH_PASSWORD van een testgebruiker, en run:
+    python3 benchmarks/auth_latency.py [aantal_calls]
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import database
+
+
+def _measure(fn, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(label, timings):
+    q = statistics.quantiles(timings, n=100)
+    print(f"  {label:<32} p50 {q[49]:8.3f} ms   p95 {q[94]:8.3f} ms")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    email = os.environ.get("BENCH_EMAIL")
+    password = os.environ.get("BENCH_PASSWORD")
+    if not email or not password:
+        sys.exit("BENCH_EMAIL en BENCH_PASSWORD ontbreken in .env")
+
+    token = database.sign_in(email, password).session.access_token
+    print(f"Tokenverificatie, {n} calls per variant:")
+
+    _report("voor: Supabase Auth", _measure(lambda: database._get_user_remote(token), n))
+
+    if database._verify_token_locally(token) is None:
+        print("  lokaal: geen SUPABASE_JWT_SECRET of JWKS beschikbaar, overgeslagen")
+    else:
+        _report("na: lokale verificatie", _measure(lambda: database._verify_token_locally(token), n))
+
+    def _cached():
+        database.get_user_from_token(token)
+
+    database._verified_tokens.clear()
+    _report("na: get_user_from_token (cache)", _measure(_cached, n))
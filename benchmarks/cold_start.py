@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Cold-start meting voor de serverless entry point (api/index.py -> app).
+
+Twee onderdelen:
+  1. Importprofiel: `python -X importtime -c "import app"` in een vers proces, met de
+     zwaarste directe imports van app (cumulatief, in ms).
+  2. Cold start per endpoint: per endpoint een vers proces dat app importeert en daarna één
+     request doet met een ingelogde sessie, zoals een nieuwe Vercel-instance die meteen een
+     API-call krijgt. Gemeten: import, eerste request, tweede (warme) request en welke zware
+     modules pas bij dat eerste request geladen worden.
+
+De database is de Supabase stand-in uit loadtest/fake_supabase.py (wordt zelf gestart), tenzij
+--supabase-url is opgegeven. De budgetten staan in benchmarks/cold_start_budget.json; bij een
+overschrijding (mediaan over --repeat processen) is de exitcode 1.
+
+Gebruik:
+  python3 benchmarks/cold_start.py [--repeat 3] [--only /api/retailers] [--top 15]
+      [--budget benchmarks/cold_start_budget.json] [--output cold_start.json] [--no-profile]
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_BUDGET = Path(__file__).resolve().parent / "cold_start_budget.json"
+
+ENDPOINTS = (
+    "/api/auth/me",
+    "/api/retailers",
+    "/api/retailers/ah/products?limit=100",
+    "/api/retailers/ah/facets",
+    "/api/recent-changes?limit=50",
+    "/api/timeline",
+    "/api/snapshots?retailer=ah",
+    "/api/search?q=volkoren",
+)
+
+# Modules die we bij een cold start in de gaten houden: wie ze importeert betaalt ervoor.
+HEAVY_MODULES = ("supabase", "postgrest", "supabase_auth", "jwt", "numpy", "pipeline", "retailers.ah",
+                 "retailers.jumbo", "retailers.plus", "pyarrow", "export", "changefeed")
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def import_profile(top=15):
+    """Importprofiel van app in een vers proces. Retourneert (totaal_ms, [(module, cumulatief_ms, eigen_ms)])."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, capture_output=True, text=True, env=os.environ.copy(),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app mislukt:\n{proc.stderr[-2000:]}")
+    total_ms = 0.0
+    direct = []
+    pending = []
+    # importtime schrijft kinderen vóór hun ouder: de niveau-1-regels vlak vóór "app" zijn de
+    # directe imports van app (eerdere regels horen bij de interpreterstart, zoals site).
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, name = int(m[1]), int(m[2]), len(m[3]), m[4]
+        if indent == 0:
+            if name == "app":
+                total_ms = cumulative_us / 1000
+                direct = pending
+            pending = []
+        elif indent == 2:
+            pending.append((name, cumulative_us / 1000, self_us / 1000))
+    direct.sort(key=lambda item: item[1], reverse=True)
+    return total_ms, direct[:top]
+
+
+def _child(path):
+    """Draait in het verse proces: meet import en eerste request, print JSON op stdout."""
+    started = time.perf_counter()
+    from app import app
+    import_ms = (time.perf_counter() - started) * 1000
+    after_import = {name for name in HEAVY_MODULES if name in sys.modules}
+
+    client = app.test_client()
+    tokens = json.loads(os.environ.get("COLD_START_SESSION") or "{}")
+    if tokens:
+        with client.session_transaction() as sess:
+            sess.update(tokens)
+
+    started = time.perf_counter()
+    resp = client.get(path)
+    resp.get_data()
+    first_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    client.get(path).get_data()
+    warm_ms = (time.perf_counter() - started) * 1000
+
+    print(json.dumps({
+        "status": resp.status_code,
+        "import_ms": round(import_ms, 1),
+        "first_request_ms": round(first_ms, 1),
+        "warm_request_ms": round(warm_ms, 1),
+        "loaded_on_import": sorted(after_import),
+        "loaded_on_first_request": sorted(name for name in HEAVY_MODULES if name in sys.modules and name not in after_import),
+    }))
+
+
+def _measure(path, env):
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--child", path],
+        cwd=ROOT, capture_output=True, text=True, env=env,
+    )
+    process_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{path}: proces mislukt:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = round(process_ms, 1)
+    return result
+
+
+def endpoint_cold_starts(endpoints, env, repeat=3):
+    """Mediaan per endpoint over `repeat` verse processen."""
+    report = {}
+    for path in endpoints:
+        runs = [_measure(path, env) for _ in range(repeat)]
+        report[path] = {
+            "status": runs[-1]["status"],
+            **{
+                key: round(statistics.median(r[key] for r in runs), 1)
+                for key in ("process_ms", "import_ms", "first_request_ms", "warm_request_ms")
+            },
+            "loaded_on_import": runs[-1]["loaded_on_import"],
+            "loaded_on_first_request": runs[-1]["loaded_on_first_request"],
+        }
+    return report
+
+
+def check_budget(profile_ms, endpoints, budget):
+    """Lijst van overschrijdingen (strings)."""
+    over = []
+    if profile_ms is not None and "import_ms" in budget and profile_ms > budget["import_ms"]:
+        over.append(f"import app: {profile_ms:.1f} ms > budget {budget['import_ms']} ms")
+    for path, result in endpoints.items():
+        if result["status"] >= 400:
+            over.append(f"{path}: status {result['status']}")
+        limit = budget.get("endpoints", {}).get(path, budget.get("default_first_request_ms"))
+        if limit is not None and result["first_request_ms"] > limit:
+            over.append(f"{path}: eerste request {result['first_request_ms']:.1f} ms > budget {limit} ms")
+    return over
+
+
+def _start_fake_supabase(products):
+    from loadtest.fake_supabase import DEFAULT_PORT
+
+    proc = subprocess.Popen(
+        [sys.executable, str(ROOT / "loadtest" / "fake_supabase.py"), "--products", str(products), "--snapshots", "2"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Supabase stand-in gestopt (exitcode {proc.returncode})")
+        try:
+            with socket.create_connection(("127.0.0.1", DEFAULT_PORT), timeout=0.5):
+                return proc, f"http://127.0.0.1:{DEFAULT_PORT}"
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("Supabase stand-in niet bereikbaar")
+
+
+def _session_tokens(supabase_url, key, email, password):
+    import requests
+
+    resp = requests.post(
+        f"{supabase_url.rstrip('/')}/auth/v1/token", params={"grant_type": "password"},
+        headers={"apikey": key}, json={"email": email, "password": password}, timeout=30,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    return {"access_token": data["access_token"], "refresh_token": data["refresh_token"], "user_email": email}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        _child(sys.argv[2])
+        sys.exit(0)
+
+    from loadtest.fake_supabase import DEFAULT_EMAIL, DEFAULT_JWT_SECRET, DEFAULT_PASSWORD
+
+    parser = argparse.ArgumentParser(description="Cold-start profiel en budgetcheck voor de API.")
+    parser.add_argument("--repeat", type=int, default=3, help="verse processen per endpoint (mediaan)")
+    parser.add_argument("--only", action="append", help="alleen deze endpoint(s)")
+    parser.add_argument("--top", type=int, default=15, help="aantal imports in het profiel")
+    parser.add_argument("--no-profile", action="store_true", help="importprofiel overslaan")
+    parser.add_argument("--budget", default=str(DEFAULT_BUDGET))
+    parser.add_argument("--output", "-o", help="rapport als JSON")
+    parser.add_argument("--supabase-url", help="bestaande Supabase gebruiken i.p.v. de stand-in")
+    parser.add_argument("--supabase-key", default=os.environ.get("SUPABASE_KEY", "loadtest-anon-key"))
+    parser.add_argument("--jwt-secret", default=os.environ.get("SUPABASE_JWT_SECRET", DEFAULT_JWT_SECRET))
+    parser.add_argument("--email", default=os.environ.get("BENCH_EMAIL", DEFAULT_EMAIL))
+    parser.add_argument("--password", default=os.environ.get("BENCH_PASSWORD", DEFAULT_PASSWORD))
+    parser.add_argument("--products", type=int, default=500, help="producten per retailer in de stand-in")
+    args = parser.parse_args()
+
+    budget = json.loads(Path(args.budget).read_text()) if Path(args.budget).exists() else {}
+
+    profile_ms = None
+    if not args.no_profile:
+        profile_ms, direct = import_profile(args.top)
+        print(f"import app: {profile_ms:.1f} ms (budget {budget.get('import_ms', '-')} ms)")
+        for name, cumulative_ms, self_ms in direct:
+            print(f"  {name:<28} {cumulative_ms:8.1f} ms  (eigen {self_ms:6.1f} ms)")
+
+    fake = None
+    try:
+        supabase_url = args.supabase_url
+        if not supabase_url:
+            fake, supabase_url = _start_fake_supabase(args.products)
+        env = {
+            **os.environ,
+            "SUPABASE_URL": supabase_url,
+            "SUPABASE_KEY": args.supabase_key,
+            "SUPABASE_JWT_SECRET": args.jwt_secret,
+            "SECRET_KEY": "cold-start",
+        }
+        env["COLD_START_SESSION"] = json.dumps(_session_tokens(supabase_url, args.supabase_key, args.email, args.password))
+        endpoints = endpoint_cold_starts(args.only or ENDPOINTS, env, args.repeat)
+    finally:
+        if fake is not None:
+            fake.terminate()
+            fake.wait(timeout=10)
+
+    print(f"\nCold start per endpoint (mediaan van {args.repeat} processen):")
+    print(f"  {'endpoint':<40} {'proces':>8} {'import':>8} {'eerste':>8} {'warm':>8}  pas bij eerste request geladen")
+    for path, r in endpoints.items():
+        print(
+            f"  {path:<40} {r['process_ms']:8.1f} {r['import_ms']:8.1f} {r['first_request_ms']:8.1f} "
+            f"{r['warm_request_ms']:8.1f}  {', '.join(r['loaded_on_first_request']) or '-'}"
+        )
+
+    over = check_budget(profile_ms, endpoints, budget)
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "import_ms": profile_ms, "endpoints": endpoints, "budget": budget, "over_budget": over,
+        }, indent=2) + "\n")
+    if over:
+        print("\nBudget overschreden:")
+        for line in over:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nBinnen budget.")
@@ -0,0 +1,98 @@
+"""Synthetische broodcatalogi voor de microbenchmarks.
+
+catalog(n) levert n producten in het formaat van de fetchers (AH-velden, zoals create_snapshot
+ze krijgt). churn() maakt daar een volgende versie van met een vast percentage nieuwe,
+verdwenen, in prijs gewijzigde en bonus-gewijzigde producten. Alles is deterministisch per seed,
+zodat runs onderling vergelijkbaar zijn.
+"""
+import random
+
+BRANDS = ("AH", "Jumbo", "PLUS", "Bolletje", "Wasa", "Bakkersland", "Vogel's", "Lieken", "Kuyt", "Hollandia")
+KINDS = ("Volkoren", "Tijger", "Spelt", "Meergranen", "Wit", "Desem", "Rogge", "Maïs", "Zonnepitten", "Haver")
+FORMS = ("brood", "bollen", "pistolets", "stokbrood", "beschuit", "crackers", "krentenbollen", "wraps")
+SUB_CATEGORIES = ("Brood", "Afbakbrood", "Beschuit, crackers", "Broodjes", "Wraps, pita", "Krentenbollen")
+SIZES = ("800 g", "400 g", "6 stuks", "2 x 13 stuks", "250 g", "1 stuk", "600 g")
+NUTRISCORES = ("A", "B", "C", "D", None)
+INGREDIENTS = (
+    "tarwebloem, water, gist, zout, tarwegluten",
+    "volkorentarwemeel, water, gist, zout, raapzaadolie",
+    "speltmeel, water, desem, zout",
+    "tarwebloem, water, roggemeel, zonnebloempitten, gist, zout",
+)
+
+
+def product(i, rng):
+    """Eén product dict zoals een fetcher die oplevert."""
+    brand = rng.choice(BRANDS)
+    title = f"{brand} {rng.choice(KINDS)} {rng.choice(FORMS)}"
+    price = round(rng.uniform(0.79, 4.99), 2)
+    is_bonus = rng.random() < 0.15
+    return {
+        "webshopId": str(100000 + i),
+        "hqId": str(900000 + i),
+        "title": title,
+        "brand": brand,
+        "salesUnitSize": rng.choice(SIZES),
+        "priceBeforeBonus": price,
+        "unitPriceDescription": f"prijs per kg €{price * 1.25:.2f}".replace(".", ","),
+        "mainCategory": "Bakkerij",
+        "subCategory": rng.choice(SUB_CATEGORIES),
+        "nutriscore": rng.choice(NUTRISCORES),
+        "isBonus": is_bonus,
+        "isStapelBonus": is_bonus and rng.random() < 0.3,
+        "discountLabels": [{"code": "DISCOUNT_X_FOR_Y", "defaultDescription": "2 voor 3.00"}] if is_bonus else [],
+        "descriptionHighlights": "Lekker vers gebakken.",
+        "propertyIcons": ["vegan"] if rng.random() < 0.2 else [],
+        "images": [
+            {"url": f"https://static.example.nl/img/{i}_400.jpg", "width": 400, "height": 400},
+            {"url": f"https://static.example.nl/img/{i}_200.jpg", "width": 200, "height": 200},
+        ],
+        "availableOnline": True,
+        "orderAvailabilityStatus": "IN_ASSORTMENT",
+        "ingredients": rng.choice(INGREDIENTS),
+    }
+
+
+def catalog(n, seed=1):
+    rng = random.Random(seed)
+    return [product(i, rng) for i in range(n)]
+
+
+def churn(products, rate=0.05, seed=2):
+    """Volgende versie van een catalogus. Van elk soort wijziging (nieuw, verdwenen, prijs,
+    bonus) raakt rate/4 van de producten; de rest blijft gelijk."""
+    rng = random.Random(seed)
+    per_kind = int(len(products) * rate / 4)
+    indices = list(range(len(products)))
+    rng.shuffle(indices)
+    removed = set(indices[:per_kind])
+    price_changed = set(indices[per_kind : 2 * per_kind])
+    bonus_changed = set(indices[2 * per_kind : 3 * per_kind])
+
+    result = []
+    for i, p in enumerate(products):
+        if i in removed:
+            continue
+        if i in price_changed:
+            p = {**p, "priceBeforeBonus": round(p["priceBeforeBonus"] * rng.choice((0.9, 1.05, 1.1)), 2)}
+        elif i in bonus_changed:
+            p = {**p, "isBonus": not p["isBonus"]}
+        result.append(p)
+    start = len(products)
+    result += [product(start + i, rng) for i in range(per_kind)]
+    return result
+
+
+def snapshot_rows(products, snapshot_id="00000000-0000-0000-0000-000000000001", retailer="ah"):
+    """products-rijen zoals create_snapshot ze wegschrijft."""
+    import database
+    return [database._snapshot_product_row(p, snapshot_id, retailer, True) for p in products]
+
+
+def catalog_rows(rows):
+    """product_catalog-rijen (met id) bij een lijst snapshot-rijen."""
+    import database
+    return [
+        {**database._catalog_row_from_snapshot_product(r), "id": f"cat-{r['webshop_id']}"}
+        for r in rows
+    ]
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Neem retailer-responses op als fixtures voor benchmarks/run.py: de Plus productlijstpagina
+(HTML) en één pagina van de Jumbo zoek-API (JSON). Overschrijft benchmarks/fixtures/.
+
+Gebruik:
+  python3 benchmarks/record_fixtures.py
+"""
+import json
+import sys
+from pathlib import Path
+from urllib.parse import urlencode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from retailers import jumbo, plus
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+if __name__ == "__main__":
+    FIXTURES.mkdir(exist_ok=True)
+
+    html = plus._fetch_html(f"{plus.BASE_URL}{plus.MAIN_CATEGORY}")
+    (FIXTURES / "plus_plp.html").write_text(html, encoding="utf-8")
+    print(f"plus_plp.html: {len(plus._parse_product_list(html))} producten")
+
+    params = urlencode({"q": "brood", "offset": 0, "limit": jumbo.PAGE_SIZE})
+    data = jumbo._get(f"{jumbo.SEARCH_URL}?{params}")
+    (FIXTURES / "jumbo_search.json").write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"jumbo_search.json: {len(data.get('products', {}).get('data', []))} producten")
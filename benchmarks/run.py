@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks voor de ingest- en diff-paden, zonder database of netwerk.
+
+Cases (elk op 1k, 10k en 100k producten):
+  snapshot_rows     database._snapshot_product_row, de rijopbouw van create_snapshot
+  catalog_rows      database._catalog_row_from_snapshot_product
+  detect_changes    database._detect_changes tegen de vorige catalogus (5% churn)
+  diff_products     database._diff_products, de Python-diff achter compare_snapshots
+  facets            database._compute_facets
+  plus_parse        plus._parse_product_list op de opgenomen PLP-fixture (herhaald tot n producten)
+  jumbo_map         jumbo._map_product op de opgenomen zoek-fixture (herhaald tot n producten)
+
+De data komt uit benchmarks/generators.py (deterministisch) en benchmarks/fixtures/
+(opnieuw opnemen met benchmarks/record_fixtures.py). Resultaten gaan als JSON naar --output;
+met --baseline wordt elke case vergeleken met een eerder opgeslagen run en eindigt het script
+met exitcode 1 als een case meer dan --threshold trager is.
+
+Gebruik:
+  python3 benchmarks/run.py [--sizes 1000,10000] [--only diff] [--repeat 5]
+  python3 benchmarks/run.py --baseline benchmarks/baseline.json
+  python3 benchmarks/run.py --output benchmarks/baseline.json   (nieuwe baseline vastleggen)
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database
+from benchmarks import generators
+from retailers import jumbo, plus
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_OUTPUT = Path(__file__).resolve().parent / "results.json"
+CHURN = 0.05
+
+
+def _case_snapshot_rows(n):
+    products = generators.catalog(n)
+    return lambda: [database._snapshot_product_row(p, "snap", "ah", True) for p in products]
+
+
+def _case_catalog_rows(n):
+    rows = generators.snapshot_rows(generators.catalog(n))
+    return lambda: [database._catalog_row_from_snapshot_product(r) for r in rows]
+
+
+def _case_detect_changes(n):
+    old = generators.catalog(n)
+    old_by_webshop = {r["webshop_id"]: r for r in generators.catalog_rows(generators.snapshot_rows(old))}
+    new_rows = generators.snapshot_rows(generators.churn(old, CHURN))
+    pairs = [(old_by_webshop.get(r["webshop_id"]), database._catalog_row_from_snapshot_product(r)) for r in new_rows]
+    return lambda: [database._detect_changes(old_row, new_data) for old_row, new_data in pairs]
+
+
+def _case_diff_products(n):
+    old = generators.catalog(n)
+    old_rows = generators.snapshot_rows(old)
+    new_rows = generators.snapshot_rows(generators.churn(old, CHURN), snapshot_id="snap-2")
+    return lambda: database._diff_products(old_rows, new_rows)
+
+
+def _case_facets(n):
+    rows = generators.snapshot_rows(generators.catalog(n))
+    return lambda: database._compute_facets(rows)
+
+
+def _case_plus_parse(n):
+    page = (FIXTURES / "plus_plp.html").read_text(encoding="utf-8")
+    per_page = len(plus._parse_product_list(page))
+    pages = [page] * max(1, n // max(per_page, 1))
+    return lambda: [plus._parse_product_list(html) for html in pages]
+
+
+def _case_jumbo_map(n):
+    data = json.loads((FIXTURES / "jumbo_search.json").read_text(encoding="utf-8"))
+    items = data["products"]["data"]
+    items = [items[i % len(items)] for i in range(n)]
+    return lambda: [jumbo._map_product(p) for p in items]
+
+
+CASES = {
+    "snapshot_rows": _case_snapshot_rows,
+    "catalog_rows": _case_catalog_rows,
+    "detect_changes": _case_detect_changes,
+    "diff_products": _case_diff_products,
+    "facets": _case_facets,
+    "plus_parse": _case_plus_parse,
+    "jumbo_map": _case_jumbo_map,
+}
+
+
+def measure(fn, repeat):
+    """Roep fn repeat keer aan (na één warming-up). Retourneert timings in ms."""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run(sizes, only=None, repeat=5):
+    results = {}
+    for name, setup in CASES.items():
+        if only and only not in name:
+            continue
+        for n in sizes:
+            fn = setup(n)
+            # Grote cases minder vaak herhalen; de spreiding is daar toch klein.
+            timings = measure(fn, repeat if n < 100000 else max(2, repeat // 2))
+            key = f"{name}/{n}"
+            results[key] = {
+                "case": name,
+                "size": n,
+                "runs": len(timings),
+                "median_ms": round(statistics.median(timings), 3),
+                "min_ms": round(min(timings), 3),
+                "per_item_us": round(statistics.median(timings) * 1000 / n, 3),
+            }
+            print(f"  {key:<24} median {results[key]['median_ms']:10.2f} ms   {results[key]['per_item_us']:8.2f} µs/product")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Vergelijk mediane tijden met de baseline. Retourneert de lijst met regressies."""
+    regressions = []
+    print(f"Vergelijking met baseline ({baseline.get('meta', {}).get('commit') or 'onbekend'}):")
+    for key, result in results.items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            print(f"  {key:<24} geen baseline")
+            continue
+        ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  REGRESSIE"
+            regressions.append({"case": key, "baseline_ms": base["median_ms"], "median_ms": result["median_ms"], "ratio": round(ratio, 3)})
+        elif ratio < 1 - threshold:
+            marker = "  sneller"
+        print(f"  {key:<24} {base['median_ms']:10.2f} -> {result['median_ms']:10.2f} ms  ({ratio:5.2f}x){marker}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks voor ingest- en diff-paden.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="aantallen producten, kommagescheiden")
+    parser.add_argument("--only", help="alleen cases waarvan de naam dit bevat")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", "-o", default=str(DEFAULT_OUTPUT))
+    parser.add_argument("--baseline", help="eerder resultaat om tegen te vergelijken")
+    parser.add_argument("--threshold", type=float, default=0.15, help="toegestane vertraging (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    print(f"Microbenchmarks, sizes {sizes}:")
+    results = run(sizes, args.only, args.repeat)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "churn": CHURN,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        report["regressions"] = regressions
+
+    Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Resultaten geschreven naar {args.output}")
+    if regressions:
+        sys.exit(f"{len(regressions)} case(s) meer dan {args.threshold:.0%} trager dan de baseline")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Meet een snapshot-vergelijking: beide snapshots ophalen en in Python diffen vs. de
+Postgres-functie snapshot_diff. Rapporteert latency en het aantal overgedragen bytes.
+De opgeslagen diffs in snapshot_diffs worden bewust overgeslagen.
+
+Gebruik:
+  Zet SUPABASE_URL en SUPABASE_KEY in .env en run:
+    python3 benchmarks/snapshot_diff.py [retailer] [aantal_runs]
+    python3 benchmarks/snapshot_diff.py --ids <old_snapshot_id> <new_snapshot_id> [aantal_runs]
+  Zonder --ids worden het oudste en nieuwste snapshot van de retailer (standaard ah) vergeleken.
+"""
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import database
+
+
+def _python_diff(old_id, new_id):
+    old_products = database.get_snapshot_products(old_id)
+    new_products = database.get_snapshot_products(new_id)
+    transferred = len(json.dumps(old_products, default=str)) + len(json.dumps(new_products, default=str))
+    return database._diff_products(old_products, new_products), transferred
+
+
+def _sql_diff(old_id, new_id):
+    result = database._get_client().rpc("snapshot_diff", {"old_id": old_id, "new_id": new_id}).execute().data
+    transferred = len(json.dumps(result, default=str))
+    result.pop("product_counts", None)
+    return result, transferred
+
+
+def _measure(fn, n):
+    timings = []
+    result = transferred = None
+    for _ in range(n):
+        start = time.perf_counter()
+        result, transferred = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result, transferred
+
+
+def _report(label, timings, transferred):
+    p50 = statistics.median(timings)
+    p95 = statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else timings[0]
+    print(f"  {label:<24} p50 {p50:9.1f} ms   p95 {p95:9.1f} ms   {transferred / 1024:10.1f} KiB")
+
+
+def _counts(diff):
+    return {key: len(diff[key]) for key in ("new_products", "removed_products", "price_changes", "bonus_changes")}
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["--ids"]:
+        old_id, new_id = args[1], args[2]
+        n = int(args[3]) if len(args) > 3 else 5
+    else:
+        retailer = args[0] if args else "ah"
+        n = int(args[1]) if len(args) > 1 else 5
+        snapshots = database.get_snapshots(retailer)
+        if len(snapshots) < 2:
+            sys.exit(f"Minstens twee snapshots nodig voor {retailer}")
+        old_id, new_id = snapshots[-1]["id"], snapshots[0]["id"]
+
+    print(f"Snapshot-diff {old_id} -> {new_id}, {n} runs per variant:")
+    py_timings, py_result, py_bytes = _measure(lambda: _python_diff(old_id, new_id), n)
+    _report("voor: Python-diff", py_timings, py_bytes)
+    sql_timings, sql_result, sql_bytes = _measure(lambda: _sql_diff(old_id, new_id), n)
+    _report("na: snapshot_diff RPC", sql_timings, sql_bytes)
+
+    if _counts(py_result) != _counts(sql_result):
+        print(f"  LET OP: aantallen verschillen: python {_counts(py_result)} vs sql {_counts(sql_result)}")
+    else:
+        print(f"  wijzigingen: {_counts(sql_result)}")
@@ -0,0 +1,121 @@
+"""In-process change feed voor de SSE-stream /api/changes/stream.
+
+create_snapshot publiceert na elke ingest de nieuwe timeline_events en product_history rijen.
+De broker houdt de laatste events in een ringbuffer, zodat een client die opnieuw verbindt met
+Last-Event-ID alleen de gemiste events krijgt. Wachtende clients blokkeren op een Condition en
+kosten geen databasequeries.
+
+Event-ids hebben de vorm "<epoch>-<volgnummer>". De epoch is per proces willekeurig (uuid4) en
+verandert bij elke herstart; een client met een id uit een andere epoch (of ouder dan de buffer)
+krijgt een reset-event en haalt de data opnieuw op via de gewone API.
+
+De broker is per proces: nieuwe rijen worden alleen gepusht naar streams in het proces dat de
+ingest deed. Op serverless draait de cron in een andere invocation dan de open streams, dus daar
+komen ingests in de praktijk alleen als reset-event binnen: een open stream bekijkt hoogstens eens
+per GENERATION_SYNC_INTERVAL de generatie (database.get_generation, met één query per proces
+ongeacht het aantal streams) en de client haalt na een reset zijn lijsten opnieuw op via de gewone
+API. Rijen over processen heen pushen vraagt een gedeelde broker (bijv. Postgres LISTEN/NOTIFY of
+Supabase Realtime); die is er niet. Elke open stream houdt een worker of thread vast tot
+CHANGE_STREAM_MAX_SECONDS (app.py, onder maxDuration in vercel.json); reken daarmee bij het aantal
+workers.
+"""
+import logging
+import threading
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 1000
+EVENT_MAX_ROWS = 200
+
+EPOCH = uuid.uuid4().hex
+
+
+class ChangeFeed:
+    """Ringbuffer met oplopende volgnummers; publish() maakt alle wachtende streams wakker."""
+
+    def __init__(self, max_events=BUFFER_SIZE):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=max_events)
+        self._seq = 0
+
+    @property
+    def last_id(self):
+        return self._seq
+
+    def publish(self, kind, rows, retailer=None):
+        """Voeg events toe (één per EVENT_MAX_ROWS rijen). Retourneert het laatste volgnummer."""
+        with self._cond:
+            for i in range(0, len(rows), EVENT_MAX_ROWS):
+                self._seq += 1
+                self._events.append({
+                    "seq": self._seq,
+                    "kind": kind,
+                    "retailer": retailer,
+                    "rows": rows[i : i + EVENT_MAX_ROWS],
+                })
+            self._cond.notify_all()
+            return self._seq
+
+    def since(self, seq):
+        """Events na seq. None als er events tussen zitten die al uit de buffer zijn gevallen."""
+        with self._cond:
+            if seq >= self._seq:
+                return []
+            if not self._events or self._events[0]["seq"] > seq + 1:
+                return None
+            return [e for e in self._events if e["seq"] > seq]
+
+    def wait(self, seq, timeout):
+        """Blokkeer tot er events na seq zijn of timeout verstrijkt; retourneert since(seq)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq, timeout)
+        return self.since(seq)
+
+
+_feed = ChangeFeed()
+
+
+def format_id(seq):
+    return f"{EPOCH}-{seq}"
+
+
+def parse_id(event_id):
+    """Volgnummer uit een Last-Event-ID, of None als het id niet bij dit proces hoort."""
+    epoch, _, seq = (event_id or "").partition("-")
+    if epoch != EPOCH or not seq.isdigit():
+        return None
+    return int(seq)
+
+
+def last_id():
+    return _feed.last_id
+
+
+def since(seq):
+    return _feed.since(seq)
+
+
+def wait(seq, timeout):
+    return _feed.wait(seq, timeout)
+
+
+def publish_snapshot(retailer, snapshot_id, timeline_events, history):
+    """Publiceer de resultaten van één ingest (aangeroepen aan het eind van create_snapshot)."""
+    if timeline_events:
+        _feed.publish("timeline", timeline_events, retailer=retailer)
+    if history:
+        _feed.publish("history", history, retailer=retailer)
+    _feed.publish("snapshot", [{"id": snapshot_id, "retailer": retailer}], retailer=retailer)
+    logger.info(
+        "changefeed %s: %d timeline events, %d history entries gepubliceerd",
+        retailer, len(timeline_events or ()), len(history or ()),
+    )
+
+
+def publish_history(retailer, history):
+    """Publiceer de wijzigingen van een partiële refresh (zonder snapshot, zie scheduler.py)."""
+    if history:
+        _feed.publish("history", history, retailer=retailer)
+        logger.info("changefeed %s: %d history entries gepubliceerd (refresh)", retailer, len(history))
@@ -1,36 +1,166 @@
+import base64
+import json
 import logging
 import os
+import threading
+import time
 from datetime import datetime, timezone
-from supabase import create_client
+
+import instrumentation
 
 logger = logging.getLogger(__name__)
 
+POSTGREST_TIMEOUT = 120  # seconden, als de standaard van supabase-py
+
 _supabase = None
+_auth_client = None
 _has_retailer_column = None
 _has_product_catalog = None
+_has_retailer_facets = None
+_has_product_matches = None
+_has_unit_price_columns = None
+_has_snapshot_diffs = None
+_has_snapshot_runs = None
+_has_snapshot_run_crawl = None
+_has_product_price_stats = None
+_has_watchlists = None
+_has_refresh_tiers = None
+_has_product_verifications = None
+_has_retailer_generations = None
+
+# Data-generatie per retailer, zodat de response-cache in app.py en de zoekindex weten wanneer ze
+# verouderd zijn. De teller staat in retailer_generations en elk schrijfpad (snapshot, partiële
+# refresh, unit prices, prijsstatistieken, lazy catalog-rijen) verhoogt hem via
+# bump_retailer_generation. Dezelfde generatie betekent zo in elk proces dezelfde data; wijzigingen
+# uit een ander proces (bijv. de cron op een andere instance) worden binnen
+# GENERATION_SYNC_INTERVAL opgepikt. Zonder die tabel (migratie niet uitgevoerd) is de generatie
+# het laatste snapshot uit retailer_facets plus de laatste updated_at in product_catalog.
+# _external_generations houdt apart de laatste generatie die door een ander proces is gemaakt,
+# zodat in-process state die dit proces zelf bijwerkt (de zoekindex) alleen daarop hoeft te
+# verversen. Zonder retailer_generations telt elke wijziging als extern.
+GENERATION_SYNC_INTERVAL = 30  # seconden
+_generations = {}
+_external_generations = {}
+_generation_state = {"synced_at": None}
+_generation_lock = threading.Lock()
+
+
+def _supabase_headers():
+    key = os.environ["SUPABASE_KEY"]
+    return {"apikey": key, "Authorization": f"Bearer {key}"}
 
 
 def _get_client():
+    # Alleen de PostgREST-client (tabellen en rpc), niet supabase.create_client: dat laadt ook
+    # storage, realtime en functions, en is de zwaarste import van de app. Pas bij de eerste
+    # databasecall importeren, zodat een cold start zonder DB-werk er niets voor betaalt.
     global _supabase
     if _supabase is None:
-        url = os.environ["SUPABASE_URL"]
-        key = os.environ["SUPABASE_KEY"]
-        _supabase = create_client(url, key)
-    return _supabase
+        from postgrest import SyncPostgrestClient
+        url = os.environ["SUPABASE_URL"].rstrip("/")
+        client = SyncPostgrestClient(f"{url}/rest/v1", headers=_supabase_headers(), timeout=POSTGREST_TIMEOUT)
+        _supabase = instrumentation.instrument_client(client)
+    return instrumentation.run_client(_supabase)
+
+
+def _get_auth_client():
+    # Supabase Auth alleen voor inloggen, refresh en de terugval zonder JWT secret/JWKS. Geen
+    # auto-refresh of sessie-opslag: tokens staan in de Flask-sessie van de gebruiker.
+    global _auth_client
+    if _auth_client is None:
+        from supabase_auth import SyncGoTrueClient
+        url = os.environ["SUPABASE_URL"].rstrip("/")
+        _auth_client = SyncGoTrueClient(
+            url=f"{url}/auth/v1", headers=_supabase_headers(), auto_refresh_token=False, persist_session=False,
+        )
+    return _auth_client
 
 
 def sign_in(email, password):
     """Authenticate user with email and password. Returns dict with session, user, access_token, refresh_token; raises on failure."""
-    sb = _get_client()
-    response = sb.auth.sign_in_with_password({"email": email, "password": password})
+    response = _get_auth_client().sign_in_with_password({"email": email, "password": password})
     return response
 
 
+# Access tokens worden lokaal geverifieerd (JWT secret of JWKS van het project) en kort
+# gecachet, zodat niet elke API-call een round trip naar Supabase Auth kost.
+JWT_AUDIENCE = "authenticated"
+JWT_ALGORITHMS = ("HS256", "RS256", "ES256")
+VERIFIED_TOKEN_TTL = 60  # seconden
+VERIFIED_TOKEN_CACHE_SIZE = 1024
+_verified_tokens = {}
+_jwks_client = None
+
+
+def _get_jwks_client():
+    global _jwks_client
+    import jwt
+    if _jwks_client is None:
+        url = os.environ["SUPABASE_URL"].rstrip("/") + "/auth/v1/.well-known/jwks.json"
+        _jwks_client = jwt.PyJWKClient(url, cache_keys=True, lifespan=600)
+    return _jwks_client
+
+
+def _verify_token_locally(access_token):
+    """Verifieer een access token zonder Supabase Auth aan te roepen. Retourneert de claims.
+    Raises jwt.InvalidTokenError bij een ongeldige/verlopen token; None als er geen sleutel beschikbaar is."""
+    import jwt
+    alg = jwt.get_unverified_header(access_token).get("alg")
+    if alg not in JWT_ALGORITHMS:
+        raise jwt.InvalidAlgorithmError(f"Algoritme niet toegestaan: {alg}")
+    if alg == "HS256":
+        key = os.environ.get("SUPABASE_JWT_SECRET")
+        if not key:
+            return None
+    else:
+        try:
+            key = _get_jwks_client().get_signing_key_from_jwt(access_token).key
+        except jwt.PyJWKClientError as exc:
+            logger.warning("JWKS niet beschikbaar, terugval op Supabase Auth: %s", exc)
+            return None
+    return jwt.decode(access_token, key, algorithms=[alg], audience=JWT_AUDIENCE)
+
+
+def _get_user_remote(access_token):
+    """Valideer access token via Supabase Auth (network call)."""
+    response = _get_auth_client().get_user(jwt=access_token)
+    return {"id": response.user.id, "email": response.user.email}
+
+
+def _unverified_exp(access_token):
+    """exp-claim van een token zonder de handtekening te controleren (alleen om een cache-TTL te
+    begrenzen; Supabase Auth heeft de token al gevalideerd). None als die er niet is."""
+    import jwt
+    try:
+        return jwt.decode(access_token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return None
+
+
 def get_user_from_token(access_token):
-    """Validate access token and return user. Raises on invalid/expired token."""
-    sb = _get_client()
-    response = sb.auth.get_user(jwt=access_token)
-    return response.user
+    """Validate access token and return user dict (id, email). Raises on invalid/expired token."""
+    now = time.time()
+    cached = _verified_tokens.get(access_token)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    claims = _verify_token_locally(access_token)
+    if claims is None:
+        user = _get_user_remote(access_token)
+        expires_at = min(now + VERIFIED_TOKEN_TTL, _unverified_exp(access_token) or now + VERIFIED_TOKEN_TTL)
+    else:
+        user = {"id": claims.get("sub"), "email": claims.get("email")}
+        expires_at = min(now + VERIFIED_TOKEN_TTL, claims.get("exp", now))
+
+    if len(_verified_tokens) >= VERIFIED_TOKEN_CACHE_SIZE:
+        _verified_tokens.clear()
+    _verified_tokens[access_token] = (user, expires_at)
+    return user
+
+
+def refresh_session(refresh_token):
+    """Vraag met een refresh token een nieuwe sessie aan. Retourneert response met session en user; raises bij falen."""
+    return _get_auth_client().refresh_session(refresh_token)
 
 
 def _check_retailer_column():
@@ -61,9 +191,252 @@ def _check_product_catalog():
     return _has_product_catalog
 
 
+def _check_retailer_facets():
+    """Check of retailer_facets tabel bestaat."""
+    global _has_retailer_facets
+    if _has_retailer_facets is not None:
+        return _has_retailer_facets
+    sb = _get_client()
+    try:
+        sb.table("retailer_facets").select("retailer").limit(1).execute()
+        _has_retailer_facets = True
+    except Exception:
+        _has_retailer_facets = False
+    return _has_retailer_facets
+
+
+def _check_product_matches():
+    """Check of product_matches tabel bestaat."""
+    global _has_product_matches
+    if _has_product_matches is not None:
+        return _has_product_matches
+    sb = _get_client()
+    try:
+        sb.table("product_matches").select("product_id").limit(1).execute()
+        _has_product_matches = True
+    except Exception:
+        _has_product_matches = False
+    return _has_product_matches
+
+
+def _check_snapshot_diffs():
+    """Check of de snapshot_diffs tabel bestaat (migratie uitgevoerd)."""
+    global _has_snapshot_diffs
+    if _has_snapshot_diffs is not None:
+        return _has_snapshot_diffs
+    sb = _get_client()
+    try:
+        sb.table("snapshot_diffs").select("old_snapshot_id").limit(1).execute()
+        _has_snapshot_diffs = True
+    except Exception:
+        _has_snapshot_diffs = False
+    return _has_snapshot_diffs
+
+
+def _check_snapshot_runs():
+    """Check of de snapshot_runs tabel bestaat (migratie uitgevoerd)."""
+    global _has_snapshot_runs
+    if _has_snapshot_runs is not None:
+        return _has_snapshot_runs
+    sb = _get_client()
+    try:
+        sb.table("snapshot_runs").select("id").limit(1).execute()
+        _has_snapshot_runs = True
+    except Exception:
+        _has_snapshot_runs = False
+    return _has_snapshot_runs
+
+
+def _check_snapshot_run_crawl():
+    """Check of snapshot_runs de crawl-kolom heeft (migratie uitgevoerd)."""
+    global _has_snapshot_run_crawl
+    if _has_snapshot_run_crawl is not None:
+        return _has_snapshot_run_crawl
+    if not _check_snapshot_runs():
+        _has_snapshot_run_crawl = False
+        return False
+    sb = _get_client()
+    try:
+        sb.table("snapshot_runs").select("crawl").limit(1).execute()
+        _has_snapshot_run_crawl = True
+    except Exception:
+        _has_snapshot_run_crawl = False
+    return _has_snapshot_run_crawl
+
+
+def _check_product_price_stats():
+    """Check of de product_price_stats tabel bestaat (migratie uitgevoerd)."""
+    global _has_product_price_stats
+    if _has_product_price_stats is not None:
+        return _has_product_price_stats
+    sb = _get_client()
+    try:
+        sb.table("product_price_stats").select("product_id").limit(1).execute()
+        _has_product_price_stats = True
+    except Exception:
+        _has_product_price_stats = False
+    return _has_product_price_stats
+
+
+def _check_watchlists():
+    """Check of de watchlists en alerts tabellen bestaan (migratie uitgevoerd)."""
+    global _has_watchlists
+    if _has_watchlists is not None:
+        return _has_watchlists
+    sb = _get_client()
+    try:
+        sb.table("watchlists").select("id").limit(1).execute()
+        sb.table("alerts").select("id").limit(1).execute()
+        _has_watchlists = True
+    except Exception:
+        _has_watchlists = False
+    return _has_watchlists
+
+
+def _check_refresh_tiers():
+    """Check of de refresh-tier kolommen bestaan (migratie uitgevoerd)."""
+    global _has_refresh_tiers
+    if _has_refresh_tiers is not None:
+        return _has_refresh_tiers
+    sb = _get_client()
+    try:
+        sb.table("product_catalog").select("refresh_tier, last_checked_at").limit(1).execute()
+        sb.table("snapshot_runs").select("kind, tier").limit(1).execute()
+        _has_refresh_tiers = True
+    except Exception:
+        _has_refresh_tiers = False
+    return _has_refresh_tiers
+
+
+def _check_retailer_generations():
+    """Check of de retailer_generations tabel bestaat (migratie uitgevoerd)."""
+    global _has_retailer_generations
+    if _has_retailer_generations is not None:
+        return _has_retailer_generations
+    sb = _get_client()
+    try:
+        sb.table("retailer_generations").select("retailer").limit(1).execute()
+        _has_retailer_generations = True
+    except Exception:
+        _has_retailer_generations = False
+    return _has_retailer_generations
+
+
+def _check_product_verifications():
+    """Check of de product_verifications tabel bestaat (migratie uitgevoerd)."""
+    global _has_product_verifications
+    if _has_product_verifications is not None:
+        return _has_product_verifications
+    sb = _get_client()
+    try:
+        sb.table("product_verifications").select("webshop_id").limit(1).execute()
+        _has_product_verifications = True
+    except Exception:
+        _has_product_verifications = False
+    return _has_product_verifications
+
+
+def _check_unit_price_columns():
+    """Check of de genormaliseerde eenheidsprijs-kolommen bestaan (migratie uitgevoerd)."""
+    global _has_unit_price_columns
+    if _has_unit_price_columns is not None:
+        return _has_unit_price_columns
+    sb = _get_client()
+    try:
+        sb.table("product_catalog").select("price_per_unit").limit(1).execute()
+        sb.table("products").select("price_per_unit").limit(1).execute()
+        _has_unit_price_columns = True
+    except Exception:
+        _has_unit_price_columns = False
+    return _has_unit_price_columns
+
+
+def bump_generation(retailer):
+    """Markeer de data van een retailer als gewijzigd, voor alle processen."""
+    if _check_retailer_generations():
+        try:
+            generation = _get_client().rpc("bump_retailer_generation", {"p_retailer": retailer}).execute().data
+        except Exception as exc:
+            logger.warning("generatie ophogen mislukt voor %s: %s", retailer, exc)
+        else:
+            generation = int(generation)
+            with _generation_lock:
+                previous = _generations.get(retailer)
+                if isinstance(previous, int) and generation > previous + 1:
+                    # Tussen de vorige bekende generatie en deze bump schreef een ander proces.
+                    _external_generations[retailer] = generation - 1
+                _generations[retailer] = max(previous or 0, generation)
+            return
+    # Zonder teller (of als die faalde): bij de volgende get_generation opnieuw uit de database lezen.
+    _generation_state["synced_at"] = None
+
+
+def _read_generations(sb):
+    """Generatie per retailer zoals die nu in de database staat."""
+    if _check_retailer_generations():
+        rows = sb.table("retailer_generations").select("retailer, generation").execute().data or []
+        return {r["retailer"]: int(r["generation"]) for r in rows}
+    from retailers import RETAILERS
+    latest = {}
+    if _check_retailer_facets():
+        # retailer_facets wordt pas aan het eind van create_snapshot geschreven,
+        # dus een snapshot die hier staat is volledig verwerkt.
+        for r in sb.table("retailer_facets").select("retailer, snapshot_id").execute().data or []:
+            latest[r["retailer"]] = r.get("snapshot_id")
+    generations = {}
+    for slug in RETAILERS:
+        rows = (
+            sb.table("product_catalog").select("updated_at").eq("retailer", slug)
+            .order("updated_at", desc=True).limit(1).execute().data or []
+        )
+        updated_at = rows[0].get("updated_at") if rows else None
+        generations[slug] = f"{latest.get(slug) or '-'}@{updated_at or '-'}"
+    return generations
+
+
+def _sync_generations():
+    """Lees de generaties uit de database, hoogstens eens per GENERATION_SYNC_INTERVAL."""
+    now = time.monotonic()
+    synced_at = _generation_state["synced_at"]
+    if synced_at is not None and now - synced_at < GENERATION_SYNC_INTERVAL:
+        return
+    _generation_state["synced_at"] = now
+    try:
+        generations = _read_generations(_get_client())
+    except Exception as exc:
+        logger.warning("generatie-sync mislukt: %s", exc)
+        return
+    with _generation_lock:
+        for retailer, generation in generations.items():
+            current = _generations.get(retailer)
+            if isinstance(generation, int) and isinstance(current, int) and generation <= current:
+                # Een eigen bump kan nieuwer zijn dan wat de query net las.
+                continue
+            if generation != current:
+                _external_generations[retailer] = generation
+            _generations[retailer] = generation
+
+
+def get_generation(retailer=None):
+    """Generatie-token voor een retailer, of voor alle retailers samen als retailer None is:
+    per retailer "<slug>:<generatie>"."""
+    from retailers import RETAILERS
+    _sync_generations()
+    slugs = [retailer] if retailer else sorted(set(RETAILERS) | set(_generations))
+    return ",".join(f"{slug}:{_generations.get(slug, 0)}" for slug in slugs)
+
+
+def get_external_generation(retailer=None):
+    """Als get_generation, maar alleen veranderd door wijzigingen uit andere processen."""
+    from retailers import RETAILERS
+    _sync_generations()
+    slugs = [retailer] if retailer else sorted(set(RETAILERS) | set(_external_generations))
+    return ",".join(f"{slug}:{_external_generations.get(slug, 0)}" for slug in slugs)
+
+
 def _catalog_row_from_snapshot_product(r):
     """Maak een product_catalog rij uit een snapshot-product dict (zoals in create_snapshot)."""
-    return {
+    row = {
         "retailer": r.get("retailer", "ah"),
         "webshop_id": r.get("webshop_id") or "",
         "title": r.get("title"),
@@ -79,6 +452,86 @@ def _catalog_row_from_snapshot_product(r):
         "is_bonus": bool(r.get("is_bonus", False)),
         "is_available": True,
     }
+    if "price_per_unit" in r:
+        for column in ("unit_quantity", "unit", "price_per_unit"):
+            row[column] = r.get(column)
+    return row
+
+
+# Prijsklassen voor de facet-index: (label, ondergrens inclusief, bovengrens exclusief).
+PRICE_BUCKETS = (
+    ("0-1", 0, 1),
+    ("1-2", 1, 2),
+    ("2-3", 2, 3),
+    ("3-5", 3, 5),
+    ("5+", 5, None),
+)
+
+FACET_FIELDS = ("brand", "sub_category", "nutriscore")
+
+
+def _price_bucket(price):
+    """Label van de prijsklasse voor een prijs, of None zonder prijs."""
+    if price is None:
+        return None
+    price = float(price)
+    for label, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return label
+    return None
+
+
+def _facet_counts(counts):
+    """Zet een {waarde: aantal} dict om naar een lijst, meest voorkomend eerst."""
+    return [
+        {"value": value, "count": count}
+        for value, count in sorted(counts.items(), key=lambda kv: (-kv[1], str(kv[0])))
+    ]
+
+
+def _compute_facets(rows):
+    """Tel per facet (merk, subcategorie, nutriscore, bonus, prijsklasse) het aantal producten.
+    rows mag een generator zijn."""
+    counts = {field: {} for field in FACET_FIELDS}
+    bonus = {}
+    buckets = {}
+    total = 0
+    for r in rows:
+        total += 1
+        for field in FACET_FIELDS:
+            value = r.get(field)
+            if value:
+                counts[field][value] = counts[field].get(value, 0) + 1
+        is_bonus = bool(r.get("is_bonus", False))
+        bonus[is_bonus] = bonus.get(is_bonus, 0) + 1
+        bucket = _price_bucket(r.get("price"))
+        if bucket:
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+
+    facets = {field: _facet_counts(counts[field]) for field in FACET_FIELDS}
+    facets["is_bonus"] = _facet_counts(bonus)
+    facets["price_bucket"] = [
+        {"value": label, "count": buckets[label]}
+        for label, _low, _high in PRICE_BUCKETS
+        if label in buckets
+    ]
+    facets["total"] = total
+    return facets
+
+
+def _store_facets(sb, retailer, snapshot_id, rows):
+    """Bereken de facet-index voor een snapshot en sla die op (een rij per retailer)."""
+    if not _check_retailer_facets():
+        return
+    try:
+        sb.table("retailer_facets").upsert({
+            "retailer": retailer,
+            "snapshot_id": snapshot_id,
+            "facets": _compute_facets(rows),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }).execute()
+    except Exception as exc:
+        logger.warning("facets opslaan mislukt voor %s: %s", retailer, exc)
 
 
 def _detect_changes(old_row, new_data):
@@ -122,13 +575,15 @@ def _detect_changes(old_row, new_data):
     return "multi_change", changes
 
 
-def _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer):
-    """Na snapshot insert: upsert product_catalog en schrijf product_history."""
+def _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer, verifier=None):
+    """Na snapshot insert: upsert product_catalog en schrijf product_history.
+    verifier is de verification.Verifier van deze ingest (gedeeld met de timeline).
+    Retourneert de ingevoegde history-rijen met hun catalog-product (zoals get_recent_changes)."""
     if not rows:
-        return
+        return []
     new_by_webshop = {r["webshop_id"]: r for r in rows if r.get("webshop_id")}
     if not new_by_webshop:
-        return
+        return []
 
     snapshots = get_snapshots(retailer)
     old_by_webshop = {}
@@ -154,6 +609,12 @@ def _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer):
     update_count = 0
     insert_count = 0
     seen_catalog_ids = []
+    touched_rows = []
+    rescore_rows = []
+    catalog_by_id = {}
+    import matching
+    # Velden waar de matching-signature (blok en tokens) van afhangt.
+    signature_fields = [f for f in matching.MATCH_FIELDS if f not in ("id", "retailer")]
 
     for webshop_id, new_data in new_by_webshop.items():
         catalog_row = _catalog_row_from_snapshot_product(new_data)
@@ -163,12 +624,17 @@ def _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer):
         if existing:
             product_id = existing["id"]
             seen_catalog_ids.append(product_id)
+            catalog_by_id[product_id] = {**existing, **catalog_row, "id": product_id}
             needs_image_update = (
                 not existing.get("image_url")
                 and catalog_row.get("image_url")
             )
-            if event_type != "unchanged" or needs_image_update:
-                sb.table("product_catalog").update({
+            # Merk of inhoud telt niet als wijziging in de history, maar verandert wel het matchblok.
+            needs_rescore = any(
+                (existing.get(f) or "").strip() != (catalog_row.get(f) or "").strip() for f in signature_fields
+            )
+            if event_type != "unchanged" or needs_image_update or needs_rescore:
+                update = {
                     "title": catalog_row["title"],
                     "brand": catalog_row["brand"],
                     "price": catalog_row["price"],
@@ -183,13 +649,23 @@ def _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer):
                     "is_available": True,
                     "last_seen_at": now_iso,
                     "updated_at": now_iso,
-                }).eq("id", product_id).execute()
+                }
+                for column in ("unit_quantity", "unit", "price_per_unit"):
+                    if column in catalog_row:
+                        update[column] = catalog_row[column]
+                sb.table("product_catalog").update(update).eq("id", product_id).execute()
                 update_count += 1
+                touched_rows.append({**catalog_row, "id": product_id})
+                if needs_rescore:
+                    rescore_rows.append({**catalog_row, "id": product_id})
         else:
             ins = sb.table("product_catalog").insert(catalog_row).execute()
             if ins.data:
                 product_id = ins.data[0]["id"]
+                catalog_by_id[product_id] = ins.data[0]
                 insert_count += 1
+                touched_rows.append(ins.data[0])
+                rescore_rows.append(ins.data[0])
             else:
                 continue
         if event_type != "unchanged":
@@ -211,9 +687,11 @@ def _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer):
     potentially_removed = set(old_by_webshop.keys()) - set(new_by_webshop.keys())
     actually_removed = potentially_removed
     if potentially_removed:
-        from retailers import verify_products_exist
+        if verifier is None:
+            import verification
+            verifier = verification.Verifier(retailer)
         try:
-            still_exist = verify_products_exist(retailer, list(potentially_removed))
+            still_exist = verifier.existing(potentially_removed)
             actually_removed = potentially_removed - still_exist
             if still_exist:
                 logger.info(
@@ -233,6 +711,8 @@ def _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer):
             "is_available": False,
             "updated_at": now_iso,
         }).eq("id", product_id).execute()
+        touched_rows.append({"id": product_id, "is_available": False})
+        catalog_by_id[product_id] = {**existing, "is_available": False}
         history_batch.append({
             "product_id": product_id,
             "snapshot_id": snapshot_id,
@@ -242,13 +722,74 @@ def _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer):
         })
         removed_count += 1
 
+    inserted_history = []
     for i in range(0, len(history_batch), 500):
-        sb.table("product_history").insert(history_batch[i : i + 500]).execute()
+        res = sb.table("product_history").insert(history_batch[i : i + 500]).execute()
+        inserted_history.extend(res.data or [])
+
+    if inserted_history and _check_watchlists():
+        import alerts
+        try:
+            with instrumentation.stage("alerts"):
+                alerts.publish(inserted_history)
+        except Exception as exc:
+            logger.warning("alerts schrijven mislukt voor %s: %s", retailer, exc)
+
+    import search
+    with instrumentation.stage("search_index"):
+        search.index_products(touched_rows)
+
+    if rescore_rows and _check_product_matches():
+        try:
+            with instrumentation.stage("matching"):
+                matching.update_matches(rescore_rows)
+        except Exception as exc:
+            logger.warning("matching bijwerken mislukt voor %s: %s", retailer, exc)
 
     logger.info(
         "catalog update %s: %d updated, %d inserted, %d removed, %d history entries",
         retailer, update_count, insert_count, removed_count, len(history_batch),
     )
+    return [{**h, "product": catalog_by_id.get(h["product_id"])} for h in inserted_history]
+
+
+def _snapshot_product_row(p, snapshot_id, retailer, has_retailer):
+    """Maak een products-rij uit een product dict van een fetcher (AH-formaat)."""
+    images = p.get("images", [])
+    image_url = None
+    for img in images:
+        if img.get("width") == 200:
+            image_url = img["url"]
+            break
+    if not image_url and images:
+        image_url = images[0]["url"]
+
+    r = {
+        "snapshot_id": snapshot_id,
+        "webshop_id": p.get("webshopId"),
+        "hq_id": p.get("hqId"),
+        "title": p.get("title"),
+        "brand": p.get("brand"),
+        "sales_unit_size": p.get("salesUnitSize"),
+        "price": p.get("priceBeforeBonus"),
+        "unit_price_description": p.get("unitPriceDescription"),
+        "main_category": p.get("mainCategory"),
+        "sub_category": p.get("subCategory"),
+        "nutriscore": p.get("nutriscore"),
+        "is_bonus": p.get("isBonus", False),
+        "is_stapel_bonus": p.get("isStapelBonus", False),
+        "discount_labels": p.get("discountLabels", []),
+        "description_highlights": p.get("descriptionHighlights"),
+        "property_icons": p.get("propertyIcons", []),
+        "image_url": image_url,
+        "available_online": p.get("availableOnline", True),
+        "order_availability_status": p.get("orderAvailabilityStatus"),
+        "raw_json": p,
+        "ingredients": p.get("ingredients"),
+    }
+    if has_retailer:
+        r["retailer"] = retailer
+    return r
 
 
 def create_snapshot(products, retailer="ah", label=None):
@@ -263,75 +804,376 @@ def create_snapshot(products, retailer="ah", label=None):
     snap = sb.table("snapshots").insert(row).execute()
     snapshot_id = snap.data[0]["id"]
 
-    rows = []
-    for p in products:
-        images = p.get("images", [])
-        image_url = None
-        for img in images:
-            if img.get("width") == 200:
-                image_url = img["url"]
-                break
-        if not image_url and images:
-            image_url = images[0]["url"]
-
-        r = {
-            "snapshot_id": snapshot_id,
-            "webshop_id": p.get("webshopId"),
-            "hq_id": p.get("hqId"),
-            "title": p.get("title"),
-            "brand": p.get("brand"),
-            "sales_unit_size": p.get("salesUnitSize"),
-            "price": p.get("priceBeforeBonus"),
-            "unit_price_description": p.get("unitPriceDescription"),
-            "main_category": p.get("mainCategory"),
-            "sub_category": p.get("subCategory"),
-            "nutriscore": p.get("nutriscore"),
-            "is_bonus": p.get("isBonus", False),
-            "is_stapel_bonus": p.get("isStapelBonus", False),
-            "discount_labels": p.get("discountLabels", []),
-            "description_highlights": p.get("descriptionHighlights"),
-            "property_icons": p.get("propertyIcons", []),
-        "image_url": image_url,
-        "available_online": p.get("availableOnline", True),
-            "order_availability_status": p.get("orderAvailabilityStatus"),
-            "raw_json": p,
-            "ingredients": p.get("ingredients"),
-        }
-        if has_retailer:
-            r["retailer"] = retailer
-        rows.append(r)
+    rows = [_snapshot_product_row(p, snapshot_id, retailer, has_retailer) for p in products]
 
-    batch_size = 500
-    for i in range(0, len(rows), batch_size):
-        batch = rows[i:i + batch_size]
-        sb.table("products").insert(batch).execute()
+    if _check_unit_price_columns():
+        import unit_prices
+        unit_prices.normalize_rows(rows)
 
-    _generate_timeline_events(retailer, snapshot_id)
+    batch_size = 500
+    with instrumentation.stage("insert_products"):
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            sb.table("products").insert(batch).execute()
+
+    import verification
+    verifier = verification.Verifier(retailer)
+    with instrumentation.stage("timeline"):
+        timeline_events = _generate_timeline_events(retailer, snapshot_id, verifier)
+    history = []
     if _check_product_catalog():
         try:
-            _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer)
+            with instrumentation.stage("catalog"):
+                history = _update_catalog_and_history(sb, retailer, snapshot_id, rows, has_retailer, verifier)
         except Exception as exc:
             logger.exception("catalog update failed for %s snapshot %s: %s", retailer, snapshot_id, exc)
+        if _check_product_price_stats():
+            import analytics
+            try:
+                with instrumentation.stage("price_stats"):
+                    analytics.update_price_stats(retailer)
+            except Exception as exc:
+                logger.warning("prijsstatistieken bijwerken mislukt voor %s: %s", retailer, exc)
+        if _check_refresh_tiers():
+            import scheduler
+            try:
+                with instrumentation.stage("refresh_tiers"):
+                    scheduler.classify(retailer)
+            except Exception as exc:
+                logger.warning("refresh-tiers bijwerken mislukt voor %s: %s", retailer, exc)
+    # Facetten als laatste: hun snapshot_id markeert voor andere processen dat de ingest klaar is.
+    with instrumentation.stage("facets"):
+        _store_facets(sb, retailer, snapshot_id, rows)
+    bump_generation(retailer)
+    import changefeed
+    changefeed.publish_snapshot(retailer, snapshot_id, timeline_events, history)
     return snapshot_id
 
 
+def get_refresh_candidates(retailer, tier, checked_before, limit):
+    """Beschikbare catalog-rijen van een tier die sinds checked_before niet gezien of gecontroleerd
+    zijn, langst niet gecontroleerd eerst (index product_catalog_retailer_tier_checked_idx)."""
+    if not _check_refresh_tiers():
+        return []
+    cutoff = checked_before.isoformat()
+    try:
+        return (
+            _get_client().table("product_catalog").select("*")
+            .eq("retailer", retailer).eq("refresh_tier", tier).eq("is_available", True)
+            .lt("last_seen_at", cutoff)
+            .or_(f"last_checked_at.is.null,last_checked_at.lt.{cutoff}")
+            .order("last_checked_at", desc=False, nullsfirst=True).order("id")
+            .limit(limit).execute().data or []
+        )
+    except Exception as exc:
+        logger.warning("refresh-kandidaten ophalen mislukt voor %s/%s: %s", retailer, tier, exc)
+        return []
+
+
+def update_refresh_tiers(tiers_by_id):
+    """Schrijf gewijzigde refresh tiers ({catalog_id: tier}), gegroepeerd per tier in batches van 200."""
+    by_tier = {}
+    for product_id, tier in tiers_by_id.items():
+        by_tier.setdefault(tier, []).append(product_id)
+    sb = _get_client()
+    for tier, ids in by_tier.items():
+        for i in range(0, len(ids), 200):
+            sb.table("product_catalog").update({"refresh_tier": tier}).in_("id", ids[i : i + 200]).execute()
+
+
+# Velden die een detail-endpoint (AH-formaat) levert en een partiële refresh bijwerkt.
+PARTIAL_REFRESH_FIELDS = {
+    "price": "priceBeforeBonus",
+    "is_bonus": "isBonus",
+    "title": "title",
+    "ingredients": "ingredients",
+}
+
+
+def apply_partial_refresh(retailer, candidates, details, checked_at=None):
+    """Verwerk een partiële refresh: candidates zijn de gecontroleerde catalog-rijen, details de
+    producten van fetcher.fetch_product_details ({webshop_id: product}). Wijzigingen gaan als
+    product_history zonder snapshot_id naar de catalog, alerts, zoekindex en change feed; er
+    ontstaat geen snapshot. Producten zonder details blijven ongewijzigd (verdwijnen wordt bij de
+    volgende volledige crawl vastgesteld); bij wijzigingen worden de opgeslagen facetten herberekend.
+    last_checked_at wordt checked_at (het begin van de run,
+    zodat de cutoff van de volgende run er niet net achter valt). Retourneert de ingevoegde
+    history-rijen met hun product."""
+    if not candidates:
+        return []
+    sb = _get_client()
+    now_iso = datetime.now(timezone.utc).isoformat()
+    checked_iso = (checked_at or datetime.now(timezone.utc)).isoformat()
+    has_unit_prices = _check_unit_price_columns()
+    history_batch = []
+    touched_rows = []
+    rescore_rows = []
+    catalog_by_id = {}
+
+    for existing in candidates:
+        detail = details.get(str(existing.get("webshop_id")))
+        if not detail:
+            continue
+        new_data = dict(existing)
+        for column, key in PARTIAL_REFRESH_FIELDS.items():
+            if detail.get(key) is not None:
+                new_data[column] = bool(detail[key]) if column == "is_bonus" else detail[key]
+        event_type, changes = _detect_changes(existing, new_data)
+        if event_type == "unchanged":
+            continue
+        update = {column: new_data[column] for column in PARTIAL_REFRESH_FIELDS}
+        if has_unit_prices and "price" in changes:
+            import unit_prices
+            unit_prices.normalize_rows([new_data])
+            update.update({c: new_data[c] for c in ("unit_quantity", "unit", "price_per_unit")})
+        update["updated_at"] = now_iso
+        sb.table("product_catalog").update(update).eq("id", existing["id"]).execute()
+        catalog_by_id[existing["id"]] = {**new_data, **update}
+        touched_rows.append(catalog_by_id[existing["id"]])
+        if "title" in changes:
+            rescore_rows.append(catalog_by_id[existing["id"]])
+        history_batch.append({
+            "product_id": existing["id"],
+            "snapshot_id": None,
+            "event_type": event_type,
+            "changes": changes,
+            "price_at_snapshot": new_data.get("price"),
+        })
+
+    checked_ids = [c["id"] for c in candidates]
+    for i in range(0, len(checked_ids), 200):
+        sb.table("product_catalog").update({"last_checked_at": checked_iso}).in_("id", checked_ids[i : i + 200]).execute()
+
+    inserted_history = []
+    for i in range(0, len(history_batch), 500):
+        res = sb.table("product_history").insert(history_batch[i : i + 500]).execute()
+        inserted_history.extend(res.data or [])
+
+    if inserted_history and _check_watchlists():
+        import alerts
+        try:
+            with instrumentation.stage("alerts"):
+                alerts.publish(inserted_history)
+        except Exception as exc:
+            logger.warning("alerts schrijven mislukt voor %s: %s", retailer, exc)
+
+    import search
+    search.index_products(touched_rows)
+
+    if rescore_rows and _check_product_matches():
+        import matching
+        try:
+            with instrumentation.stage("matching"):
+                matching.update_matches(rescore_rows)
+        except Exception as exc:
+            logger.warning("matching bijwerken mislukt voor %s: %s", retailer, exc)
+
+    history = [{**h, "product": catalog_by_id.get(h["product_id"])} for h in inserted_history]
+    if history:
+        # Prijs en bonus bepalen de prijsklasse- en bonusfacetten.
+        with instrumentation.stage("facets"):
+            refresh_catalog_facets(retailer)
+        bump_generation(retailer)
+        import changefeed
+        changefeed.publish_history(retailer, history)
+    logger.info(
+        "partiële refresh %s: %d gecontroleerd, %d met details, %d gewijzigd",
+        retailer, len(candidates), len(details), len(history_batch),
+    )
+    return history
+
+
+# PostgREST levert standaard maximaal 1000 rijen per request; grotere resultaten worden gepagineerd.
+PAGE_SIZE = 1000
+
+
+def _iter_pages(make_query, page_size=PAGE_SIZE):
+    """Doorloop een query in pagina's via .range(). make_query() moet elke keer een nieuwe
+    (stabiel gesorteerde) query builder opleveren. Yield rijen één voor één."""
+    start = 0
+    while True:
+        rows = make_query().range(start, start + page_size - 1).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+
+SNAPSHOT_RUN_FIELDS = (
+    "status", "duration_ms", "stages", "http_requests", "http_bytes", "db_round_trips", "rows_written",
+)
+
+
+def iter_snapshots(retailer=None, with_runs=False):
+    """Snapshots als generator, nieuwste eerst. Optioneel gefilterd op retailer.
+    Met with_runs krijgt elk snapshot een "run" met de stage-timings uit snapshot_runs (of None)."""
+    sb = _get_client()
+    if retailer and not _check_retailer_column() and retailer != "ah":
+        return iter(())
+    with_runs = with_runs and _check_snapshot_runs()
+    run_fields = SNAPSHOT_RUN_FIELDS + (("crawl",) if with_runs and _check_snapshot_run_crawl() else ())
+    columns = f"*, snapshot_runs({', '.join(run_fields)})" if with_runs else "*"
+
+    def make_query():
+        q = sb.table("snapshots").select(columns).order("created_at", desc=True).order("id")
+        if retailer and _check_retailer_column():
+            q = q.eq("retailer", retailer)
+        return q
+
+    if not with_runs:
+        return _iter_pages(make_query)
+    return (_flatten_run(s) for s in _iter_pages(make_query))
+
+
+def _flatten_run(snapshot):
+    runs = snapshot.pop("snapshot_runs", None) or []
+    snapshot["run"] = runs[0] if runs else None
+    return snapshot
+
+
+def start_snapshot_run(retailer, kind="full", tier=None):
+    """Leg het begin van een snapshot-run vast. Retourneert het run-id, of None zonder tabel.
+    kind "refresh" is een partiële refresh van één tier (zonder snapshot)."""
+    if not _check_snapshot_runs():
+        return None
+    row = {"retailer": retailer, "status": "running"}
+    if _check_refresh_tiers():
+        row.update(kind=kind, tier=tier)
+    elif kind != "full":
+        return None
+    try:
+        res = _get_client().table("snapshot_runs").insert(row).execute()
+        return res.data[0]["id"]
+    except Exception as exc:
+        logger.warning("snapshot_run starten mislukt voor %s: %s", retailer, exc)
+        return None
+
+
+def finish_snapshot_run(run_id, **fields):
+    """Werk een snapshot_runs rij bij met status, timings, tellers en het crawl-rapport."""
+    if not run_id:
+        return
+    if "crawl" in fields and not _check_snapshot_run_crawl():
+        fields.pop("crawl")
+    try:
+        _get_client().table("snapshot_runs").update(
+            {**fields, "finished_at": datetime.now(timezone.utc).isoformat()}
+        ).eq("id", run_id).execute()
+    except Exception as exc:
+        logger.warning("snapshot_run %s bijwerken mislukt: %s", run_id, exc)
+
+
+def get_recent_runs(retailer, kind="full", limit=3):
+    """De laatste snapshot_runs van een retailer (nieuwste eerst) met status en started_at,
+    voor de circuit breaker in pipeline.run_all."""
+    if not _check_snapshot_runs():
+        return []
+    try:
+        q = _get_client().table("snapshot_runs").select("status, error, started_at").eq("retailer", retailer)
+        if _check_refresh_tiers():
+            q = q.eq("kind", kind)
+        elif kind != "full":
+            return []
+        return q.order("started_at", desc=True).limit(limit).execute().data or []
+    except Exception as exc:
+        logger.warning("snapshot_runs ophalen mislukt voor %s: %s", retailer, exc)
+        return []
+
+
 def get_snapshots(retailer=None):
     """Alle snapshots ophalen, nieuwste eerst. Optioneel gefilterd op retailer."""
+    return list(iter_snapshots(retailer))
+
+
+def _iter_by_id(make_query, page_size=PAGE_SIZE):
+    """Doorloop een query in pagina's via keyset op id (id > laatste id). Anders dan .range()
+    blijft elke pagina even goedkoop, ook diep in grote tabellen. make_query() levert een
+    nieuwe query builder zonder sortering of limit."""
+    last_id = None
+    while True:
+        q = make_query()
+        if last_id is not None:
+            q = q.gt("id", last_id)
+        rows = q.order("id").limit(page_size).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def _iter_by_time(make_query, column="created_at", page_size=PAGE_SIZE):
+    """Als _iter_by_id, maar in tijdsvolgorde: keyset op (column, id). column mag geen nulls hebben."""
+    last = None
+    while True:
+        q = make_query()
+        if last is not None:
+            value, row_id = (_postgrest_literal(v) for v in last)
+            q = q.or_(f"{column}.gt.{value},and({column}.eq.{value},id.gt.{row_id})")
+        rows = q.order(column).order("id").limit(page_size).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = (rows[-1][column], rows[-1]["id"])
+
+
+def _with_columns(columns, required):
+    """select()-kolommen aangevuld met de kolommen die de keyset nodig heeft."""
+    if columns.strip() == "*":
+        return columns
+    present = {c.strip() for c in columns.split(",")}
+    return ", ".join([columns, *(c for c in required if c not in present)])
+
+
+def iter_snapshot_products(snapshot_id, columns="*"):
+    """Producten van een specifiek snapshot als generator, pagina voor pagina opgehaald."""
     sb = _get_client()
-    if retailer and not _check_retailer_column():
-        if retailer != "ah":
-            return []
-        return sb.table("snapshots").select("*").order("created_at", desc=True).execute().data
-    q = sb.table("snapshots").select("*").order("created_at", desc=True)
-    if retailer and _check_retailer_column():
-        q = q.eq("retailer", retailer)
-    return q.execute().data
+    columns = _with_columns(columns, ("id",))
+    return _iter_by_id(lambda: sb.table("products").select(columns).eq("snapshot_id", snapshot_id))
+
+
+def iter_product_history(retailer=None, since=None, until=None, columns="*"):
+    """product_history rijen als generator (op created_at, id), met retailer, webshop_id en titel uit
+    product_catalog onder "product_catalog". Optioneel gefilterd op retailer en created_at [since, until)."""
+    sb = _get_client()
+    embed = "product_catalog!inner(retailer, webshop_id, title)" if retailer else "product_catalog(retailer, webshop_id, title)"
+    columns = _with_columns(columns, ("created_at", "id"))
+
+    def make_query():
+        q = sb.table("product_history").select(f"{columns}, {embed}")
+        if retailer:
+            q = q.eq("product_catalog.retailer", retailer)
+        if since:
+            q = q.gte("created_at", since)
+        if until:
+            q = q.lt("created_at", until)
+        return q
+
+    return _iter_by_time(make_query)
+
+
+def iter_timeline_events(retailer=None, since=None, until=None, event_type=None):
+    """timeline_events als generator (op created_at, id), optioneel gefilterd op retailer, type en
+    created_at [since, until)."""
+    sb = _get_client()
+
+    def make_query():
+        q = sb.table("timeline_events").select("*")
+        if retailer:
+            q = q.eq("retailer", retailer)
+        if event_type:
+            q = q.eq("event_type", event_type)
+        if since:
+            q = q.gte("created_at", since)
+        if until:
+            q = q.lt("created_at", until)
+        return q
+
+    return _iter_by_time(make_query)
 
 
 def get_snapshot_products(snapshot_id):
     """Producten van een specifiek snapshot."""
-    sb = _get_client()
-    return sb.table("products").select("*").eq("snapshot_id", snapshot_id).execute().data
+    return list(iter_snapshot_products(snapshot_id))
 
 
 def get_latest_snapshot_products(retailer="ah"):
@@ -342,28 +1184,514 @@ def get_latest_snapshot_products(retailer="ah"):
     return get_snapshot_products(snapshots[0]["id"])
 
 
-def get_catalog_products(retailer):
-    """Producten uit product_catalog voor een retailer (eigen database, met historie op snapshots)."""
+def get_retailer_facets(retailer):
+    """Opgeslagen facet-index voor een retailer (berekend bij de laatste snapshot). None als er geen is."""
+    if not _check_retailer_facets():
+        return None
+    sb = _get_client()
+    try:
+        r = sb.table("retailer_facets").select("*").eq("retailer", retailer).limit(1).execute()
+        return r.data[0] if r.data else None
+    except Exception:
+        return None
+
+
+FACET_COLUMNS = ("id", *FACET_FIELDS, "is_bonus", "price")
+
+
+def refresh_catalog_facets(retailer):
+    """Herbereken de opgeslagen facetten uit de beschikbare producten in product_catalog, na een
+    partiële refresh. Het snapshot_id van de rij (het laatste volledige snapshot) blijft staan."""
+    if not _check_retailer_facets() or not _check_product_catalog():
+        return
+    try:
+        rows = iter_catalog_products(retailer, filters={"is_available": True}, fields=FACET_COLUMNS)
+        _get_client().table("retailer_facets").upsert({
+            "retailer": retailer,
+            "facets": _compute_facets(rows),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }).execute()
+    except Exception as exc:
+        logger.warning("facets herberekenen mislukt voor %s: %s", retailer, exc)
+
+
+def _apply_catalog_filters(q, filters, conditions=()):
+    """Pas filters toe op een product_catalog query.
+    Facetten: brand/sub_category/nutriscore (lijsten), is_bonus, price_bucket.
+    Verder: is_available, unit (kg/l/piece), min_price, max_price en q (tekst in titel of merk).
+    conditions: extra PostgREST or(...)-groepen die allemaal moeten gelden (bijv. de keyset-cursor)."""
+    conditions = list(conditions)
+    filters = filters or {}
+    for field in FACET_FIELDS:
+        values = filters.get(field)
+        if values:
+            q = q.in_(field, list(values))
+    if filters.get("is_bonus") is not None:
+        q = q.eq("is_bonus", bool(filters["is_bonus"]))
+    if filters.get("is_available") is not None:
+        q = q.eq("is_available", bool(filters["is_available"]))
+    if filters.get("unit"):
+        q = q.eq("unit", filters["unit"])
+    bucket = filters.get("price_bucket")
+    if bucket:
+        low, high = next((lo, hi) for label, lo, hi in PRICE_BUCKETS if label == bucket)
+        q = q.gte("price", low)
+        if high is not None:
+            q = q.lt("price", high)
+    if filters.get("min_price") is not None:
+        q = q.gte("price", filters["min_price"])
+    if filters.get("max_price") is not None:
+        q = q.lte("price", filters["max_price"])
+    text = "".join(ch for ch in (filters.get("q") or "") if ch not in ',()"*%\\:').strip()
+    if text:
+        conditions.append(f"or(title.ilike.*{text}*,brand.ilike.*{text}*)")
+    if conditions:
+        # Eén or-parameter met een and-groep, zodat meerdere or-groepen samen gelden.
+        q = q.or_(f"and({','.join(conditions)})")
+    return q
+
+
+CATALOG_FIELDS = (
+    "id", "retailer", "webshop_id", "title", "brand", "price", "sales_unit_size",
+    "unit_price_description", "nutriscore", "main_category", "sub_category", "image_url",
+    "ingredients", "is_bonus", "is_available", "first_seen_at", "last_seen_at",
+    "created_at", "updated_at", "unit_quantity", "unit", "price_per_unit",
+)
+CATALOG_LIST_FIELDS = (
+    "id", "retailer", "webshop_id", "title", "brand", "price", "sales_unit_size",
+    "unit_price_description", "nutriscore", "sub_category", "image_url", "ingredients",
+    "is_bonus", "first_seen_at", "last_seen_at",
+)
+# Sorteersleutel -> kolom. Elke sleutel heeft een index op (retailer, kolom, id).
+CATALOG_SORT_KEYS = {
+    "title": "title",
+    "price": "price",
+    "last_seen_at": "last_seen_at",
+    "unit_price": "price_per_unit",
+}
+
+
+def encode_cursor(value, row_id):
+    """Cursor voor keyset-paginatie: de sorteerwaarde en het id van de laatste rij."""
+    raw = json.dumps([value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse van encode_cursor. Raises ValueError bij een ongeldige cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Ongeldige cursor")
+    return value, str(row_id)
+
+
+def _postgrest_literal(value):
+    """Quote een waarde voor gebruik in een PostgREST or-filter."""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _keyset_filter(column, descending, value, row_id):
+    """Or-groep voor de rijen na (value, row_id) bij sortering op column (nulls last), id oplopend."""
+    rid = _postgrest_literal(row_id)
+    if value is None:
+        return f"or(and({column}.is.null,id.gt.{rid}))"
+    v = _postgrest_literal(value)
+    op = "lt" if descending else "gt"
+    return f"or({column}.{op}.{v},{column}.is.null,and({column}.eq.{v},id.gt.{rid}))"
+
+
+def get_catalog_page(retailer, filters=None, sort="title", descending=False, fields=None, limit=100, cursor=None):
+    """Eén pagina uit product_catalog via keyset-paginatie.
+    Retourneert (rows, next_cursor); next_cursor is None op de laatste pagina.
+    id en de sorteerkolom worden altijd meegeleverd, ook als ze niet in fields staan."""
     if not _check_product_catalog():
+        return [], None
+    q = _catalog_page_query(_get_client(), retailer, filters, sort, descending, fields, limit, cursor)
+    return _split_catalog_page(q.execute().data or [], sort, limit)
+
+
+def _catalog_page_query(sb, retailer, filters, sort, descending, fields, limit, cursor):
+    """Query builder voor get_catalog_page (sync of async client); haalt limit + 1 rijen op."""
+    column = CATALOG_SORT_KEYS[sort]
+    columns = list(fields or CATALOG_LIST_FIELDS)
+    for required in ("id", column):
+        if required not in columns:
+            columns.append(required)
+    q = sb.table("product_catalog").select(", ".join(columns)).eq("retailer", retailer)
+    conditions = []
+    if cursor:
+        value, row_id = decode_cursor(cursor)
+        conditions.append(_keyset_filter(column, descending, value, row_id))
+    q = _apply_catalog_filters(q, filters, conditions)
+    return q.order(column, desc=descending, nullsfirst=False).order("id").limit(limit + 1)
+
+
+def _split_catalog_page(rows, sort, limit):
+    """(rows, next_cursor) uit de limit + 1 opgehaalde rijen."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        column = CATALOG_SORT_KEYS[sort]
+        next_cursor = encode_cursor(rows[-1].get(column), rows[-1]["id"])
+    return rows, next_cursor
+
+
+# get_catalog_page haalt limit + 1 rijen op om te zien of er een volgende pagina is; met max-rows
+# (PAGE_SIZE) zou limit=PAGE_SIZE nooit meer dan PAGE_SIZE rijen opleveren en stopt de iteratie.
+CATALOG_ITER_PAGE_SIZE = PAGE_SIZE - 1
+
+
+def iter_catalog_products(retailer, filters=None, sort="title", descending=False, fields=None):
+    """Als get_catalog_products, maar als generator die pagina voor pagina ophaalt. Een fout
+    halverwege wordt gelogd en opnieuw geraised: de rijen tot dan toe zijn geen volledige lijst."""
+    cursor = None
+    try:
+        while True:
+            rows, cursor = get_catalog_page(
+                retailer, filters=filters, sort=sort, descending=descending,
+                fields=fields, limit=CATALOG_ITER_PAGE_SIZE, cursor=cursor,
+            )
+            yield from rows
+            if not cursor:
+                return
+    except Exception as exc:
+        logger.warning("catalog ophalen mislukt voor %s: %s", retailer, exc)
+        raise
+
+
+def get_catalog_products(retailer, filters=None):
+    """Producten uit product_catalog voor een retailer (eigen database, met historie op snapshots).
+    Optioneel gefilterd (zie _apply_catalog_filters). Lege lijst als het ophalen mislukt."""
+    try:
+        return list(iter_catalog_products(retailer, filters=filters))
+    except Exception:
         return []
+
+
+def update_catalog_unit_prices(rows):
+    """Schrijf genormaliseerde eenheidsprijzen terug naar product_catalog (batches van 500)."""
+    if not _check_unit_price_columns() or not rows:
+        return
     sb = _get_client()
+    payload = [
+        {
+            "id": r["id"],
+            "retailer": r["retailer"],
+            "webshop_id": r["webshop_id"],
+            "unit_quantity": r.get("unit_quantity"),
+            "unit": r.get("unit"),
+            "price_per_unit": r.get("price_per_unit"),
+        }
+        for r in rows
+    ]
+    for i in range(0, len(payload), 500):
+        sb.table("product_catalog").upsert(payload[i : i + 500]).execute()
+    for retailer in {r["retailer"] for r in rows}:
+        bump_generation(retailer)
+
+
+def get_cheapest_per_unit(unit="kg", retailer=None, q=None, limit=20):
+    """Goedkoopste beschikbare producten per eenheid (€/kg, €/l of €/stuk), over alle retailers."""
+    if not _check_unit_price_columns():
+        return []
+    sb = _get_client()
+    query = (
+        sb.table("product_catalog")
+        .select(", ".join(CATALOG_LIST_FIELDS + ("unit_quantity", "unit", "price_per_unit")))
+        .eq("unit", unit)
+        .eq("is_available", True)
+        .not_.is_("price_per_unit", "null")
+    )
+    if retailer:
+        query = query.eq("retailer", retailer)
+    query = _apply_catalog_filters(query, {"q": q})
+    try:
+        return query.order("price_per_unit").limit(limit).execute().data or []
+    except Exception as exc:
+        logger.warning("goedkoopste per %s ophalen mislukt: %s", unit, exc)
+        return []
+
+
+def get_catalog_rows(product_ids, fields=None):
+    """product_catalog rijen voor een lijst ids (gechunkt per 100)."""
+    if not _check_product_catalog() or not product_ids:
+        return []
+    sb = _get_client()
+    columns = ", ".join(fields) if fields else "*"
+    ids = list(product_ids)
+    rows = []
+    for i in range(0, len(ids), 100):
+        r = sb.table("product_catalog").select(columns).in_("id", ids[i : i + 100]).execute()
+        rows.extend(r.data or [])
+    return rows
+
+
+def get_product_match_rows(product_ids=None, blocks=None, group_ids=None):
+    """product_matches rijen voor de opgegeven producten, blokken en/of groepen (vereniging)."""
+    if not _check_product_matches():
+        return []
+    sb = _get_client()
+    rows = {}
+    for column, values in (("product_id", product_ids), ("match_block", blocks), ("group_id", group_ids)):
+        values = list(values or [])
+        for i in range(0, len(values), 100):
+            chunk = values[i : i + 100]
+            pages = _iter_pages(
+                lambda: sb.table("product_matches").select("*").in_(column, chunk).order("product_id")
+            )
+            for row in pages:
+                rows[row["product_id"]] = row
+    return list(rows.values())
+
+
+def upsert_product_matches(rows):
+    """Schrijf product_matches rijen (primary key product_id) in batches van 500."""
+    if not _check_product_matches() or not rows:
+        return
+    sb = _get_client()
+    now_iso = datetime.now(timezone.utc).isoformat()
+    payload = [
+        {
+            "product_id": r["product_id"],
+            "retailer": r["retailer"],
+            "match_block": r["match_block"],
+            "group_id": r.get("group_id"),
+            "score": r.get("score"),
+            "updated_at": now_iso,
+        }
+        for r in rows
+    ]
+    for i in range(0, len(payload), 500):
+        sb.table("product_matches").upsert(payload[i : i + 500]).execute()
+
+
+def get_product_matches(product_id):
+    """Gelijkwaardige producten bij andere retailers (inclusief het product zelf), goedkoopste eerst.
+    Eén RPC-call naar product_match_group. Lege lijst als het product niet gekoppeld is."""
+    if not _check_product_matches():
+        return []
+    sb = _get_client()
+    try:
+        r = sb.rpc("product_match_group", {"pid": product_id}).execute()
+        return r.data or []
+    except Exception as exc:
+        logger.warning("product_match_group mislukt voor %s: %s", product_id, exc)
+        return []
+
+
+def upsert_price_stats(rows):
+    """Schrijf product_price_stats rijen (primary key product_id) in batches van 500."""
+    if not _check_product_price_stats() or not rows:
+        return
+    sb = _get_client()
+    for i in range(0, len(rows), 500):
+        sb.table("product_price_stats").upsert(rows[i : i + 500]).execute()
+    for retailer in {r["retailer"] for r in rows}:
+        bump_generation(retailer)
+
+
+# Sorteersleutel -> kolom in product_price_stats.
+PRICE_STATS_SORT_KEYS = {
+    "volatility": "volatility_90d",
+    "zscore": "change_zscore",
+    "change_pct": "last_change_pct",
+    "days_since_change": "days_since_change",
+    "changes": "price_changes_365d",
+    "bonus_share": "bonus_share_90d",
+    "price": "price",
+}
+
+
+def get_price_stats(retailer, anomalies_only=False, sort="volatility", descending=True, limit=100):
+    """Prijsstatistieken van een retailer met titel en merk uit product_catalog, gesorteerd op
+    een sleutel uit PRICE_STATS_SORT_KEYS. Raises ValueError bij een onbekende sorteersleutel."""
+    if sort not in PRICE_STATS_SORT_KEYS:
+        raise ValueError(f"Onbekende sortering: {sort}")
+    if not _check_product_price_stats():
+        return []
+    q = (
+        _get_client().table("product_price_stats")
+        .select("*, product_catalog(webshop_id, title, brand, image_url, is_bonus, is_available)")
+        .eq("retailer", retailer)
+    )
+    if anomalies_only:
+        q = q.eq("is_anomaly", True)
+    q = q.order(PRICE_STATS_SORT_KEYS[sort], desc=descending, nullsfirst=False).order("product_id").limit(limit)
+    try:
+        return q.execute().data or []
+    except Exception as exc:
+        logger.warning("prijsstatistieken ophalen mislukt voor %s: %s", retailer, exc)
+        return []
+
+
+def get_product_price_stats(product_id):
+    """product_price_stats rij van een product, of None."""
+    if not _check_product_price_stats():
+        return None
+    try:
+        r = _get_client().table("product_price_stats").select("*").eq("product_id", product_id).limit(1).execute()
+        return r.data[0] if r.data else None
+    except Exception:
+        return None
+
+
+def get_watchers(product_ids):
+    """Alle watchlist-regels voor de opgegeven producten (gechunkt per 100)."""
+    if not _check_watchlists() or not product_ids:
+        return []
+    sb = _get_client()
+    ids = list(product_ids)
+    rows = []
+    for i in range(0, len(ids), 100):
+        chunk = ids[i : i + 100]
+        rows.extend(_iter_pages(lambda: sb.table("watchlists").select("*").in_("product_id", chunk).order("id")))
+    return rows
+
+
+def insert_alerts(rows):
+    """Schrijf alerts in batches van 500; een alert per (watchlist, history-entry) wordt niet dubbel geschreven."""
+    if not _check_watchlists() or not rows:
+        return
+    sb = _get_client()
+    for i in range(0, len(rows), 500):
+        sb.table("alerts").upsert(
+            rows[i : i + 500], on_conflict="watchlist_id,history_id", ignore_duplicates=True,
+        ).execute()
+
+
+def get_watchlist(user_id):
+    """Watchlist-regels van een gebruiker met het product uit product_catalog, nieuwste eerst."""
+    if not _check_watchlists():
+        return []
+    sb = _get_client()
+    fields = ", ".join(CATALOG_LIST_FIELDS)
     try:
         r = (
-            sb.table("product_catalog")
-            .select("id, retailer, webshop_id, title, brand, price, sales_unit_size, unit_price_description, nutriscore, sub_category, image_url, ingredients, is_bonus, first_seen_at, last_seen_at")
-            .eq("retailer", retailer)
-            .order("title")
+            sb.table("watchlists")
+            .select(f"*, product_catalog({fields})")
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
             .execute()
         )
         return r.data or []
-    except Exception:
+    except Exception as exc:
+        logger.warning("watchlist ophalen mislukt: %s", exc)
         return []
 
 
-def compare_snapshots(old_id, new_id):
-    """Vergelijk twee snapshots. Retourneert dict met wijzigingen."""
-    old_products = {p["webshop_id"]: p for p in get_snapshot_products(old_id)}
-    new_products = {p["webshop_id"]: p for p in get_snapshot_products(new_id)}
+def add_watch(user_id, product_id, rule="any_change", threshold_pct=None):
+    """Voeg een watchlist-regel toe (of werk de drempel bij). Retourneert de rij."""
+    if not _check_watchlists():
+        return None
+    row = {"user_id": user_id, "product_id": product_id, "rule": rule, "threshold_pct": threshold_pct}
+    r = _get_client().table("watchlists").upsert(row, on_conflict="user_id,product_id,rule").execute()
+    return r.data[0] if r.data else None
+
+
+def remove_watch(user_id, product_id, rule=None):
+    """Verwijder de watchlist-regels van een gebruiker voor een product (optioneel één regel)."""
+    if not _check_watchlists():
+        return
+    q = _get_client().table("watchlists").delete().eq("user_id", user_id).eq("product_id", product_id)
+    if rule:
+        q = q.eq("rule", rule)
+    q.execute()
+
+
+def get_alerts(user_id, unread_only=False, limit=50):
+    """Inbox van een gebruiker met het product uit product_catalog, nieuwste eerst."""
+    if not _check_watchlists():
+        return []
+    sb = _get_client()
+    fields = ", ".join(CATALOG_LIST_FIELDS)
+    q = sb.table("alerts").select(f"*, product_catalog({fields})").eq("user_id", user_id)
+    if unread_only:
+        q = q.is_("read_at", "null")
+    try:
+        return q.order("created_at", desc=True).order("id").limit(limit).execute().data or []
+    except Exception as exc:
+        logger.warning("alerts ophalen mislukt: %s", exc)
+        return []
+
+
+def mark_alerts_read(user_id, alert_ids=None):
+    """Markeer alerts als gelezen: de opgegeven ids, of alle ongelezen alerts van de gebruiker."""
+    if not _check_watchlists():
+        return
+    q = (
+        _get_client().table("alerts")
+        .update({"read_at": datetime.now(timezone.utc).isoformat()})
+        .eq("user_id", user_id)
+        .is_("read_at", "null")
+    )
+    if alert_ids:
+        q = q.in_("id", list(alert_ids))
+    q.execute()
+
+
+def get_verifications(retailer, webshop_ids):
+    """Opgeslagen verify-resultaten voor webshop_ids: {webshop_id: (present, checked_at)}."""
+    if not _check_product_verifications() or not webshop_ids:
+        return {}
+    sb = _get_client()
+    wids = [str(w) for w in webshop_ids]
+    result = {}
+    try:
+        for i in range(0, len(wids), 100):
+            rows = (
+                sb.table("product_verifications").select("webshop_id, present, checked_at")
+                .eq("retailer", retailer).in_("webshop_id", wids[i : i + 100]).execute().data or []
+            )
+            for r in rows:
+                result[r["webshop_id"]] = (bool(r["present"]), r["checked_at"])
+    except Exception as exc:
+        logger.warning("verify-cache lezen mislukt voor %s: %s", retailer, exc)
+        return {}
+    return result
+
+
+def upsert_verifications(rows):
+    """Schrijf verify-resultaten (primary key retailer, webshop_id) in batches van 500."""
+    if not _check_product_verifications() or not rows:
+        return
+    sb = _get_client()
+    try:
+        for i in range(0, len(rows), 500):
+            sb.table("product_verifications").upsert(rows[i : i + 500]).execute()
+    except Exception as exc:
+        logger.warning("verify-cache schrijven mislukt: %s", exc)
+
+
+def search_catalog(query, retailer=None, limit=20):
+    """Zoek in product_catalog via de Postgres-functie search_products (pg_trgm).
+    Gebruikt door de zoekindex zolang die nog niet is opgebouwd."""
+    if not _check_product_catalog() or not (query or "").strip():
+        return []
+    sb = _get_client()
+    try:
+        r = sb.rpc("search_products", {
+            "q": query.strip(),
+            "retailer_filter": retailer,
+            "max_results": limit,
+        }).execute()
+        return r.data or []
+    except Exception as exc:
+        logger.warning("search_products mislukt: %s", exc)
+        return []
+
+
+def _strip_product(p):
+    """Snapshot-product zonder raw_json (de volledige retailer-payload hoort niet in een diff)."""
+    return {k: v for k, v in p.items() if k != "raw_json"}
+
+
+def _diff_products(old_products, new_products):
+    """Pure diff van twee lijsten snapshot-producten op webshop_id. Retourneert dict met wijzigingen."""
+    old_products = {p["webshop_id"]: _strip_product(p) for p in old_products}
+    new_products = {p["webshop_id"]: _strip_product(p) for p in new_products}
 
     old_ids = set(old_products.keys())
     new_ids = set(new_products.keys())
@@ -400,11 +1728,80 @@ def compare_snapshots(old_id, new_id):
     return result
 
 
-def _generate_timeline_events(retailer, new_snapshot_id):
-    """Genereer timeline events door het nieuwe snapshot te vergelijken met het vorige."""
+def get_stored_diff(old_id, new_id):
+    """Opgeslagen diff uit snapshot_diffs (primary-key read), of None."""
+    if not _check_snapshot_diffs():
+        return None
+    sb = _get_client()
+    try:
+        r = (
+            sb.table("snapshot_diffs")
+            .select("diff")
+            .eq("old_snapshot_id", old_id)
+            .eq("new_snapshot_id", new_id)
+            .limit(1)
+            .execute()
+        )
+        return r.data[0]["diff"] if r.data else None
+    except Exception as exc:
+        logger.warning("snapshot diff %s..%s lezen mislukt: %s", old_id, new_id, exc)
+        return None
+
+
+def _store_diff(old_id, new_id, diff, product_counts):
+    """Bewaar een diff permanent, maar alleen als beide snapshots volledig geschreven zijn
+    (aantal gelezen producten == snapshots.product_count); een snapshot in ingest kan nog groeien."""
+    if not _check_snapshot_diffs():
+        return
+    sb = _get_client()
+    try:
+        snaps = sb.table("snapshots").select("id, product_count").in_("id", [old_id, new_id]).execute().data or []
+        expected = {s["id"]: s.get("product_count") for s in snaps}
+        if any(expected.get(sid) != product_counts[sid] for sid in (old_id, new_id)):
+            return
+        sb.table("snapshot_diffs").upsert({
+            "old_snapshot_id": old_id,
+            "new_snapshot_id": new_id,
+            "new_count": len(diff["new_products"]),
+            "removed_count": len(diff["removed_products"]),
+            "price_change_count": len(diff["price_changes"]),
+            "bonus_change_count": len(diff["bonus_changes"]),
+            "diff": diff,
+        }).execute()
+    except Exception as exc:
+        logger.warning("snapshot diff %s..%s opslaan mislukt: %s", old_id, new_id, exc)
+
+
+def compare_snapshots(old_id, new_id):
+    """Vergelijk twee snapshots. Retourneert dict met wijzigingen.
+    Snapshots veranderen niet meer na het schrijven: een diff wordt één keer berekend (voor
+    opeenvolgende snapshots al bij de ingest) en daarna uit snapshot_diffs gelezen. Het berekenen
+    gebeurt in Postgres (snapshot_diff); zonder die functie valt het terug op _diff_products."""
+    stored = get_stored_diff(old_id, new_id)
+    if stored is not None:
+        return stored
+    sb = _get_client()
+    try:
+        result = sb.rpc("snapshot_diff", {"old_id": old_id, "new_id": new_id}).execute().data
+        counts = result.pop("product_counts")
+        product_counts = {old_id: counts["old"], new_id: counts["new"]}
+    except Exception as exc:
+        logger.warning("snapshot_diff RPC mislukt, diff in Python: %s", exc)
+        old_products = get_snapshot_products(old_id)
+        new_products = get_snapshot_products(new_id)
+        result = _diff_products(old_products, new_products)
+        product_counts = {old_id: len(old_products), new_id: len(new_products)}
+    _store_diff(old_id, new_id, result, product_counts)
+    return result
+
+
+def _generate_timeline_events(retailer, new_snapshot_id, verifier=None):
+    """Genereer timeline events door het nieuwe snapshot te vergelijken met het vorige.
+    verifier is de verification.Verifier van deze ingest (gedeeld met de catalog-update).
+    Retourneert de ingevoegde events."""
     snapshots = get_snapshots(retailer)
     if len(snapshots) < 2:
-        return
+        return []
 
     old_id = snapshots[1]["id"]
     changes = compare_snapshots(old_id, new_snapshot_id)
@@ -423,10 +1820,11 @@ def _generate_timeline_events(retailer, new_snapshot_id):
 
     removed = changes["removed_products"]
     if removed:
-        from retailers import verify_products_exist
+        if verifier is None:
+            import verification
+            verifier = verification.Verifier(retailer)
         try:
-            removed_wids = [p["webshop_id"] for p in removed if p.get("webshop_id")]
-            still_exist = verify_products_exist(retailer, removed_wids)
+            still_exist = verifier.existing(p["webshop_id"] for p in removed if p.get("webshop_id"))
             removed = [p for p in removed if p.get("webshop_id") not in still_exist]
         except Exception:
             pass
@@ -468,13 +1866,16 @@ def _generate_timeline_events(retailer, new_snapshot_id):
             },
         })
 
+    inserted = []
     if events:
         try:
             batch_size = 500
             for i in range(0, len(events), batch_size):
-                sb.table("timeline_events").insert(events[i:i + batch_size]).execute()
+                res = sb.table("timeline_events").insert(events[i:i + batch_size]).execute()
+                inserted.extend(res.data or [])
         except Exception:
             pass
+    return inserted
 
 
 def get_timeline_events(limit=50, retailer=None, event_type=None):
@@ -493,9 +1894,12 @@ def get_timeline_events(limit=50, retailer=None, event_type=None):
 
 def get_retailer_stats():
     """Haal per retailer het laatste snapshot op voor de dashboard kaarten."""
+    return _retailer_stats(get_snapshots())
+
+
+def _retailer_stats(all_snapshots):
     from retailers import RETAILERS
     stats = {}
-    all_snapshots = get_snapshots()
     for slug in RETAILERS:
         if _check_retailer_column():
             retailer_snaps = [s for s in all_snapshots if s.get("retailer") == slug]
@@ -539,6 +1943,76 @@ def get_product_history(product_id, limit=50):
         return []
 
 
+BATCH_MAX_PRODUCTS = 200
+
+
+def get_catalog_rows_by_refs(refs):
+    """product_catalog rijen voor een lijst (retailer, webshop_id) paren, in één query."""
+    if not _check_product_catalog() or not refs:
+        return []
+    by_retailer = {}
+    for retailer, webshop_id in refs:
+        by_retailer.setdefault(retailer, set()).add(webshop_id)
+    groups = [
+        f"and(retailer.eq.{_postgrest_literal(retailer)},webshop_id.in.({','.join(_postgrest_literal(w) for w in sorted(wids))}))"
+        for retailer, wids in by_retailer.items()
+    ]
+    sb = _get_client()
+    try:
+        return sb.table("product_catalog").select("*").or_(",".join(groups)).execute().data or []
+    except Exception as exc:
+        logger.warning("catalog lookup op refs mislukt: %s", exc)
+        return []
+
+
+def get_products_batch(product_ids=(), refs=(), history_limit=1, price_series=False):
+    """Catalog-rijen, de laatste history_limit history-entries en optioneel de prijsreeks
+    ([[created_at, prijs], ...], oudste eerst) voor veel producten tegelijk.
+    Kost hoogstens drie queries, ongeacht het aantal producten.
+    Retourneert (items, missing): items in de gevraagde volgorde, missing met onbekende ids en refs."""
+    if not _check_product_catalog():
+        return [], {"ids": list(product_ids), "refs": [list(r) for r in refs]}
+    sb = _get_client()
+    product_ids = list(dict.fromkeys(product_ids))
+    rows = []
+    if product_ids:
+        try:
+            rows = sb.table("product_catalog").select("*").in_("id", product_ids).execute().data or []
+        except Exception as exc:
+            logger.warning("batch catalog lookup mislukt: %s", exc)
+    by_id = {r["id"]: r for r in rows}
+    by_ref = {(r["retailer"], r["webshop_id"]): r for r in get_catalog_rows_by_refs(refs)}
+
+    ordered = [by_id[pid] for pid in product_ids if pid in by_id]
+    ordered += [by_ref[tuple(ref)] for ref in refs if tuple(ref) in by_ref]
+    ordered = list({r["id"]: r for r in ordered}.values())
+    missing = {
+        "ids": [pid for pid in product_ids if pid not in by_id],
+        "refs": [list(ref) for ref in refs if tuple(ref) not in by_ref],
+    }
+    if not ordered:
+        return [], missing
+
+    extra = {}
+    try:
+        res = sb.rpc("product_batch_history", {
+            "pids": [r["id"] for r in ordered],
+            "per_product": history_limit,
+            "with_series": bool(price_series),
+        }).execute()
+        extra = {row["product_id"]: row for row in res.data or []}
+    except Exception as exc:
+        logger.warning("batch history ophalen mislukt: %s", exc)
+
+    items = []
+    for row in ordered:
+        item = {"product": row, "history": (extra.get(row["id"]) or {}).get("history") or []}
+        if price_series:
+            item["price_series"] = (extra.get(row["id"]) or {}).get("price_series") or []
+        items.append(item)
+    return items, missing
+
+
 DASHBOARD_EVENT_TYPES = ("price_change", "ingredients_change")
 
 
@@ -549,44 +2023,53 @@ def get_recent_changes(limit=50, retailer=None, event_type=None, since=None):
         return []
     sb = _get_client()
     try:
-        fetch_limit = min(limit * 3, 500)
-        q = (
-            sb.table("product_history")
-            .select("*")
-            .in_("event_type", list(DASHBOARD_EVENT_TYPES))
-            .order("created_at", desc=True)
-            .limit(fetch_limit)
-        )
-        if since:
-            q = q.gte("created_at", since)
-        if event_type:
-            q = q.eq("event_type", event_type)
-        rows = q.execute().data or []
+        rows = _recent_changes_query(sb, limit, event_type, since).execute().data or []
         if not rows:
             return []
-        product_ids = list({r["product_id"] for r in rows})
         catalog_by_id = {}
-        chunk_size = 100
-        for i in range(0, len(product_ids), chunk_size):
-            chunk = product_ids[i : i + chunk_size]
+        for chunk in _recent_change_id_chunks(rows):
             r = sb.table("product_catalog").select("*").in_("id", chunk).execute()
             for p in r.data or []:
                 catalog_by_id[p["id"]] = p
-        result = []
-        for h in rows:
-            product = catalog_by_id.get(h["product_id"])
-            if not product:
-                continue
-            if retailer and product.get("retailer") != retailer:
-                continue
-            result.append({**h, "product": product})
-            if len(result) >= limit:
-                break
-        return result
+        return _join_recent_changes(rows, catalog_by_id, retailer, limit)
     except Exception:
         return []
 
 
+def _recent_changes_query(sb, limit, event_type, since):
+    q = (
+        sb.table("product_history")
+        .select("*")
+        .in_("event_type", list(DASHBOARD_EVENT_TYPES))
+        .order("created_at", desc=True)
+        .limit(min(limit * 3, 500))
+    )
+    if since:
+        q = q.gte("created_at", since)
+    if event_type:
+        q = q.eq("event_type", event_type)
+    return q
+
+
+def _recent_change_id_chunks(rows, chunk_size=100):
+    product_ids = list({r["product_id"] for r in rows})
+    return [product_ids[i : i + chunk_size] for i in range(0, len(product_ids), chunk_size)]
+
+
+def _join_recent_changes(rows, catalog_by_id, retailer, limit):
+    result = []
+    for h in rows:
+        product = catalog_by_id.get(h["product_id"])
+        if not product:
+            continue
+        if retailer and product.get("retailer") != retailer:
+            continue
+        result.append({**h, "product": product})
+        if len(result) >= limit:
+            break
+    return result
+
+
 def get_product_at_snapshot(product_id, snapshot_id):
     """
     Haal het product op zoals het was in een bepaald snapshot.
@@ -598,7 +2081,6 @@ def get_product_at_snapshot(product_id, snapshot_id):
     catalog = get_product(product_id)
     if not catalog:
         return None
-    retailer = catalog.get("retailer") or "ah"
     webshop_id = catalog.get("webshop_id") or ""
     if not webshop_id:
         return None
@@ -623,10 +2105,21 @@ def get_product_at_snapshot(product_id, snapshot_id):
 
     # Snapshot-metadata
     snap_list = sb.table("snapshots").select("*").eq("id", snapshot_id).limit(1).execute().data
-    snapshot_meta = snap_list[0] if snap_list else {"id": snapshot_id, "created_at": None, "retailer": retailer}
+    snapshot_meta = snap_list[0] if snap_list else None
+    history = get_product_history(product_id, limit=200)
+    return _product_at_snapshot(product_id, snapshot_id, catalog, snapshot_row, snapshot_meta, history)
+
+
+def _product_at_snapshot(product_id, snapshot_id, catalog, snapshot_row, snapshot_meta, history):
+    """Resultaat van get_product_at_snapshot uit de opgehaalde rijen (history nieuwste eerst)."""
+    retailer = catalog.get("retailer") or "ah"
+    webshop_id = catalog.get("webshop_id") or ""
+    if snapshot_meta is None:
+        snapshot_meta = {"id": snapshot_id, "created_at": None, "retailer": retailer}
+    # Wijzigingen uit partiële refreshes hebben geen snapshot en dus geen eigen versie
+    history = [h for h in history if h.get("snapshot_id")]
 
     # History entry voor dit snapshot
-    history = get_product_history(product_id, limit=200)
     history_entry = next((h for h in history if h.get("snapshot_id") == snapshot_id), None)
     if not history_entry:
         history_entry = {
@@ -738,6 +2231,9 @@ def ensure_catalog_entry(retailer, webshop_id):
     ins = sb.table("product_catalog").insert(catalog_row).execute()
     if not ins.data:
         return None
+    import search
+    search.index_products(ins.data)
+    bump_generation(retailer)
     # Geen product_history schrijven bij lazy-aanmaak (gebruiker volgt product).
     # Alleen wijzigingen uit snapshots (supermarkt) horen in "Recente wijzigingen".
     return ins.data[0]
@@ -770,8 +2266,11 @@ def ensure_catalog_entries_for_webshop_ids(retailer, webshop_ids):
                 batch = to_insert[i : i + 100]
                 ins = sb.table("product_catalog").insert(batch).execute()
                 if ins.data:
+                    import search
+                    search.index_products(ins.data)
                     for row in ins.data:
                         catalog_ids[row["webshop_id"]] = row["id"]
         except Exception:
             pass
+        bump_generation(retailer)
     return catalog_ids
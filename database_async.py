@@ -0,0 +1,171 @@
+"""Async varianten van de drukste leespaden uit database.py, voor de ASGI-modus (asgi.py).
+
+Zelfde queries en resultaten als de sync functies, maar via de async PostgREST-client: een
+request houdt geen thread bezet terwijl het op Supabase wacht, en onafhankelijke queries
+binnen één request (zoals in get_product_at_snapshot) lopen tegelijk. Querybouw en het
+samenvoegen van resultaten komen uit database.py, zodat beide paden gelijk blijven.
+"""
+import asyncio
+import logging
+import os
+
+import database
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_loop = None
+
+
+def _get_client():
+    # httpx.AsyncClient hoort bij één event loop; bij een nieuwe loop (bijv. asyncio.run in een
+    # benchmark) een nieuwe client maken.
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        from postgrest import AsyncPostgrestClient
+        url = os.environ["SUPABASE_URL"].rstrip("/")
+        client = AsyncPostgrestClient(
+            f"{url}/rest/v1", headers=database._supabase_headers(), timeout=database.POSTGREST_TIMEOUT,
+        )
+        _client = instrumentation.instrument_client(client)
+        _client_loop = loop
+    return _client
+
+
+async def _check(name):
+    """database._check_<name>() zonder de event loop te blokkeren (alleen de eerste keer een query)."""
+    known = getattr(database, f"_has_{name}")
+    if known is not None:
+        return known
+    return await asyncio.to_thread(getattr(database, f"_check_{name}"))
+
+
+async def _pages(make_query, page_size=database.PAGE_SIZE):
+    """Als database._iter_pages, maar alle pagina's als lijst."""
+    rows = []
+    start = 0
+    while True:
+        page = (await make_query().range(start, start + page_size - 1).execute()).data or []
+        rows += page
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+async def get_snapshots(retailer=None):
+    """Alle snapshots ophalen, nieuwste eerst. Optioneel gefilterd op retailer."""
+    sb = _get_client()
+    has_retailer = await _check("retailer_column")
+    if retailer and not has_retailer and retailer != "ah":
+        return []
+
+    def make_query():
+        q = sb.table("snapshots").select("*").order("created_at", desc=True).order("id")
+        if retailer and has_retailer:
+            q = q.eq("retailer", retailer)
+        return q
+
+    return await _pages(make_query)
+
+
+async def get_retailer_stats():
+    """Haal per retailer het laatste snapshot op voor de dashboard kaarten."""
+    return database._retailer_stats(await get_snapshots())
+
+
+async def get_product(product_id):
+    """Haal een product_catalog record op op basis van id. Retourneert None als niet gevonden."""
+    if not await _check("product_catalog"):
+        return None
+    try:
+        r = await _get_client().table("product_catalog").select("*").eq("id", product_id).limit(1).execute()
+        return r.data[0] if r.data else None
+    except Exception:
+        return None
+
+
+async def get_product_history(product_id, limit=50):
+    """Haal product_history entries op voor een product, nieuwste eerst."""
+    if not await _check("product_catalog"):
+        return []
+    try:
+        r = await (
+            _get_client().table("product_history")
+            .select("*")
+            .eq("product_id", product_id)
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return r.data or []
+    except Exception:
+        return []
+
+
+async def get_recent_changes(limit=50, retailer=None, event_type=None, since=None):
+    """Recente product_history entries met product_catalog info (zie database.get_recent_changes).
+    De catalog-lookups per blok van 100 ids lopen tegelijk."""
+    if not await _check("product_catalog"):
+        return []
+    sb = _get_client()
+    try:
+        rows = (await database._recent_changes_query(sb, limit, event_type, since).execute()).data or []
+        if not rows:
+            return []
+        responses = await asyncio.gather(*(
+            sb.table("product_catalog").select("*").in_("id", chunk).execute()
+            for chunk in database._recent_change_id_chunks(rows)
+        ))
+        catalog_by_id = {p["id"]: p for r in responses for p in r.data or []}
+        return database._join_recent_changes(rows, catalog_by_id, retailer, limit)
+    except Exception:
+        return []
+
+
+async def get_catalog_page(retailer, filters=None, sort="title", descending=False, fields=None, limit=100, cursor=None):
+    """Eén pagina uit product_catalog via keyset-paginatie. Retourneert (rows, next_cursor).
+    Raises ValueError bij een ongeldige cursor."""
+    if not await _check("product_catalog"):
+        return [], None
+    q = database._catalog_page_query(_get_client(), retailer, filters, sort, descending, fields, limit, cursor)
+    return database._split_catalog_page((await q.execute()).data or [], sort, limit)
+
+
+async def get_product_at_snapshot(product_id, snapshot_id):
+    """Als database.get_product_at_snapshot. Na de catalog-rij worden de snapshot-rij, de
+    snapshot-metadata en de history tegelijk opgehaald (drie queries in één round trip-tijd)."""
+    catalog = await get_product(product_id)
+    if not catalog:
+        return None
+    webshop_id = catalog.get("webshop_id") or ""
+    if not webshop_id:
+        return None
+
+    sb = _get_client()
+
+    async def snapshot_row():
+        try:
+            r = await (
+                sb.table("products")
+                .select("*")
+                .eq("snapshot_id", snapshot_id)
+                .eq("webshop_id", webshop_id)
+                .limit(1)
+                .execute()
+            )
+            return r.data[0] if r.data else None
+        except Exception:
+            return None
+
+    async def snapshot_meta():
+        r = await sb.table("snapshots").select("*").eq("id", snapshot_id).limit(1).execute()
+        return r.data[0] if r.data else None
+
+    row, meta, history = await asyncio.gather(
+        snapshot_row(), snapshot_meta(), get_product_history(product_id, limit=200),
+    )
+    if not row:
+        return None
+    return database._product_at_snapshot(product_id, snapshot_id, catalog, row, meta, history)
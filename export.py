@@ -0,0 +1,292 @@
+"""Bulk-export van snapshots, product_history en timeline_events naar CSV, Parquet of Arrow IPC.
+
+Rijen worden per pagina uit de database gehaald en per batch weggeschreven, zodat ook een jaar
+aan history in begrensd geheugen geëxporteerd wordt: producten op id, history en timeline in
+tijdsvolgorde (keyset op created_at, id). De exportfuncties leveren een generator van bytes op
+die app.py direct als response streamt. raw_json wordt alleen meegenomen als daar expliciet om
+gevraagd wordt.
+
+De eerste pagina wordt opgehaald voordat de export begint, zodat een databasefout dan nog een
+gewone foutmelding geeft. Een fout halverwege breekt de stream af: de generator raiset, de
+HTTP-response eindigt zonder afsluitende chunk en de CLI verwijdert het halve bestand. Een
+Parquet- of Arrow-bestand krijgt dan geen footer, dus nooit een afgekapt bestand dat geldig lijkt.
+
+Parquet en Arrow gebruiken pyarrow (in requirements.txt); een installatie zonder pyarrow kan
+alleen CSV exporteren.
+
+Gebruik:
+  python3 export.py products <snapshot_id> [--format csv|parquet|arrow] [--raw-json] [-o bestand]
+  python3 export.py history [--retailer ah] [--since 2025-01-01] [--until 2026-01-01] [--format parquet]
+  python3 export.py timeline [--retailer ah] [--since ...] [--until ...] [--format arrow]
+"""
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optioneel: zonder pyarrow alleen CSV
+    pa = pq = None
+
+import database
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_ROWS = 5000
+
+# Formaat -> (mimetype, extensie)
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", "arrow"),
+}
+
+# Kolommen per dataset als (naam, soort); soort bepaalt de conversie en het Arrow-type.
+PRODUCT_COLUMNS = (
+    ("id", "string"), ("snapshot_id", "string"), ("retailer", "string"), ("webshop_id", "string"),
+    ("hq_id", "string"), ("title", "string"), ("brand", "string"), ("sales_unit_size", "string"),
+    ("price", "float"), ("unit_price_description", "string"), ("main_category", "string"),
+    ("sub_category", "string"), ("nutriscore", "string"), ("is_bonus", "bool"),
+    ("is_stapel_bonus", "bool"), ("discount_labels", "json"), ("description_highlights", "string"),
+    ("property_icons", "json"), ("image_url", "string"), ("available_online", "bool"),
+    ("order_availability_status", "string"), ("ingredients", "string"),
+)
+UNIT_PRICE_COLUMNS = (("unit_quantity", "float"), ("unit", "string"), ("price_per_unit", "float"))
+RAW_JSON_COLUMN = ("raw_json", "json")
+HISTORY_COLUMNS = (
+    ("id", "string"), ("product_id", "string"), ("snapshot_id", "string"), ("event_type", "string"),
+    ("changes", "json"), ("price_at_snapshot", "float"), ("created_at", "timestamp"),
+)
+HISTORY_CATALOG_COLUMNS = (("retailer", "string"), ("webshop_id", "string"), ("title", "string"))
+TIMELINE_COLUMNS = (
+    ("id", "string"), ("retailer", "string"), ("event_type", "string"), ("snapshot_id", "string"),
+    ("product_title", "string"), ("product_image_url", "string"), ("details", "json"),
+    ("created_at", "timestamp"),
+)
+
+
+def _convert(value, kind):
+    """Zet een waarde uit PostgREST om naar het Python-type voor zijn kolomsoort."""
+    if value is None:
+        return None
+    if kind == "float":
+        return float(value)
+    if kind == "bool":
+        return bool(value)
+    if kind == "json":
+        return json.dumps(value, ensure_ascii=False)
+    if kind == "timestamp":
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+    return str(value)
+
+
+def _prefetch(rows, name):
+    """Haal de eerste rij alvast op (een fout dan komt vóór de response) en breek de export af
+    bij een fout halverwege: loggen en opnieuw raisen, nooit stilletjes stoppen."""
+    rows = iter(rows)
+    try:
+        first = next(rows, None)
+    except Exception as exc:
+        logger.warning("export %s mislukt: %s", name, exc)
+        raise
+
+    def generate():
+        if first is None:
+            return
+        yield first
+        try:
+            yield from rows
+        except Exception as exc:
+            logger.error("export %s afgebroken: %s", name, exc)
+            raise
+
+    return generate()
+
+
+def _batches(rows, size=EXPORT_BATCH_ROWS):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_csv(rows, columns):
+    """CSV met header; per batch één chunk bytes."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _kind in columns])
+    yield buf.getvalue().encode()
+    for batch in _batches(rows):
+        buf.seek(0)
+        buf.truncate()
+        for row in batch:
+            values = (_convert(row.get(name), kind) for name, kind in columns)
+            writer.writerow(["" if v is None else v.isoformat() if isinstance(v, datetime) else v for v in values])
+        yield buf.getvalue().encode()
+
+
+class _ChunkSink:
+    """Schrijfbaar bestand voor pyarrow dat de geschreven bytes per batch weer afgeeft."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_type(kind):
+    return {
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }.get(kind, pa.string())
+
+
+def write_arrow(rows, columns, fmt):
+    """Parquet (één row group per batch) of Arrow IPC-bestand, beide zstd; per batch één chunk bytes."""
+    if pa is None:
+        raise ValueError("Export naar Parquet of Arrow vereist pyarrow (pip install pyarrow).")
+    schema = pa.schema([(name, _arrow_type(kind)) for name, kind in columns])
+
+    def generate():
+        sink = _ChunkSink()
+        if fmt == "parquet":
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        # Geen try/finally: bij een fout mag de writer geen footer schrijven.
+        for batch in _batches(rows):
+            arrays = [
+                pa.array([_convert(row.get(name), kind) for row in batch], type=field.type)
+                for (name, kind), field in zip(columns, schema)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    return generate()
+
+
+def _format(fmt):
+    """(mimetype, extensie) van een exportformaat. Raises ValueError bij een onbekend formaat."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Onbekend exportformaat: {fmt}")
+    return FORMATS[fmt]
+
+
+def _write(rows, columns, fmt):
+    if fmt == "csv":
+        return write_csv(rows, columns)
+    return write_arrow(rows, columns, fmt)
+
+
+def _flatten_history(rows):
+    for row in rows:
+        catalog = row.pop("product_catalog", None) or {}
+        for name, _kind in HISTORY_CATALOG_COLUMNS:
+            row[name] = catalog.get(name)
+        yield row
+
+
+def export_snapshot_products(snapshot_id, fmt="csv", include_raw_json=False):
+    """Export van alle producten van één snapshot. Retourneert (chunks, mimetype, bestandsnaam)."""
+    mimetype, ext = _format(fmt)
+    columns = PRODUCT_COLUMNS
+    if database._check_unit_price_columns():
+        columns += UNIT_PRICE_COLUMNS
+    if include_raw_json:
+        columns += (RAW_JSON_COLUMN,)
+    rows = database.iter_snapshot_products(snapshot_id, columns=", ".join(name for name, _kind in columns))
+    rows = _prefetch(rows, f"snapshot {snapshot_id}")
+    return _write(rows, columns, fmt), mimetype, f"snapshot-{snapshot_id}.{ext}"
+
+
+def export_product_history(retailer=None, since=None, until=None, fmt="csv"):
+    """Export van product_history (met retailer, webshop_id en titel) in [since, until)."""
+    mimetype, ext = _format(fmt)
+    columns = HISTORY_COLUMNS + HISTORY_CATALOG_COLUMNS
+    rows = database.iter_product_history(
+        retailer=retailer, since=since, until=until, columns=", ".join(name for name, _kind in HISTORY_COLUMNS),
+    )
+    rows = _prefetch(rows, "history")
+    return _write(_flatten_history(rows), columns, fmt), mimetype, f"history-{retailer or 'alle'}.{ext}"
+
+
+def export_timeline_events(retailer=None, since=None, until=None, fmt="csv"):
+    """Export van timeline_events in [since, until)."""
+    mimetype, ext = _format(fmt)
+    rows = _prefetch(database.iter_timeline_events(retailer=retailer, since=since, until=until), "timeline")
+    return _write(rows, TIMELINE_COLUMNS, fmt), mimetype, f"timeline-{retailer or 'alle'}.{ext}"
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import sys
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Exporteer snapshots, history of timeline events.")
+    parser.add_argument("dataset", choices=("products", "history", "timeline"))
+    parser.add_argument("snapshot_id", nargs="?", help="verplicht voor products")
+    parser.add_argument("--format", "-f", choices=tuple(FORMATS), default="csv")
+    parser.add_argument("--retailer")
+    parser.add_argument("--since", help="ISO-datum, inclusief")
+    parser.add_argument("--until", help="ISO-datum, exclusief")
+    parser.add_argument("--raw-json", action="store_true", help="raw_json meenemen (alleen products)")
+    parser.add_argument("--output", "-o", help="bestandsnaam (standaard afgeleid van de dataset)")
+    args = parser.parse_args()
+
+    try:
+        if args.dataset == "products":
+            if not args.snapshot_id:
+                parser.error("snapshot_id is verplicht voor products")
+            chunks, _mimetype, filename = export_snapshot_products(args.snapshot_id, args.format, args.raw_json)
+        elif args.dataset == "history":
+            chunks, _mimetype, filename = export_product_history(args.retailer, args.since, args.until, args.format)
+        else:
+            chunks, _mimetype, filename = export_timeline_events(args.retailer, args.since, args.until, args.format)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    path = args.output or filename
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+    except Exception as e:
+        os.remove(path)
+        sys.exit(f"Export afgebroken, {path} verwijderd: {e}")
+    print(f"{path}: {size / 1024:.1f} KiB geschreven.")
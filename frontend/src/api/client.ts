@@ -51,7 +51,7 @@ export interface CatalogProduct {
 export interface ProductHistoryEntry {
   id: string;
   product_id: string;
-  snapshot_id: string;
+  snapshot_id: string | null;
   event_type: string;
   changes: Record<string, unknown>;
   price_at_snapshot: number | null;
@@ -61,7 +61,7 @@ export interface ProductHistoryEntry {
 export interface RecentChange {
   id: string;
   product_id: string;
-  snapshot_id: string;
+  snapshot_id: string | null;
   event_type: string;
   changes: Record<string, unknown>;
   price_at_snapshot: number | null;
@@ -85,6 +85,46 @@ export interface Snapshot {
   productCount: number;
   label: string | null;
   retailerName?: string;
+  run?: SnapshotRun | null;
+}
+
+export interface SnapshotRunStage {
+  name: string;
+  ms: number;
+  http_requests: number;
+  http_bytes: number;
+  db_round_trips: number;
+  rows_written: number;
+}
+
+export interface CrawlReport {
+  products: number;
+  pages: number;
+  skipped_pages: number;
+  queries: Record<string, { pages: number; results: number; new: number; found: number; only_here: number; coverage: number }>;
+  overlap: Record<string, number>;
+}
+
+export interface SnapshotRun {
+  status: 'running' | 'ok' | 'error';
+  duration_ms: number | null;
+  stages: SnapshotRunStage[];
+  http_requests: number;
+  http_bytes: number;
+  db_round_trips: number;
+  rows_written: number;
+  crawl?: CrawlReport | null;
+}
+
+// Resultaat per retailer van refresh-all; de retailers draaien tegelijk, elk met een eigen deadline.
+export interface RetailerRunResult {
+  ok: boolean;
+  product_count?: number;
+  snapshot_id?: string | null;
+  duration_ms?: number;
+  error?: string;
+  skipped?: boolean;
+  timed_out?: boolean;
 }
 
 export interface TimelineEvent {
@@ -129,6 +169,79 @@ export interface CompareResult {
   bonus_changes: BonusChange[];
 }
 
+export interface ProductBatchItem {
+  product: CatalogProduct;
+  history: ProductHistoryEntry[];
+  price_series?: [string, number][];
+}
+
+export interface ProductBatchResult {
+  products: ProductBatchItem[];
+  missing: { ids: string[]; refs: [string, string][] };
+}
+
+export interface PriceStats {
+  product_id: string;
+  retailer: string;
+  price: number | null;
+  min_30d: number | null;
+  max_30d: number | null;
+  median_30d: number | null;
+  min_90d: number | null;
+  max_90d: number | null;
+  median_90d: number | null;
+  min_365d: number | null;
+  max_365d: number | null;
+  median_365d: number | null;
+  volatility_90d: number | null;
+  bonus_share_90d: number | null;
+  price_changes_365d: number;
+  last_price_change_at: string | null;
+  days_since_change: number | null;
+  last_change_pct: number | null;
+  change_zscore: number | null;
+  is_anomaly: boolean;
+  computed_at: string;
+  product_catalog?: {
+    webshop_id: string;
+    title: string;
+    brand: string | null;
+    image_url: string | null;
+    is_bonus: boolean;
+    is_available: boolean;
+  } | null;
+}
+
+export type WatchRule = 'any_change' | 'price_change' | 'price_drop' | 'bonus_start' | 'ingredients_change';
+
+export interface WatchlistEntry {
+  id: string;
+  product_id: string;
+  rule: WatchRule;
+  threshold_pct: number | null;
+  created_at: string;
+  product_catalog?: CatalogProduct | null;
+}
+
+export interface Alert {
+  id: string;
+  watchlist_id: string | null;
+  product_id: string;
+  history_id: string | null;
+  rule: WatchRule;
+  event_type: string;
+  changes: Record<string, { old: unknown; new: unknown; pct_change?: number }>;
+  created_at: string;
+  read_at: string | null;
+  product_catalog?: CatalogProduct | null;
+}
+
+export interface ChangeStreamHandlers {
+  onTimeline?: (events: TimelineEvent[]) => void;
+  onHistory?: (changes: RecentChange[]) => void;
+  onReset?: () => void;
+}
+
 const CACHE_TTL = {
   retailers: 5 * 60 * 1000,       // 5 min
   retailerProducts: 2 * 60 * 1000, // 2 min
@@ -139,6 +252,7 @@ const CACHE_TTL = {
   productHistory: 2 * 60 * 1000,   // 2 min
   productAtSnapshot: 2 * 60 * 1000, // 2 min
   recentChanges: 2 * 60 * 1000,    // 2 min
+  priceStats: 2 * 60 * 1000,       // 2 min
 } as const;
 
 const cache = new Map<string, { data: unknown; expiresAt: number }>();
@@ -234,18 +348,19 @@ function mapSnapshot(s: Record<string, unknown>): Snapshot {
     date: (s.created_at as string) || '',
     productCount: (s.product_count as number) || 0,
     label: (s.label as string) || null,
+    run: (s.run as SnapshotRun | null | undefined) ?? null,
   };
 }
 
 export const api = {
   auth: {
     login: (email: string, password: string) =>
-      request<{ email: string }>('/api/auth/login', {
+      request<{ email: string; id: string }>('/api/auth/login', {
         method: 'POST',
         body: JSON.stringify({ email, password }),
       }),
     logout: () => request<{ ok: boolean }>('/api/auth/logout', { method: 'POST' }),
-    me: () => request<{ email: string }>('/api/auth/me'),
+    me: () => request<{ email: string; id: string }>('/api/auth/me'),
   },
 
   retailers: () =>
@@ -258,22 +373,30 @@ export const api = {
     return raw.map(mapProduct);
   },
 
+  /** Eerste pagina van de catalogus (server-side gesorteerd op titel), voor een snelle eerste render. */
+  retailerProductsPage: async (slug: string, limit: number): Promise<Product[]> => {
+    const raw = await request<Record<string, unknown>[]>(`/api/retailers/${slug}/products?limit=${limit}`);
+    return raw.map(mapProduct);
+  },
+
   createSnapshot: async (slug: string) => {
     const result = await request<{ snapshot_id: string; product_count: number }>(
       `/api/retailers/${slug}/snapshot`,
       { method: 'POST' },
     );
     invalidateCache('retailerProducts');
+    invalidateCache('priceStats');
     invalidateCache('snapshots');
     return result;
   },
 
-  refreshAll: async (): Promise<{ results: Record<string, { ok: boolean; product_count?: number; snapshot_id?: string; error?: string }> }> => {
-    const data = await request<{ results: Record<string, { ok: boolean; product_count?: number; snapshot_id?: string; error?: string }> }>(
+  refreshAll: async (): Promise<{ results: Record<string, RetailerRunResult> }> => {
+    const data = await request<{ results: Record<string, RetailerRunResult> }>(
       '/api/retailers/refresh-all',
       { method: 'POST' },
     );
     invalidateCache('retailerProducts');
+    invalidateCache('priceStats');
     invalidateCache('snapshots');
     invalidateCache('retailers');
     return data;
@@ -318,6 +441,23 @@ export const api = {
     );
   },
 
+  productsBatch: (
+    ids: string[],
+    options?: { refs?: { retailer: string; webshop_id: string }[]; historyLimit?: number; priceSeries?: boolean },
+  ) => {
+    const refs = options?.refs ?? [];
+    const historyLimit = options?.historyLimit ?? 1;
+    const priceSeries = options?.priceSeries ?? false;
+    const refKey = refs.map((r) => `${r.retailer}/${r.webshop_id}`).join(',');
+    const key = `productsBatch:${ids.join(',')}:${refKey}:${historyLimit}:${priceSeries}`;
+    return cached(key, CACHE_TTL.product, () =>
+      request<ProductBatchResult>('/api/products/batch', {
+        method: 'POST',
+        body: JSON.stringify({ ids, refs, history_limit: historyLimit, price_series: priceSeries }),
+      })
+    );
+  },
+
   productHistory: (id: string, limit?: number) => {
     const key = `productHistory:${id}:${limit ?? ''}`;
     return cached(key, CACHE_TTL.productHistory, () => {
@@ -339,6 +479,53 @@ export const api = {
     });
   },
 
+  /** Prijsstatistieken per product; sort met een - ervoor is oplopend (standaard aflopend). */
+  priceStats: (retailer: string, options?: { sort?: string; anomalies?: boolean; limit?: number }) => {
+    const params = new URLSearchParams();
+    if (options?.sort) params.set('sort', options.sort);
+    if (options?.anomalies) params.set('anomalies', '1');
+    if (options?.limit != null) params.set('limit', String(options.limit));
+    const qs = params.toString();
+    return cached(`priceStats:${retailer}:${qs}`, CACHE_TTL.priceStats, () =>
+      request<PriceStats[]>(`/api/retailers/${retailer}/price-stats${qs ? `?${qs}` : ''}`)
+    );
+  },
+
+  productPriceStats: (id: string) =>
+    cached(`productPriceStats:${id}`, CACHE_TTL.priceStats, () =>
+      request<PriceStats>(`/api/products/${id}/price-stats`)
+    ),
+
+  watchlist: {
+    list: () => request<WatchlistEntry[]>('/api/watchlist'),
+    add: (productId: string, rule: WatchRule = 'any_change', thresholdPct?: number) =>
+      request<WatchlistEntry>('/api/watchlist', {
+        method: 'POST',
+        body: JSON.stringify({ product_id: productId, rule, threshold_pct: thresholdPct ?? null }),
+      }),
+    remove: (productId: string, rule?: WatchRule) =>
+      request<{ ok: boolean }>(
+        `/api/watchlist/${productId}${rule ? `?rule=${rule}` : ''}`,
+        { method: 'DELETE' },
+      ),
+  },
+
+  /** Inbox met alerts van de watchlist, nieuwste eerst. */
+  alerts: (options?: { unread?: boolean; limit?: number }) => {
+    const params = new URLSearchParams();
+    if (options?.unread) params.set('unread', '1');
+    if (options?.limit != null) params.set('limit', String(options.limit));
+    const qs = params.toString();
+    return request<Alert[]>(`/api/alerts${qs ? `?${qs}` : ''}`);
+  },
+
+  /** Markeer alerts als gelezen; zonder ids alle ongelezen alerts. */
+  markAlertsRead: (ids?: string[]) =>
+    request<{ ok: boolean }>('/api/alerts/read', {
+      method: 'POST',
+      body: JSON.stringify(ids ? { ids } : {}),
+    }),
+
   productAtSnapshot: (productId: string, snapshotId: string) => {
     const key = `productAtSnapshot:${productId}:${snapshotId}`;
     return cached(key, CACHE_TTL.productAtSnapshot, () =>
@@ -346,6 +533,35 @@ export const api = {
     );
   },
 
+  /**
+   * Abonneer op de change feed (SSE). De browser hervat na een verbroken verbinding zelf via
+   * Last-Event-ID; bij een reset moet de aanroeper zijn lijsten opnieuw ophalen.
+   * Retourneert een functie die het abonnement opzegt.
+   */
+  subscribeChanges: (handlers: ChangeStreamHandlers, retailer?: string): (() => void) => {
+    const params = retailer ? `?retailer=${encodeURIComponent(retailer)}` : '';
+    const source = new EventSource(`/api/changes/stream${params}`, { withCredentials: true });
+    source.addEventListener('timeline', (e) => {
+      invalidateCache('timeline');
+      handlers.onTimeline?.(JSON.parse((e as MessageEvent).data) as TimelineEvent[]);
+    });
+    source.addEventListener('history', (e) => {
+      invalidateCache('recentChanges');
+      handlers.onHistory?.(JSON.parse((e as MessageEvent).data) as RecentChange[]);
+    });
+    source.addEventListener('snapshot', () => {
+      invalidateCache('snapshots');
+      invalidateCache('retailers');
+      invalidateCache('retailerProducts');
+    });
+    source.addEventListener('reset', () => {
+      invalidateCache('timeline');
+      invalidateCache('recentChanges');
+      handlers.onReset?.();
+    });
+    return () => source.close();
+  },
+
   prefetchProducts: async () => {
     try {
       const retailers = await api.retailers();
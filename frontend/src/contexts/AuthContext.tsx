@@ -1,5 +1,6 @@
 import { createContext, useContext, useEffect, useState, type ReactNode } from 'react';
 import { api } from '@/api/client';
+import { setFollowedUser } from '@/hooks/useFollowedProducts';
 
 interface AuthState {
   email: string | null;
@@ -18,8 +19,14 @@ export function AuthProvider({ children }: { children: ReactNode }) {
 
   useEffect(() => {
     api.auth.me()
-      .then((data) => setEmail(data.email))
-      .catch(() => setEmail(null))
+      .then((data) => {
+        setFollowedUser(data.id);
+        setEmail(data.email);
+      })
+      .catch(() => {
+        setFollowedUser(null);
+        setEmail(null);
+      })
       .finally(() => setLoading(false));
   }, []);
 
@@ -32,6 +39,7 @@ export function AuthProvider({ children }: { children: ReactNode }) {
         localStorage.setItem('broodradar_previous_login', prev);
       }
       localStorage.setItem('broodradar_last_login', new Date().toISOString());
+      setFollowedUser(data.id);
       setEmail(data.email);
     } catch (e) {
       const msg = e instanceof Error ? e.message : 'Inloggen mislukt.';
@@ -42,6 +50,7 @@ export function AuthProvider({ children }: { children: ReactNode }) {
 
   const logout = async () => {
     await api.auth.logout();
+    setFollowedUser(null);
     setEmail(null);
   };
 
@@ -1,37 +1,115 @@
 import { useSyncExternalStore, useCallback } from "react";
+import { api } from "@/api/client";
 
-const STORAGE_KEY = "broodradar_followed";
+// Per gebruiker een eigen lijst, zodat een volgende login op hetzelfde apparaat die niet erft.
+const STORAGE_PREFIX = "broodradar_followed";
+// Oude, niet per gebruiker gescheiden sleutel; bij de eerste login naar de server-side watchlist
+// geüpload en pas daarna opgeruimd.
+const LEGACY_STORAGE_KEY = "broodradar_followed";
 
 const listeners = new Set<() => void>();
+const EMPTY: string[] = [];
 
+let userId: string | null = null;
 let cachedRaw: string | null = null;
-let cachedSnapshot: string[] = [];
+let cachedSnapshot: string[] = EMPTY;
+
+function storageKey(): string | null {
+  return userId ? `${STORAGE_PREFIX}:${userId}` : null;
+}
 
 function getSnapshot(): string[] {
+  const key = storageKey();
+  if (!key) return EMPTY;
   try {
-    const raw = localStorage.getItem(STORAGE_KEY);
+    const raw = localStorage.getItem(key);
     if (raw === cachedRaw) return cachedSnapshot;
     cachedRaw = raw;
     if (!raw) {
-      cachedSnapshot = [];
+      cachedSnapshot = EMPTY;
       return cachedSnapshot;
     }
     const parsed = JSON.parse(raw);
     cachedSnapshot = Array.isArray(parsed)
       ? parsed.filter((x): x is string => typeof x === "string")
-      : [];
+      : EMPTY;
     return cachedSnapshot;
   } catch {
     cachedRaw = null;
-    cachedSnapshot = [];
+    cachedSnapshot = EMPTY;
     return cachedSnapshot;
   }
 }
 
+function writeIds(ids: string[]) {
+  const key = storageKey();
+  if (!key) return;
+  localStorage.setItem(key, JSON.stringify(ids));
+  notify();
+}
+
+function readLegacyIds(): string[] {
+  try {
+    const parsed = JSON.parse(localStorage.getItem(LEGACY_STORAGE_KEY) || "[]");
+    return Array.isArray(parsed) ? parsed.filter((x): x is string => typeof x === "string") : [];
+  } catch {
+    return [];
+  }
+}
+
+/** Upload de gevolgde producten onder de oude sleutel naar de watchlist; retourneert de ids die
+ *  (nog) niet geüpload zijn. De sleutel verdwijnt pas als alles is aangekomen. */
+async function uploadLegacyIds(): Promise<string[]> {
+  const ids = readLegacyIds();
+  const results = await Promise.allSettled(ids.map((id) => api.watchlist.add(id)));
+  // 404: het product bestaat niet meer, dat hoeft ook later niet geüpload te worden.
+  const pending = ids.filter((_id, i) => {
+    const result = results[i];
+    return result.status === "rejected" && (result.reason as { status?: number }).status !== 404;
+  });
+  if (pending.length === 0) localStorage.removeItem(LEGACY_STORAGE_KEY);
+  return pending;
+}
+
+// De server-side watchlist is leidend; localStorage is alleen een cache die de UI direct bruikbaar
+// houdt. Eenmalig per login vervangt de lijst van de server de lokale lijst, nadat de oude lijst
+// van dit apparaat is geüpload.
+let synced = false;
+
+function syncWithServer() {
+  if (synced || !userId) return;
+  synced = true;
+  const forUser = userId;
+  uploadLegacyIds()
+    .then(async (pending) => {
+      const entries = await api.watchlist.list();
+      if (userId !== forUser) return;
+      const ids = entries.map((e) => e.product_id);
+      writeIds([...ids, ...pending.filter((id) => !ids.includes(id))]);
+      // Niet alles geüpload: bij de volgende subscribe opnieuw proberen.
+      if (pending.length > 0) synced = false;
+    })
+    .catch(() => {
+      if (userId === forUser) synced = false;
+    });
+}
+
+/** Koppel de lijst aan de ingelogde gebruiker (null na uitloggen); aangeroepen door AuthProvider. */
+export function setFollowedUser(id: string | null) {
+  if (id === userId) return;
+  userId = id;
+  synced = false;
+  cachedRaw = null;
+  cachedSnapshot = EMPTY;
+  if (id && listeners.size > 0) syncWithServer();
+  notify();
+}
+
 function subscribe(callback: () => void): () => void {
+  syncWithServer();
   listeners.add(callback);
   const storageHandler = (e: StorageEvent) => {
-    if (e.key === STORAGE_KEY) callback();
+    if (e.key === storageKey()) callback();
   };
   window.addEventListener("storage", storageHandler);
   return () => {
@@ -45,28 +123,27 @@ function notify() {
 }
 
 function getServerSnapshot(): string[] {
-  return [];
+  return EMPTY;
 }
 
 export function useFollowedProducts() {
   const followedIds = useSyncExternalStore(subscribe, getSnapshot, getServerSnapshot);
 
   const follow = useCallback((catalogId: string) => {
-    if (!catalogId) return;
+    if (!catalogId || !userId) return;
     const current = getSnapshot();
     if (current.includes(catalogId)) return;
-    const next = [...current, catalogId];
-    localStorage.setItem(STORAGE_KEY, JSON.stringify(next));
-    notify();
+    writeIds([...current, catalogId]);
+    api.watchlist.add(catalogId).catch(() => {});
   }, []);
 
   const unfollow = useCallback((catalogId: string) => {
-    if (!catalogId) return;
+    if (!catalogId || !userId) return;
     const current = getSnapshot();
     const next = current.filter((id) => id !== catalogId);
     if (next.length === current.length) return;
-    localStorage.setItem(STORAGE_KEY, JSON.stringify(next));
-    notify();
+    writeIds(next);
+    api.watchlist.remove(catalogId).catch(() => {});
   }, []);
 
   const isFollowed = useCallback(
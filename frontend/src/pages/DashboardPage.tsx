@@ -26,6 +26,9 @@ const EVENT_LABELS: Record<string, string> = {
   multi_change: "Wijziging",
 };
 
+// Zelfde selectie als database.DASHBOARD_EVENT_TYPES
+const DASHBOARD_EVENT_TYPES = ["price_change", "ingredients_change"];
+
 export default function DashboardPage() {
   const { followedIds, unfollow } = useFollowedProducts();
   const { since, setSince } = useChangesSince();
@@ -45,6 +48,20 @@ export default function DashboardPage() {
     api.recentChanges(50, undefined, undefined, since).then(setRecentChanges).finally(() => setLoadingChanges(false));
   }, [since]);
 
+  useEffect(() => {
+    return api.subscribeChanges({
+      onHistory: (changes) => {
+        const fresh = changes.filter(
+          (c) => c.product && DASHBOARD_EVENT_TYPES.includes(c.event_type) && new Date(c.created_at) >= new Date(since)
+        );
+        if (fresh.length > 0) setRecentChanges((prev) => [...fresh, ...prev].slice(0, 50));
+      },
+      onReset: () => {
+        api.recentChanges(50, undefined, undefined, since).then(setRecentChanges).catch(() => {});
+      },
+    });
+  }, [since]);
+
   useEffect(() => {
     if (followedIds.length === 0) {
       setProducts([]);
@@ -53,21 +70,21 @@ export default function DashboardPage() {
       return;
     }
     setLoading(true);
-    Promise.all(
-      followedIds.map((id) =>
-        Promise.all([
-          api.product(id).catch(() => null),
-          api.productHistory(id, 1).then((h) => (h.length > 0 ? h[0] : null)).catch(() => null),
-        ])
-      )
-    ).then((results) => {
-      setProducts(results.map(([p]) => p));
-      const byId: Record<string, ProductHistoryEntry | null> = {};
-      followedIds.forEach((id, i) => {
-        byId[id] = results[i][1];
-      });
-      setHistories(byId);
-    }).finally(() => setLoading(false));
+    api.productsBatch(followedIds, { historyLimit: 1 })
+      .then((result) => {
+        const found = new Map(result.products.map((item) => [item.product.id, item]));
+        setProducts(followedIds.map((id) => found.get(id)?.product ?? null));
+        const byId: Record<string, ProductHistoryEntry | null> = {};
+        followedIds.forEach((id) => {
+          byId[id] = found.get(id)?.history[0] ?? null;
+        });
+        setHistories(byId);
+      })
+      .catch(() => {
+        setProducts([]);
+        setHistories({});
+      })
+      .finally(() => setLoading(false));
   }, [followedIds.join(",")]);
 
   const followedProducts = useMemo(
@@ -1,6 +1,6 @@
 import { useParams, Link, useNavigate } from "react-router-dom";
 import { useEffect, useState, useMemo, type ComponentType } from "react";
-import { api, type CatalogProduct, type ProductHistoryEntry, type ProductAtSnapshot, type Retailer } from "@/api/client";
+import { api, type CatalogProduct, type ProductBatchResult, type ProductHistoryEntry, type ProductAtSnapshot, type Retailer } from "@/api/client";
 import { Card, CardContent } from "@/components/ui/Card";
 import { Badge } from "@/components/ui/Badge";
 import { Skeleton } from "@/components/ui/Skeleton";
@@ -197,11 +197,11 @@ export default function ProductDetailPage() {
     setVersionIndex(null);
     setVersionCount(0);
 
-    const loadCatalogId = byRef && refRetailer && refWebshopId
-      ? api.productByRef(refRetailer, refWebshopId).then((p) => p.id)
+    const loadBatch = byRef && refRetailer && refWebshopId
+      ? api.productsBatch([], { refs: [{ retailer: refRetailer, webshop_id: refWebshopId }], historyLimit: 50 })
       : id
-        ? Promise.resolve(id)
-        : Promise.reject<string>(new Error("Geen id"));
+        ? api.productsBatch([id], { historyLimit: 50 })
+        : Promise.reject<ProductBatchResult>(new Error("Geen id"));
 
     if (isVersionMode && id && snapshotIdParam) {
       Promise.all([
@@ -223,19 +223,12 @@ export default function ProductDetailPage() {
       return;
     }
 
-    loadCatalogId
-      .then((catalogId) =>
-        Promise.all([
-          byRef && refRetailer && refWebshopId
-            ? api.productByRef(refRetailer, refWebshopId)
-            : api.product(catalogId),
-          api.productHistory(catalogId, 50),
-          api.retailers(),
-        ])
-      )
-      .then(([p, h, r]) => {
-        setProduct(p);
-        setHistory(h);
+    Promise.all([loadBatch, api.retailers()])
+      .then(([batch, r]) => {
+        const item = batch.products[0];
+        if (!item) throw new Error("Product niet gevonden");
+        setProduct(item.product);
+        setHistory(item.history);
         setRetailers(r);
       })
       .catch(() => setError("Product niet gevonden"))
@@ -8,6 +8,7 @@ import { Search, Heart, ChevronDown, Calendar } from "lucide-react";
 import { useState, useMemo, useEffect, useRef } from "react";
 import { useFollowedProducts } from "@/hooks/useFollowedProducts";
 
+const FIRST_PAGE_SIZE = 48;
 
 function formatShortDate(iso: string | null): string {
   if (!iso) return "";
@@ -65,10 +66,30 @@ export default function ProductsPage() {
     }
     setLoading(true);
     const active = retailers.filter((r) => r.active);
+    let cancelled = false;
+    let fullLoaded = false;
+    // Eerst een kleine pagina per supermarkt tonen; de volledige catalogus laadt erachteraan.
+    Promise.all(active.map((r) => api.retailerProductsPage(r.id, FIRST_PAGE_SIZE)))
+      .then((arrays) => {
+        if (cancelled || fullLoaded) return;
+        setProducts(arrays.flat());
+        setLoading(false);
+      })
+      .catch(() => {});
     Promise.all(active.map((r) => api.retailerProducts(r.id)))
-      .then((arrays) => setProducts(arrays.flat()))
-      .catch(() => setProducts([]))
-      .finally(() => setLoading(false));
+      .then((arrays) => {
+        fullLoaded = true;
+        if (!cancelled) setProducts(arrays.flat());
+      })
+      .catch(() => {
+        if (!cancelled) setProducts([]);
+      })
+      .finally(() => {
+        if (!cancelled) setLoading(false);
+      });
+    return () => {
+      cancelled = true;
+    };
   }, [retailers]);
 
   const filteredProducts = useMemo(() => {
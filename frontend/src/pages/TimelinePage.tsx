@@ -58,6 +58,18 @@ export default function TimelinePage() {
       .finally(() => setLoading(false));
   }, [retailerFilter, typeFilter]);
 
+  useEffect(() => {
+    return api.subscribeChanges({
+      onTimeline: (incoming) => {
+        const fresh = incoming.filter((e) => !typeFilter || e.event_type === typeFilter);
+        if (fresh.length > 0) setEvents((prev) => [...fresh, ...prev]);
+      },
+      onReset: () => {
+        api.timeline(retailerFilter || undefined, typeFilter || undefined).then(setEvents).catch(() => {});
+      },
+    }, retailerFilter || undefined);
+  }, [retailerFilter, typeFilter]);
+
   return (
     <div className="space-y-8">
       <div>
@@ -0,0 +1,427 @@
+"""Performance-instrumentatie per request: auth, Supabase-calls en serialisatie.
+
+Aan te zetten met INSTRUMENTATION=1. Dan:
+  - wordt de Supabase-client uit database._get_client() (en de async client uit
+    database_async) omhuld, zodat elke .execute() wordt geteld per tabel en operatie
+    (select/insert/update/upsert/delete/rpc), met rijen, bytes (lengte van de HTTP-response) en duur;
+  - krijgt elke response een Server-Timing header (auth, db, serialize, app, total);
+  - wordt per request één gestructureerde logregel (JSON) geschreven, voor gestreamde
+    responses pas als de stream klaar is;
+  - levert /api/metrics de totalen in Prometheus-tekstformaat.
+Uitgeschakeld is span() een lege context manager, worden er geen Flask-hooks geregistreerd
+en is de client de kale PostgREST-client; alleen binnen een snapshot-run omhult run_client() hem
+voor de tellingen van die run.
+
+Daarnaast meet stage() de stages van de snapshot-pipeline (pipeline.py): duur, HTTP-requests
+en bytes naar de retailer, database round trips en geschreven rijen, plus het crawl-rapport van
+de fetcher (record_crawl). Dat staat altijd aan.
+"""
+import contextlib
+import contextvars
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("INSTRUMENTATION", "").strip().lower() in ("1", "true", "ja")
+
+OPERATIONS = ("select", "insert", "update", "upsert", "delete")
+WRITE_OPERATIONS = ("insert", "update", "upsert", "delete")
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar("request_timings", default=None)
+# Lengte van de laatste HTTP-response van de PostgREST-client (gezet door een httpx response hook).
+_response_bytes = contextvars.ContextVar("response_bytes", default=None)
+_nullspan = contextlib.nullcontext()
+
+
+class RequestTimings:
+    """Verzamelde timings van één request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.calls = []
+
+    def add_span(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    @property
+    def db_seconds(self):
+        return sum(c["seconds"] for c in self.calls)
+
+
+class _Metrics:
+    """Cumulatieve tellers en histogrammen voor /api/metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.request_durations = {}
+        self.db_calls = {}
+
+    def observe_request(self, endpoint, method, status, seconds):
+        with self._lock:
+            key = (endpoint, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.request_durations.setdefault(endpoint, [[0] * len(DURATION_BUCKETS), 0, 0.0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    hist[0][i] += 1
+            hist[1] += 1
+            hist[2] += seconds
+
+    def observe_db(self, table, operation, rows, size, seconds):
+        with self._lock:
+            entry = self.db_calls.setdefault((table, operation), [0, 0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += rows
+            entry[2] += size
+            entry[3] += seconds
+
+    def render(self):
+        """Alle metrics in Prometheus-tekstformaat."""
+        def labels(**kv):
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in kv.items()) + "}"
+
+        lines = [
+            "# HELP broodradar_http_requests_total HTTP-requests per endpoint, methode en status.",
+            "# TYPE broodradar_http_requests_total counter",
+        ]
+        with self._lock:
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f"broodradar_http_requests_total{labels(endpoint=endpoint, method=method, status=status)} {count}")
+            lines += [
+                "# HELP broodradar_http_request_duration_seconds Duur van HTTP-requests (tot en met de laatste byte).",
+                "# TYPE broodradar_http_request_duration_seconds histogram",
+            ]
+            for endpoint, (buckets, count, total) in sorted(self.request_durations.items()):
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f"broodradar_http_request_duration_seconds_bucket{labels(endpoint=endpoint, le=bound)} {bucket_count}")
+                lines.append(f"broodradar_http_request_duration_seconds_bucket{labels(endpoint=endpoint, le='+Inf')} {count}")
+                lines.append(f"broodradar_http_request_duration_seconds_sum{labels(endpoint=endpoint)} {total:.6f}")
+                lines.append(f"broodradar_http_request_duration_seconds_count{labels(endpoint=endpoint)} {count}")
+            for name, index, kind, help_text in (
+                ("broodradar_db_calls_total", 0, "counter", "Supabase-calls per tabel en operatie."),
+                ("broodradar_db_rows_total", 1, "counter", "Rijen teruggegeven door Supabase-calls."),
+                ("broodradar_db_bytes_total", 2, "counter", "Bytes (JSON-data) teruggegeven door Supabase-calls."),
+                ("broodradar_db_call_seconds_total", 3, "counter", "Totale duur van Supabase-calls."),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for (table, operation), entry in sorted(self.db_calls.items()):
+                    value = f"{entry[index]:.6f}" if index == 3 else entry[index]
+                    lines.append(f"{name}{labels(table=table, operation=operation)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = _Metrics()
+
+
+def span(name):
+    """Context manager die de duur van een blok optelt bij de huidige request (bijv. "auth")."""
+    if not ENABLED:
+        return _nullspan
+    return _Span(name)
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timings = _current.get()
+        if timings is not None:
+            timings.add_span(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def _record_call(table, operation, response, seconds):
+    data = getattr(response, "data", None)
+    if isinstance(data, list):
+        rows = len(data)
+    else:
+        rows = 0 if data is None else 1
+    operation = operation or "select"
+    run = _current_run.get()
+    if run is not None:
+        run.db_round_trips += 1
+        if operation in WRITE_OPERATIONS:
+            run.rows_written += rows
+    if not ENABLED:
+        return
+    size = _response_bytes.get() or 0
+    metrics.observe_db(table, operation, rows, size, seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.calls.append({
+            "table": table, "operation": operation, "rows": rows, "bytes": size, "seconds": seconds,
+        })
+
+
+class _QueryProxy:
+    """Omhult een postgrest query builder; onthoudt tabel en operatie en meet .execute()."""
+
+    __slots__ = ("_builder", "_table", "_operation")
+
+    def __init__(self, builder, table, operation=None):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def execute(self):
+        _response_bytes.set(None)
+        started = time.perf_counter()
+        response = self._builder.execute()
+        if inspect.isawaitable(response):
+            # async client (database_async): meten als de coroutine klaar is
+            return self._record_when_done(response, started)
+        _record_call(self._table, self._operation, response, time.perf_counter() - started)
+        return response
+
+    async def _record_when_done(self, pending, started):
+        response = await pending
+        _record_call(self._table, self._operation, response, time.perf_counter() - started)
+        return response
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        operation = self._operation or (name if name in OPERATIONS else None)
+        if not callable(attr):
+            # bijv. .not_ levert een nieuwe builder op
+            return _QueryProxy(attr, self._table, operation) if hasattr(attr, "execute") else attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return _QueryProxy(result, self._table, operation) if hasattr(result, "execute") else result
+        return call
+
+
+class _InstrumentedClient:
+    """Supabase-client waarvan table() en rpc() geïnstrumenteerde builders opleveren."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name):
+        return _QueryProxy(self._client.table(name), name)
+
+    def rpc(self, fn, params=None, *args, **kwargs):
+        return _QueryProxy(self._client.rpc(fn, params, *args, **kwargs), fn, "rpc")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def _on_response(response):
+    response.read()
+    _response_bytes.set(len(response.content))
+
+
+async def _on_response_async(response):
+    await response.aread()
+    _response_bytes.set(len(response.content))
+
+
+def instrument_client(client):
+    """Omhul de Supabase-client zodat elke .execute() wordt geteld, met de responselengte via een
+    response hook op de httpx-sessie. Uitgeschakeld komt de client zelf terug (zie run_client)."""
+    if not ENABLED:
+        return client
+    session = client.session
+    hook = _on_response_async if inspect.iscoroutinefunction(session.send) else _on_response
+    session.event_hooks = {**session.event_hooks, "response": [*session.event_hooks["response"], hook]}
+    return _InstrumentedClient(client)
+
+
+def run_client(client):
+    """De client voor een databasecall: binnen een snapshot-run (die altijd gemeten wordt) een
+    tellende wrapper, ook als de instrumentatie uit staat; anders de client zelf."""
+    if _current_run.get() is None or isinstance(client, _InstrumentedClient):
+        return client
+    return _InstrumentedClient(client)
+
+
+def _server_timing(timings):
+    total = time.perf_counter() - timings.started
+    parts = []
+    for name, seconds in timings.spans.items():
+        parts.append(f"{name};dur={seconds * 1000:.1f}")
+    db = timings.db_seconds
+    parts.append(f'db;dur={db * 1000:.1f};desc="{len(timings.calls)} queries"')
+    app_seconds = max(total - db - sum(timings.spans.values()), 0.0)
+    parts.append(f"app;dur={app_seconds * 1000:.1f}")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _finish(timings, endpoint, method, path, status, token):
+    seconds = time.perf_counter() - timings.started
+    metrics.observe_request(endpoint, method, status, seconds)
+    calls = {}
+    for c in timings.calls:
+        key = f"{c['operation']} {c['table']}"
+        entry = calls.setdefault(key, {"count": 0, "rows": 0, "bytes": 0, "ms": 0.0})
+        entry["count"] += 1
+        entry["rows"] += c["rows"]
+        entry["bytes"] += c["bytes"]
+        entry["ms"] += c["seconds"] * 1000
+    logger.info(json.dumps({
+        "event": "request",
+        "method": method,
+        "path": path,
+        "endpoint": endpoint,
+        "status": status,
+        "duration_ms": round(seconds * 1000, 1),
+        "spans_ms": {k: round(v * 1000, 1) for k, v in timings.spans.items()},
+        "db_ms": round(timings.db_seconds * 1000, 1),
+        "db_calls": len(timings.calls),
+        "calls": {k: {**v, "ms": round(v["ms"], 1)} for k, v in calls.items()},
+    }))
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)
+
+
+def init_app(app):
+    """Registreer de request-hooks en /api/metrics. Doet niets als instrumentatie uit staat."""
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_timings():
+        timings = RequestTimings()
+        g._timings_token = _current.set(timings)
+        g._timings = timings
+
+    @app.after_request
+    def _add_server_timing(response):
+        timings = g.get("_timings")
+        if timings is None:
+            return response
+        response.headers["Server-Timing"] = _server_timing(timings)
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        args = (timings, endpoint, request.method, request.path, response.status_code, g._timings_token)
+        # Pas na de laatste byte loggen: gestreamde responses doen dan nog databasecalls.
+        response.call_on_close(lambda: _finish(*args))
+        return response
+
+    original_response = app.json.response
+
+    def timed_response(*args, **kwargs):
+        with span("serialize"):
+            return original_response(*args, **kwargs)
+
+    app.json.response = timed_response
+    logger.info("instrumentatie actief")
+
+
+# ---------------------------------------------------------------------------
+# Snapshot-pipeline: timings en tellers per stage (altijd actief, los van INSTRUMENTATION)
+# ---------------------------------------------------------------------------
+# HTTP-verkeer naar retailers wordt per retailer globaal geteld, omdat de fetchers met
+# thread pools werken (een ContextVar gaat niet mee naar die threads). Databaseverkeer
+# loopt in de thread van de run en wordt via een ContextVar aan de lopende run toegerekend
+# (in _record_call; geschreven rijen zijn de rijen die insert/update/upsert/delete teruggeven).
+
+_current_run = contextvars.ContextVar("pipeline_run", default=None)
+_http_counters = {}
+_http_lock = threading.Lock()
+
+
+class PipelineRun:
+    """Stages van één snapshot-run, in volgorde; geneste stages heten "ouder/kind"."""
+
+    def __init__(self, retailer):
+        self.retailer = retailer
+        self.stages = []
+        self.db_round_trips = 0
+        self.rows_written = 0
+        self.crawl = None
+        self._stack = []
+        self._http_start = _http_counts(retailer)
+
+    def totals(self):
+        """Totalen over de hele run, inclusief werk buiten de benoemde stages."""
+        http = _http_counts(self.retailer)
+        return {
+            "http_requests": http[0] - self._http_start[0],
+            "http_bytes": http[1] - self._http_start[1],
+            "db_round_trips": self.db_round_trips,
+            "rows_written": self.rows_written,
+        }
+
+
+def record_http(retailer, nbytes):
+    """Tel één HTTP-request naar een retailer (aangeroepen door de fetchers)."""
+    with _http_lock:
+        counter = _http_counters.setdefault(retailer, [0, 0])
+        counter[0] += 1
+        counter[1] += nbytes
+
+
+def record_crawl(report):
+    """Bewaar het crawl-rapport van de fetcher (dekking per zoekterm, zie retailers/crawl.py)
+    bij de lopende snapshot-run (no-op buiten een run)."""
+    run = _current_run.get()
+    if run is not None:
+        run.crawl = report
+
+
+def requests_hook(retailer):
+    """Response-hook voor een requests.Session die het verkeer van retailer telt."""
+    def hook(response, *args, **kwargs):
+        record_http(retailer, len(response.content))
+    return hook
+
+
+def _http_counts(retailer):
+    with _http_lock:
+        return tuple(_http_counters.get(retailer, (0, 0)))
+
+
+def start_run(retailer):
+    run = PipelineRun(retailer)
+    return run, _current_run.set(run)
+
+
+def end_run(token):
+    _current_run.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Meet een stage van de lopende snapshot-run (no-op buiten een run)."""
+    run = _current_run.get()
+    if run is None:
+        yield
+        return
+    run._stack.append(name)
+    entry = {"name": "/".join(run._stack)}
+    run.stages.append(entry)  # nu al, zodat ouders vóór hun kinderen staan
+    http_before = _http_counts(run.retailer)
+    db_before = (run.db_round_trips, run.rows_written)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        run._stack.pop()
+        http_after = _http_counts(run.retailer)
+        entry.update({
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "http_requests": http_after[0] - http_before[0],
+            "http_bytes": http_after[1] - http_before[1],
+            "db_round_trips": run.db_round_trips - db_before[0],
+            "rows_written": run.rows_written - db_before[1],
+        })
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Loaddriver voor de Flask-API: speelt dashboard-, catalogus-, history- en compare-verkeer af
+met een vaste concurrency en rapporteert per endpoint de throughput en p50/p95/p99-latency.
+
+Elke worker logt in via /api/auth/login en kiest daarna steeds een scenario (gewogen):
+  dashboard  /api/retailers, /api/recent-changes, /api/timeline, /api/products/batch
+  products   /api/retailers/<slug>/products (pagina + volgende cursor), /api/retailers/<slug>/facets
+  history    /api/products/<id>, /api/products/<id>/history
+  compare    /api/snapshots, /api/snapshots/compare
+Met --snapshot-every draait daarnaast periodiek de snapshot-pipeline via
+POST /api/retailers/<slug>/snapshot.
+
+Gebruik:
+  python3 loadtest/driver.py --base-url http://127.0.0.1:5001 [--concurrency 16] [--duration 60]
+      [--mix dashboard=4,products=3,history=2,compare=1] [--output resultaat.json]
+  Inloggegevens: --email/--password of LOADTEST_EMAIL/LOADTEST_PASSWORD.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loadtest.fake_supabase import DEFAULT_EMAIL, DEFAULT_PASSWORD
+
+RETAILER_SLUGS = ("ah", "jumbo", "plus")
+SORTS = ("title", "price", "last_seen_at", "unit_price")
+QUERIES = ("", "", "", "volkoren", "bollen", "spelt")
+DEFAULT_MIX = "dashboard=4,products=3,history=2,compare=1"
+
+
+class Recorder:
+    """Latencies en fouten per endpoint (route-template)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds * 1000)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed):
+        out = {}
+        with self._lock:
+            for endpoint, timings in sorted(self.latencies.items()):
+                q = statistics.quantiles(timings, n=100, method="inclusive") if len(timings) > 1 else timings * 99
+                out[endpoint] = {
+                    "requests": len(timings),
+                    "errors": self.errors.get(endpoint, 0),
+                    "rps": round(len(timings) / elapsed, 2),
+                    "p50_ms": round(q[49], 1),
+                    "p95_ms": round(q[94], 1),
+                    "p99_ms": round(q[98], 1),
+                    "max_ms": round(max(timings), 1),
+                }
+        return out
+
+
+class Client:
+    """requests.Session met inlog en meting per request."""
+
+    def __init__(self, base_url, recorder, email, password):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.session = requests.Session()
+        self.login(email, password)
+
+    def login(self, email, password):
+        resp = self.session.post(f"{self.base_url}/api/auth/login", json={"email": email, "password": password}, timeout=30)
+        if resp.status_code != 200:
+            raise RuntimeError(f"inloggen mislukt: {resp.status_code} {resp.text[:200]}")
+
+    def request(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            resp = self.session.request(method, f"{self.base_url}{path}", timeout=60, **kwargs)
+            resp.content  # ook gestreamde responses volledig lezen
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            resp, ok = None, False
+        self.recorder.record(endpoint, time.perf_counter() - started, ok)
+        return resp
+
+    def get(self, endpoint, path, **kwargs):
+        return self.request(endpoint, "GET", path, **kwargs)
+
+
+class Pool:
+    """Product-id's en snapshot-paren om requests mee te vullen (opgehaald bij de start)."""
+
+    def __init__(self, client):
+        self.product_ids = []
+        self.snapshot_pairs = {}
+        for slug in RETAILER_SLUGS:
+            resp = client.session.get(f"{client.base_url}/api/retailers/{slug}/products", params={"limit": 200}, timeout=60)
+            if resp.ok:
+                self.product_ids += [p["id"] for p in resp.json()]
+            resp = client.session.get(f"{client.base_url}/api/snapshots", params={"retailer": slug}, timeout=60)
+            if resp.ok:
+                ids = [s["id"] for s in resp.json()]
+                self.snapshot_pairs[slug] = list(zip(ids[1:], ids[:-1]))
+        if not self.product_ids:
+            raise RuntimeError("geen producten gevonden; is de database gevuld?")
+
+
+def scenario_dashboard(client, pool, rng):
+    client.get("/api/retailers", "/api/retailers")
+    client.get("/api/recent-changes", "/api/recent-changes?limit=50")
+    client.get("/api/timeline", "/api/timeline")
+    ids = rng.sample(pool.product_ids, min(20, len(pool.product_ids)))
+    client.request("/api/products/batch", "POST", "/api/products/batch", json={"ids": ids, "history_limit": 1})
+
+
+def scenario_products(client, pool, rng):
+    slug = rng.choice(RETAILER_SLUGS)
+    params = {"limit": 100, "sort": rng.choice(SORTS)}
+    q = rng.choice(QUERIES)
+    if q:
+        params["q"] = q
+    endpoint = "/api/retailers/<slug>/products"
+    resp = client.get(endpoint, f"/api/retailers/{slug}/products", params=params)
+    cursor = resp.headers.get("X-Next-Cursor") if resp is not None else None
+    if cursor:
+        client.get(endpoint, f"/api/retailers/{slug}/products", params={**params, "cursor": cursor})
+    client.get("/api/retailers/<slug>/facets", f"/api/retailers/{slug}/facets")
+
+
+def scenario_history(client, pool, rng):
+    product_id = rng.choice(pool.product_ids)
+    client.get("/api/products/<id>", f"/api/products/{product_id}")
+    client.get("/api/products/<id>/history", f"/api/products/{product_id}/history?limit=50")
+
+
+def scenario_compare(client, pool, rng):
+    slug = rng.choice(RETAILER_SLUGS)
+    client.get("/api/snapshots", f"/api/snapshots?retailer={slug}")
+    pairs = pool.snapshot_pairs.get(slug)
+    if pairs:
+        old_id, new_id = rng.choice(pairs)
+        client.get("/api/snapshots/compare", f"/api/snapshots/compare?old={old_id}&new={new_id}")
+
+
+SCENARIOS = {
+    "dashboard": scenario_dashboard,
+    "products": scenario_products,
+    "history": scenario_history,
+    "compare": scenario_compare,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"Onbekend scenario: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run(base_url, concurrency=16, duration=60, mix=None, email=DEFAULT_EMAIL, password=DEFAULT_PASSWORD,
+        snapshot_every=None, seed=1):
+    """Draai de load en retourneer het rapport (dict)."""
+    mix = mix or parse_mix(DEFAULT_MIX)
+    recorder = Recorder()
+    pool = Pool(Client(base_url, Recorder(), email, password))
+    names, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + duration
+    scenario_counts = {name: 0 for name in names}
+    counts_lock = threading.Lock()
+    failures = []
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        try:
+            client = Client(base_url, recorder, email, password)
+        except Exception as exc:
+            failures.append(str(exc))
+            return
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            SCENARIOS[name](client, pool, rng)
+            with counts_lock:
+                scenario_counts[name] += 1
+
+    def snapshotter():
+        client = Client(base_url, recorder, email, password)
+        rng = random.Random(seed)
+        while time.monotonic() + snapshot_every < deadline:
+            time.sleep(snapshot_every)
+            slug = rng.choice(RETAILER_SLUGS)
+            client.request("POST /api/retailers/<slug>/snapshot", "POST", f"/api/retailers/{slug}/snapshot")
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    if snapshot_every:
+        threads.append(threading.Thread(target=snapshotter, daemon=True))
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    if failures:
+        raise RuntimeError(failures[0])
+
+    endpoints = recorder.summary(elapsed)
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "base_url": base_url,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 1),
+        "mix": mix,
+        "scenarios": scenario_counts,
+        "requests": total,
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "rps": round(total / elapsed, 1),
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report):
+    print(
+        f"{report['requests']} requests in {report['duration_s']} s bij concurrency {report['concurrency']}: "
+        f"{report['rps']} req/s, {report['errors']} fouten"
+    )
+    print(f"  {'endpoint':<40} {'req':>7} {'fout':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for endpoint, e in report["endpoints"].items():
+        print(
+            f"  {endpoint:<40} {e['requests']:>7} {e['errors']:>5} {e['rps']:>8.1f} "
+            f"{e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f} {e['max_ms']:>8.1f}"
+        )
+
+
+def add_arguments(parser):
+    parser.add_argument("--concurrency", "-c", type=int, default=16)
+    parser.add_argument("--duration", "-d", type=float, default=60, help="seconden")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=gewicht, kommagescheiden")
+    parser.add_argument("--snapshot-every", type=float, help="elke N seconden een snapshot van een willekeurige retailer")
+    parser.add_argument("--email", default=os.environ.get("LOADTEST_EMAIL", DEFAULT_EMAIL))
+    parser.add_argument("--password", default=os.environ.get("LOADTEST_PASSWORD", DEFAULT_PASSWORD))
+    parser.add_argument("--output", "-o", help="rapport als JSON")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loaddriver voor de Broodradar API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5001")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    report = run(
+        args.base_url, args.concurrency, args.duration, parse_mix(args.mix),
+        args.email, args.password, args.snapshot_every,
+    )
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
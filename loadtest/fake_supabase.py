@@ -0,0 +1,801 @@
+#!/usr/bin/env python3
+"""
+Lokale stand-in voor Supabase: het deel van PostgREST en Auth dat database.py gebruikt,
+in-memory en zonder Postgres. Bedoeld voor loadtests, niet als Postgres-vervanger.
+
+PostgREST (/rest/v1/<tabel>):
+  select met kolommen, aliassen en embeds (product_history -> product_catalog, snapshots ->
+  snapshot_runs, met !inner en filters op de embed); filters eq, neq, gt, gte, lt, lte, in,
+  is, like, ilike, not.<op> en or/and-groepen; order (asc/desc, nullsfirst/nullslast),
+  limit/offset, met een max-rows cap (standaard 1000, als PostgREST bij Supabase) op elke
+  select; insert, upsert (on_conflict of primary key, ook ignore-duplicates), update en delete met
+  return=representation; Content-Range met count=exact.
+RPC (/rest/v1/rpc/<functie>): snapshot_diff, product_batch_history, product_match_group,
+  search_products en bump_retailer_generation, in Python nagebouwd.
+Auth (/auth/v1): token (password en refresh_token), user en logout. Tokens zijn HS256 JWT's
+  met --jwt-secret, zodat de app ze lokaal verifieert zoals met SUPABASE_JWT_SECRET.
+
+Bij het starten wordt de store gevuld met gegenereerde snapshots, catalog, history, timeline
+events en facetten (benchmarks/generators.py), met churn tussen opeenvolgende snapshots.
+
+Gebruik:
+  python3 loadtest/fake_supabase.py [--port 54321] [--products 2000] [--snapshots 4] [--latency-ms 0] [--max-rows 1000]
+"""
+import argparse
+import functools
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 54321
+DEFAULT_JWT_SECRET = "loadtest-jwt-secret-met-minstens-32-tekens"
+DEFAULT_EMAIL = "loadtest@broodradar.local"
+DEFAULT_PASSWORD = "loadtest"
+TOKEN_TTL = 3600
+# PostgREST max-rows zoals Supabase het standaard instelt: meer rijen per response kan niet.
+DEFAULT_MAX_ROWS = 1000
+
+TABLES = (
+    "snapshots", "products", "timeline_events", "product_catalog", "product_history",
+    "retailer_facets", "product_matches", "snapshot_diffs", "snapshot_runs",
+    "product_price_stats", "watchlists", "alerts", "product_verifications", "retailer_generations",
+)
+# Primary key per tabel (standaard id, met een uuid als default)
+PRIMARY_KEYS = {
+    "retailer_facets": ("retailer",),
+    "product_matches": ("product_id",),
+    "product_price_stats": ("product_id",),
+    "product_verifications": ("retailer", "webshop_id"),
+    "retailer_generations": ("retailer",),
+    "snapshot_diffs": ("old_snapshot_id", "new_snapshot_id"),
+}
+# Kolommen met now() als default
+TIMESTAMP_DEFAULTS = {
+    "snapshots": ("created_at",),
+    "products": ("created_at",),
+    "timeline_events": ("created_at",),
+    "product_catalog": ("created_at", "updated_at", "first_seen_at", "last_seen_at"),
+    "product_history": ("created_at",),
+    "snapshot_diffs": ("created_at",),
+    "snapshot_runs": ("started_at",),
+    "product_price_stats": ("computed_at",),
+    "watchlists": ("created_at",),
+    "alerts": ("created_at",),
+    "product_verifications": ("checked_at",),
+}
+# Secundaire indexen voor eq-filters op grote tabellen
+INDEXES = {
+    "products": ("snapshot_id",),
+    "product_history": ("product_id",),
+    "product_catalog": ("retailer",),
+}
+# (tabel, embed) -> (lokale kolom, kolom in de embed, één-op-veel)
+RELATIONS = {
+    ("product_history", "product_catalog"): ("product_id", "id", False),
+    ("product_price_stats", "product_catalog"): ("product_id", "id", False),
+    ("watchlists", "product_catalog"): ("product_id", "id", False),
+    ("alerts", "product_catalog"): ("product_id", "id", False),
+    ("snapshots", "snapshot_runs"): ("id", "snapshot_id", True),
+    ("timeline_events", "snapshots"): ("snapshot_id", "id", False),
+}
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+class PostgrestError(Exception):
+    def __init__(self, status, message, code="PGRST000"):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ---------------------------------------------------------------------------
+# Parsing van select, filters en logische groepen
+# ---------------------------------------------------------------------------
+
+def _split_top(text, sep=","):
+    """Splits op sep buiten haakjes en aanhalingstekens."""
+    parts, depth, quoted, current = [], 0, False, []
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quoted:
+            current.append(ch)
+            if ch == "\\" and i + 1 < len(text):
+                current.append(text[i + 1])
+                i += 1
+            elif ch == '"':
+                quoted = False
+        elif ch == '"':
+            quoted = True
+            current.append(ch)
+        elif ch == "(":
+            depth += 1
+            current.append(ch)
+        elif ch == ")":
+            depth -= 1
+            current.append(ch)
+        elif ch == sep and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    if current or parts:
+        parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def parse_select(text):
+    """Lijst van ("*",), ("column", naam, alias) of ("embed", tabel, alias, inner, items)."""
+    items = []
+    for part in _split_top(text or "*"):
+        if part == "*":
+            items.append(("*",))
+            continue
+        alias = None
+        if ":" in part.split("(")[0]:
+            alias, part = part.split(":", 1)
+        if "(" in part:
+            head, inner_text = part.split("(", 1)
+            name, _, hint = head.partition("!")
+            items.append(("embed", name, alias or name, hint == "inner", parse_select(inner_text[:-1])))
+        else:
+            items.append(("column", part, alias or part))
+    return items
+
+
+def _coerce(row_value, text):
+    if isinstance(row_value, bool):
+        return text.lower() == "true"
+    if isinstance(row_value, (int, float)):
+        try:
+            return float(text)
+        except ValueError:
+            return text
+    return text
+
+
+@functools.lru_cache(maxsize=256)
+def _like(pattern, case_insensitive):
+    regex = "^" + ".*".join(re.escape(p) for p in pattern.replace("%", "*").split("*")) + "$"
+    return re.compile(regex, re.IGNORECASE | re.DOTALL if case_insensitive else re.DOTALL)
+
+
+def _compare(op, value, arg):
+    if op == "is":
+        arg = arg.lower()
+        if arg == "null":
+            return value is None
+        if arg in ("true", "false"):
+            return value is (arg == "true")
+        return False
+    if value is None:
+        return False
+    if op == "in":
+        return any(value == _coerce(value, _unquote(v)) for v in _split_top(arg[1:-1]))
+    if op in ("like", "ilike"):
+        return bool(_like(_unquote(arg), op == "ilike").match(str(value)))
+    target = _coerce(value, _unquote(arg))
+    try:
+        if op == "eq":
+            return value == target
+        if op == "neq":
+            return value != target
+        if op == "gt":
+            return value > target
+        if op == "gte":
+            return value >= target
+        if op == "lt":
+            return value < target
+        if op == "lte":
+            return value <= target
+    except TypeError:
+        return str(value) > str(target) if op in ("gt", "gte") else False
+    raise PostgrestError(400, f"operator niet ondersteund: {op}", "PGRST100")
+
+
+class Condition:
+    """Eén filter op een kolom: column=[not.]op.arg."""
+
+    def __init__(self, column, expr):
+        self.column = column
+        self.negate = expr.startswith("not.")
+        if self.negate:
+            expr = expr[4:]
+        self.op, _, self.arg = expr.partition(".")
+
+    def __call__(self, row):
+        result = _compare(self.op, row.get(self.column), self.arg)
+        return not result if self.negate else result
+
+
+class Group:
+    """and(...)/or(...) met geneste condities."""
+
+    def __init__(self, kind, text, negate=False):
+        self.kind = kind
+        self.negate = negate
+        self.items = [_parse_logic_item(p) for p in _split_top(text)]
+
+    def __call__(self, row):
+        fn = all if self.kind == "and" else any
+        result = fn(item(row) for item in self.items)
+        return not result if self.negate else result
+
+
+def _parse_logic_item(text):
+    negate = text.startswith("not.")
+    body = text[4:] if negate else text
+    for kind in ("and", "or"):
+        if body.startswith(kind + "("):
+            return Group(kind, body[len(kind) + 1 : -1], negate)
+    column, _, expr = text.partition(".")
+    return Condition(column, expr)
+
+
+def parse_filters(params, embeds=()):
+    """Splits de queryparameters in filters op de tabel en filters per embed."""
+    conditions, embed_conditions = [], {}
+    for key, value in params:
+        if key in RESERVED_PARAMS or key.endswith((".order", ".limit", ".offset")):
+            continue
+        if key in ("or", "and"):
+            conditions.append(Group(key, value[1:-1]))
+            continue
+        if key in ("not.or", "not.and"):
+            conditions.append(Group(key[4:], value[1:-1], negate=True))
+            continue
+        prefix, _, column = key.partition(".")
+        if column and prefix in embeds:
+            embed_conditions.setdefault(prefix, []).append(Condition(column, value))
+        else:
+            conditions.append(Condition(key, value))
+    return conditions, embed_conditions
+
+
+def parse_order(text):
+    keys = []
+    for part in _split_top(text or ""):
+        bits = part.split(".")
+        column, desc, nulls_first = bits[0], False, None
+        for bit in bits[1:]:
+            if bit == "desc":
+                desc = True
+            elif bit == "nullsfirst":
+                nulls_first = True
+            elif bit == "nullslast":
+                nulls_first = False
+        if nulls_first is None:
+            nulls_first = desc  # Postgres-default: nulls first bij desc
+        keys.append((column, desc, nulls_first))
+    return keys
+
+
+def sort_rows(rows, keys):
+    for column, desc, nulls_first in reversed(keys):
+        nulls = [r for r in rows if r.get(column) is None]
+        values = [r for r in rows if r.get(column) is not None]
+        values.sort(key=lambda r: r[column], reverse=desc)
+        rows = nulls + values if nulls_first else values + nulls
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# In-memory store
+# ---------------------------------------------------------------------------
+
+class Store:
+    """Tabellen als lijsten van dicts, met een index op id en op een paar eq-kolommen."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tables = {name: [] for name in TABLES}
+        self.by_pk = {name: {} for name in TABLES}
+        self.indexes = {(t, c): {} for t, cols in INDEXES.items() for c in cols}
+
+    def _pk(self, table, row):
+        return tuple(row.get(c) for c in PRIMARY_KEYS.get(table, ("id",)))
+
+    def _index_add(self, table, row):
+        self.by_pk[table][self._pk(table, row)] = row
+        for column in INDEXES.get(table, ()):
+            self.indexes[(table, column)].setdefault(row.get(column), []).append(row)
+
+    def _index_remove(self, table, row):
+        self.by_pk[table].pop(self._pk(table, row), None)
+        for column in INDEXES.get(table, ()):
+            bucket = self.indexes[(table, column)].get(row.get(column), [])
+            if row in bucket:
+                bucket.remove(row)
+
+    def _with_defaults(self, table, row):
+        row = dict(row)
+        if table not in PRIMARY_KEYS and not row.get("id"):
+            row["id"] = str(uuid.uuid4())
+        now = _now()
+        for column in TIMESTAMP_DEFAULTS.get(table, ()):
+            row.setdefault(column, now)
+        return row
+
+    def insert(self, table, rows, upsert=False, on_conflict=None, ignore_duplicates=False):
+        out = []
+        with self.lock:
+            for row in rows:
+                if upsert or ignore_duplicates:
+                    key_columns = tuple(on_conflict.split(",")) if on_conflict else PRIMARY_KEYS.get(table, ("id",))
+                    existing = self._find(table, key_columns, row)
+                    if existing is not None:
+                        if not ignore_duplicates:
+                            self._update_row(table, existing, row)
+                            out.append(existing)
+                        continue
+                row = self._with_defaults(table, row)
+                if self._pk(table, row) in self.by_pk[table]:
+                    raise PostgrestError(409, f"duplicate key value violates unique constraint on {table}", "23505")
+                self.tables[table].append(row)
+                self._index_add(table, row)
+                out.append(row)
+        return [dict(r) for r in out]
+
+    def _find(self, table, key_columns, row):
+        if key_columns == PRIMARY_KEYS.get(table, ("id",)):
+            return self.by_pk[table].get(tuple(row.get(c) for c in key_columns))
+        for existing in self.tables[table]:
+            if all(existing.get(c) == row.get(c) for c in key_columns):
+                return existing
+        return None
+
+    def _update_row(self, table, row, patch):
+        self._index_remove(table, row)
+        row.update(patch)
+        self._index_add(table, row)
+
+    def candidates(self, table, conditions):
+        """Rijen die voor de filters in aanmerking komen (via een index waar mogelijk)."""
+        pk = PRIMARY_KEYS.get(table, ("id",))
+        for c in conditions:
+            if not isinstance(c, Condition) or c.negate:
+                continue
+            if c.column == "id" and pk == ("id",):
+                if c.op == "eq":
+                    row = self.by_pk[table].get((_unquote(c.arg),))
+                    return [row] if row else []
+                if c.op == "in":
+                    ids = [_unquote(v) for v in _split_top(c.arg[1:-1])]
+                    return [self.by_pk[table][(i,)] for i in ids if (i,) in self.by_pk[table]]
+            if c.op == "eq" and (table, c.column) in self.indexes:
+                return list(self.indexes[(table, c.column)].get(_unquote(c.arg), []))
+        return list(self.tables[table])
+
+    def select(self, table, conditions):
+        with self.lock:
+            return [r for r in self.candidates(table, conditions) if all(c(r) for c in conditions)]
+
+    def update(self, table, conditions, patch):
+        with self.lock:
+            rows = self.select(table, conditions)
+            for row in rows:
+                self._update_row(table, row, patch)
+            return [dict(r) for r in rows]
+
+    def delete(self, table, conditions):
+        with self.lock:
+            rows = self.select(table, conditions)
+            for row in rows:
+                self._index_remove(table, row)
+                self.tables[table].remove(row)
+            return [dict(r) for r in rows]
+
+    def related(self, table, embed, row, conditions):
+        local, remote, many = RELATIONS[(table, embed)]
+        value = row.get(local)
+        if remote == "id" and embed not in PRIMARY_KEYS:
+            match = self.by_pk[embed].get((value,))
+            matches = [match] if match else []
+        elif (embed, remote) in self.indexes:
+            matches = self.indexes[(embed, remote)].get(value, [])
+        else:
+            matches = [r for r in self.tables[embed] if r.get(remote) == value]
+        matches = [m for m in matches if all(c(m) for c in conditions)]
+        return matches if many else (matches[0] if matches else None)
+
+
+def project(store, table, row, items, embed_conditions):
+    """Pas de select-lijst toe op een rij. None als een !inner embed leeg is."""
+    out = {}
+    for item in items:
+        if item[0] == "*":
+            out.update(row)
+        elif item[0] == "column":
+            out[item[2]] = row.get(item[1])
+        else:
+            _kind, name, alias, inner, sub_items = item
+            if (table, name) not in RELATIONS:
+                raise PostgrestError(400, f"geen relatie tussen {table} en {name}", "PGRST200")
+            related = store.related(table, name, row, embed_conditions.get(name, ()))
+            if inner and not related:
+                return None
+            if isinstance(related, list):
+                out[alias] = [project(store, name, r, sub_items, {}) for r in related]
+            else:
+                out[alias] = project(store, name, related, sub_items, {}) if related else None
+    return out
+
+
+# ---------------------------------------------------------------------------
+# RPC's
+# ---------------------------------------------------------------------------
+
+def _rpc_snapshot_diff(store, params):
+    import database
+    old_id, new_id = params["old_id"], params["new_id"]
+    old = store.select("products", [Condition("snapshot_id", f"eq.{old_id}")])
+    new = store.select("products", [Condition("snapshot_id", f"eq.{new_id}")])
+    diff = database._diff_products(old, new)
+    diff["product_counts"] = {"old": len(old), "new": len(new)}
+    return diff
+
+
+def _rpc_product_batch_history(store, params):
+    out = []
+    for pid in params.get("pids") or []:
+        rows = store.select("product_history", [Condition("product_id", f"eq.{pid}")])
+        rows = sort_rows(rows, [("created_at", True, False)])
+        item = {"product_id": pid, "history": [dict(r) for r in rows[: params.get("per_product", 1)]], "price_series": None}
+        if params.get("with_series"):
+            item["price_series"] = [
+                [r["created_at"], r["price_at_snapshot"]]
+                for r in reversed(rows) if r.get("price_at_snapshot") is not None
+            ]
+        out.append(item)
+    return out
+
+
+def _rpc_search_products(store, params):
+    q = (params.get("q") or "").lower()
+    retailer = params.get("retailer_filter")
+    fields = ("id", "retailer", "webshop_id", "title", "brand", "price", "image_url", "sub_category", "is_available")
+    out = []
+    with store.lock:
+        for r in store.tables["product_catalog"]:
+            if retailer and r.get("retailer") != retailer:
+                continue
+            text = f"{r.get('title') or ''} {r.get('brand') or ''}".lower()
+            if q in text:
+                out.append({**{f: r.get(f) for f in fields}, "score": 1.0})
+    return out[: params.get("max_results", 20)]
+
+
+def _rpc_bump_retailer_generation(store, params):
+    retailer = params["p_retailer"]
+    with store.lock:
+        row = store.by_pk["retailer_generations"].get((retailer,))
+        generation = (row["generation"] if row else 0) + 1
+        store.insert("retailer_generations", [{"retailer": retailer, "generation": generation, "updated_at": _now()}], upsert=True)
+    return generation
+
+
+RPCS = {
+    "snapshot_diff": _rpc_snapshot_diff,
+    "product_batch_history": _rpc_product_batch_history,
+    "product_match_group": lambda store, params: [],
+    "search_products": _rpc_search_products,
+    "bump_retailer_generation": _rpc_bump_retailer_generation,
+}
+
+
+# ---------------------------------------------------------------------------
+# Auth
+# ---------------------------------------------------------------------------
+
+class Auth:
+    def __init__(self, jwt_secret, email, password):
+        self.jwt_secret = jwt_secret
+        self.email = email
+        self.password = password
+        self.user_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, email))
+        self.created_at = _now()
+        self.refresh_tokens = {}
+
+    def user(self):
+        return {
+            "id": self.user_id, "aud": "authenticated", "role": "authenticated", "email": self.email,
+            "app_metadata": {"provider": "email"}, "user_metadata": {},
+            "created_at": self.created_at, "email_confirmed_at": self.created_at,
+        }
+
+    def session(self):
+        now = int(time.time())
+        claims = {
+            "sub": self.user_id, "email": self.email, "aud": "authenticated", "role": "authenticated",
+            "iat": now, "exp": now + TOKEN_TTL,
+        }
+        refresh_token = uuid.uuid4().hex
+        self.refresh_tokens[refresh_token] = True
+        return {
+            "access_token": jwt.encode(claims, self.jwt_secret, algorithm="HS256"),
+            "token_type": "bearer",
+            "expires_in": TOKEN_TTL,
+            "expires_at": now + TOKEN_TTL,
+            "refresh_token": refresh_token,
+            "user": self.user(),
+        }
+
+    def token(self, grant_type, body):
+        if grant_type == "password":
+            if body.get("email") != self.email or body.get("password") != self.password:
+                return 400, {"error": "invalid_grant", "error_description": "Invalid login credentials"}
+            return 200, self.session()
+        if grant_type == "refresh_token":
+            if not self.refresh_tokens.pop(body.get("refresh_token"), None):
+                return 400, {"error": "invalid_grant", "error_description": "Invalid Refresh Token"}
+            return 200, self.session()
+        return 400, {"error": "unsupported_grant_type"}
+
+    def verify(self, header):
+        token = header.removeprefix("Bearer ").strip()
+        try:
+            jwt.decode(token, self.jwt_secret, algorithms=["HS256"], audience="authenticated")
+        except jwt.PyJWTError:
+            return 401, {"code": 401, "msg": "invalid JWT"}
+        return 200, self.user()
+
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store = None
+    auth = None
+    latency = 0.0
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt, *args)
+
+    def _send(self, status, payload=None, headers=None):
+        body = b"" if payload is None else json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null") if length else None
+
+    def _handle(self, method):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlsplit(self.path)
+        params = parse_qsl(url.query, keep_blank_values=True)
+        try:
+            if url.path.startswith("/auth/v1/"):
+                return self._auth(method, url.path[len("/auth/v1/"):], dict(params))
+            if url.path.startswith("/rest/v1/rpc/"):
+                return self._rpc(url.path[len("/rest/v1/rpc/"):])
+            if url.path.startswith("/rest/v1/"):
+                return self._rest(method, url.path[len("/rest/v1/"):], params)
+            self._send(404, {"message": "not found"})
+        except PostgrestError as exc:
+            self._send(exc.status, {"code": exc.code, "message": str(exc), "details": None, "hint": None})
+        except Exception as exc:  # fouten zichtbaar maken voor de client, zoals PostgREST doet
+            logger.exception("fout in %s %s", method, self.path)
+            self._send(500, {"code": "XX000", "message": str(exc), "details": None, "hint": None})
+
+    def _auth(self, method, path, params):
+        if path == "token" and method == "POST":
+            status, payload = self.auth.token(params.get("grant_type"), self._body() or {})
+            return self._send(status, payload)
+        if path == "user" and method == "GET":
+            status, payload = self.auth.verify(self.headers.get("Authorization", ""))
+            return self._send(status, payload)
+        if path == "logout":
+            return self._send(204)
+        self._send(404, {"msg": "not found"})
+
+    def _rpc(self, name):
+        fn = RPCS.get(name)
+        if fn is None:
+            raise PostgrestError(404, f"Could not find the function public.{name}", "PGRST202")
+        self._send(200, fn(self.store, self._body() or {}))
+
+    def _rest(self, method, table, params):
+        if table not in self.store.tables:
+            raise PostgrestError(404, f"Could not find the table 'public.{table}' in the schema cache", "PGRST205")
+        prefer = self.headers.get("Prefer", "")
+        query = dict(params)
+        items = parse_select(query.get("select", "*"))
+        embeds = {item[1] for item in items if item[0] == "embed"}
+        conditions, embed_conditions = parse_filters(params, embeds)
+        representation = "return=minimal" not in prefer
+
+        if method == "GET":
+            rows = self.store.select(table, conditions)
+            rows = sort_rows(rows, parse_order(query.get("order")))
+            with self.store.lock:
+                projected = [p for p in (project(self.store, table, r, items, embed_conditions) for r in rows) if p is not None]
+            total = len(projected)
+            offset = int(query.get("offset") or 0)
+            limit = query.get("limit")
+            count_rows = min(int(limit), self.max_rows) if limit else self.max_rows
+            projected = projected[offset : offset + count_rows]
+            end = offset + len(projected) - 1
+            count = str(total) if "count=exact" in prefer else "*"
+            content_range = f"{offset}-{end}/{count}" if projected else f"*/{count}"
+            return self._send(200, projected, {"Content-Range": content_range})
+
+        if method == "POST":
+            body = self._body()
+            rows = body if isinstance(body, list) else [body]
+            upsert = "resolution=merge-duplicates" in prefer
+            out = self.store.insert(
+                table, rows, upsert=upsert, on_conflict=query.get("on_conflict"),
+                ignore_duplicates="resolution=ignore-duplicates" in prefer,
+            )
+            return self._send(201, out if representation else None, {"Content-Range": f"*/{len(out)}"})
+
+        if method == "PATCH":
+            out = self.store.update(table, conditions, self._body() or {})
+            return self._send(200, out if representation else None, {"Content-Range": f"0-{len(out) - 1}/*"})
+
+        if method == "DELETE":
+            self._body()  # postgrest-py stuurt "{}" mee; lezen, anders vervuilt het de keep-alive verbinding
+            out = self.store.delete(table, conditions)
+            return self._send(200, out if representation else None, {"Content-Range": f"0-{len(out) - 1}/*"})
+
+        self._send(405, {"message": "method not allowed"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_HEAD(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+# ---------------------------------------------------------------------------
+# Seed
+# ---------------------------------------------------------------------------
+
+def seed(store, products=2000, snapshots=4, retailers=("ah", "jumbo", "plus"), churn=0.05):
+    """Vul de store met snapshots, catalog, history, timeline events en facetten per retailer."""
+    import database
+    import unit_prices
+    from benchmarks import generators
+
+    now = datetime.now(timezone.utc)
+    for r_index, retailer in enumerate(retailers):
+        items = generators.catalog(products, seed=r_index + 1)
+        catalog = {}
+        prev_rows = None
+        for s in range(snapshots):
+            created = (now - timedelta(days=snapshots - s)).isoformat()
+            snap = store.insert("snapshots", [{"retailer": retailer, "product_count": len(items), "created_at": created}])[0]
+            rows = [{**database._snapshot_product_row(p, snap["id"], retailer, True), "created_at": created} for p in items]
+            unit_prices.normalize_rows(rows)
+            store.insert("products", rows)
+
+            history = []
+            seen = set()
+            for r in rows:
+                data = database._catalog_row_from_snapshot_product(r)
+                seen.add(data["webshop_id"])
+                existing = catalog.get(data["webshop_id"])
+                event_type, changes = database._detect_changes(existing, data)
+                if existing is None:
+                    existing = store.insert("product_catalog", [{
+                        **data, "first_seen_at": created, "last_seen_at": created, "created_at": created,
+                        "updated_at": created,
+                    }])[0]
+                    catalog[data["webshop_id"]] = existing
+                else:
+                    catalog[data["webshop_id"]] = store.update("product_catalog", [Condition("id", f"eq.{existing['id']}")], {
+                        **data, "last_seen_at": created, "updated_at": created,
+                    })[0]
+                if event_type != "unchanged":
+                    history.append({
+                        "product_id": existing["id"], "snapshot_id": snap["id"], "event_type": event_type,
+                        "changes": changes, "price_at_snapshot": data.get("price"), "created_at": created,
+                    })
+            for webshop_id, existing in catalog.items():
+                if webshop_id not in seen and existing.get("is_available", True):
+                    store.update("product_catalog", [Condition("id", f"eq.{existing['id']}")], {"is_available": False})
+                    existing["is_available"] = False
+                    history.append({
+                        "product_id": existing["id"], "snapshot_id": snap["id"], "event_type": "removed",
+                        "changes": {}, "price_at_snapshot": None, "created_at": created,
+                    })
+            store.insert("product_history", history)
+
+            if prev_rows is not None:
+                diff = database._diff_products(prev_rows, rows)
+                events = [
+                    {"retailer": retailer, "event_type": "new_product", "snapshot_id": snap["id"], "created_at": created,
+                     "product_title": p["title"], "product_image_url": p.get("image_url"), "details": {"price": p.get("price")}}
+                    for p in diff["new_products"]
+                ] + [
+                    {"retailer": retailer, "event_type": "price_change", "snapshot_id": snap["id"], "created_at": created,
+                     "product_title": c["product"]["title"], "product_image_url": c["product"].get("image_url"),
+                     "details": {k: c[k] for k in ("old_price", "new_price", "pct_change")}}
+                    for c in diff["price_changes"]
+                ]
+                store.insert("timeline_events", events)
+            store.insert("retailer_facets", [{
+                "retailer": retailer, "snapshot_id": snap["id"], "facets": database._compute_facets(rows),
+                "updated_at": created,
+            }], upsert=True)
+            prev_rows = rows
+            items = generators.churn(items, churn, seed=r_index * 100 + s)
+        logger.info("seed %s: %d snapshots, %d catalog-rijen", retailer, snapshots, len(catalog))
+
+
+def make_server(port=DEFAULT_PORT, jwt_secret=DEFAULT_JWT_SECRET, email=DEFAULT_EMAIL, password=DEFAULT_PASSWORD,
+                latency_ms=0, store=None, max_rows=DEFAULT_MAX_ROWS):
+    handler = type("FakeSupabaseHandler", (Handler,), {
+        "store": store or Store(),
+        "auth": Auth(jwt_secret, email, password),
+        "latency": latency_ms / 1000,
+        "max_rows": max_rows,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokale Supabase stand-in (PostgREST + Auth) voor loadtests.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--products", type=int, default=2000, help="producten per retailer")
+    parser.add_argument("--snapshots", type=int, default=4, help="snapshots per retailer")
+    parser.add_argument("--latency-ms", type=float, default=0, help="extra vertraging per request (netwerk-RTT)")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_MAX_ROWS, help="max rijen per select (PostgREST max-rows)")
+    parser.add_argument("--jwt-secret", default=DEFAULT_JWT_SECRET)
+    parser.add_argument("--email", default=DEFAULT_EMAIL)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    store = Store()
+    started = time.perf_counter()
+    seed(store, args.products, args.snapshots)
+    logger.info("seed klaar in %.1f s", time.perf_counter() - started)
+    server = make_server(args.port, args.jwt_secret, args.email, args.password, args.latency_ms, store, args.max_rows)
+    logger.info("fake Supabase op http://127.0.0.1:%d", args.port)
+    server.serve_forever()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Mock-servers voor de AH-, Jumbo- en Plus-endpoints die retailers/ gebruikt, voor loadtests
+van de snapshot-pipeline zonder netwerk.
+
+Elke retailer krijgt een eigen poort en een eigen gegenereerde catalogus
+(benchmarks/generators.py). Jumbo-producten volgen de opgenomen zoekresponse in
+benchmarks/fixtures/jumbo_search.json, Plus-pagina's de markup van plus_plp.html en AH het
+formaat van de mobiele API. Bij elke nieuwe volledige fetch (eerste pagina) verandert de
+catalogus met --churn, zodat opeenvolgende snapshots wijzigingen bevatten.
+
+Zet de app op de mocks met:
+  AH_API_BASE=http://127.0.0.1:8101 JUMBO_API_BASE=http://127.0.0.1:8102 PLUS_BASE_URL=http://127.0.0.1:8103
+
+Gebruik:
+  python3 loadtest/mock_retailers.py [--products 2000] [--latency-ms 40] [--jitter-ms 20] [--churn 0.05]
+"""
+import argparse
+import copy
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import generators
+
+logger = logging.getLogger(__name__)
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures"
+PORTS = {"ah": 8101, "jumbo": 8102, "plus": 8103}
+PLUS_MAIN_CATEGORY = "/producten/brood-gebak-bakproducten"
+PLUS_CATEGORIES = ("brood", "broodjes", "beschuit-crackers", "krentenbollen-en-rozijnenbollen")
+
+_GRAPHQL_ALIAS_RE = re.compile(r"p(\d+): product\(id: (\d+)\)")
+
+
+class Catalog:
+    """Gegenereerde catalogus van één retailer; advance() past churn toe."""
+
+    def __init__(self, n, seed, churn):
+        self.items = generators.catalog(n, seed=seed)
+        self.churn = churn
+        self.version = 0
+        self.lock = threading.Lock()
+        self._reindex()
+
+    def _reindex(self):
+        self.by_id = {p["webshopId"]: p for p in self.items}
+
+    def advance(self):
+        if not self.churn:
+            return
+        with self.lock:
+            self.version += 1
+            self.items = generators.churn(self.items, self.churn, seed=self.version)
+            self._reindex()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    catalog = None
+    latency = 0.0
+    jitter = 0.0
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt, *args)
+
+    def _send(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = (json.dumps(body, ensure_ascii=False) if content_type == "application/json" else body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def do_GET(self):
+        self._delay()
+        url = urlsplit(self.path)
+        self.route("GET", url.path, {k: v[0] for k, v in parse_qs(url.query).items()})
+
+    def do_POST(self):
+        self._delay()
+        url = urlsplit(self.path)
+        self.route("POST", url.path, self._body())
+
+
+class AHHandler(MockHandler):
+    def route(self, method, path, params):
+        if path == "/mobile-auth/v1/auth/token/anonymous":
+            return self._send(200, {"access_token": "mock-ah-token", "refresh_token": "mock", "expires_in": 7200})
+        if path == "/mobile-services/product/search/v2":
+            page, size = int(params.get("page", 0)), int(params.get("size", 200))
+            if page == 0:
+                self.catalog.advance()
+            items = self.catalog.items
+            total_pages = max(1, -(-len(items) // size))
+            return self._send(200, {
+                "products": [_ah_product(p) for p in items[page * size : (page + 1) * size]],
+                "page": {"size": size, "totalElements": len(items), "totalPages": total_pages, "number": page},
+            })
+        if path.startswith("/mobile-services/product/detail/v4/fir/"):
+            p = self.catalog.by_id.get(path.rsplit("/", 1)[-1])
+            if p is None:
+                return self._send(404, {"message": "not found"})
+            return self._send(200, {"productCard": _ah_product(p)})
+        if path == "/graphql":
+            wants_ingredients = "tradeItem" in params.get("query", "")
+            data = {}
+            for alias, pid in _GRAPHQL_ALIAS_RE.findall(params.get("query", "")):
+                p = self.catalog.by_id.get(pid)
+                if p is None:
+                    data[f"p{alias}"] = None
+                elif wants_ingredients:
+                    data[f"p{alias}"] = {"tradeItem": {"ingredients": {"statement": p["ingredients"]}}}
+                else:
+                    data[f"p{alias}"] = {"id": int(pid), "title": p["title"]}
+            return self._send(200, {"data": data})
+        self._send(404, {"message": "not found"})
+
+
+def _ah_product(p):
+    return {**{k: v for k, v in p.items() if k != "ingredients"}, "webshopId": int(p["webshopId"])}
+
+
+_jumbo_template = None
+
+
+def _jumbo_item(p):
+    global _jumbo_template
+    if _jumbo_template is None:
+        data = json.loads((FIXTURES / "jumbo_search.json").read_text(encoding="utf-8"))
+        _jumbo_template = data["products"]["data"][0]
+    item = copy.deepcopy(_jumbo_template)
+    cents = int(round(p["priceBeforeBonus"] * 100))
+    item.update({"id": f"{p['webshopId']}STK", "title": f"{p['brand']} - {p['title'].removeprefix(p['brand']).strip()}", "quantity": p["salesUnitSize"]})
+    item["prices"] = {
+        "price": {"currency": "EUR", "amount": cents},
+        "unitPrice": {"unit": "kg", "price": {"currency": "EUR", "amount": int(cents * 1.25)}},
+    }
+    if p["isBonus"]:
+        item["prices"]["promotionalPrice"] = {"currency": "EUR", "amount": int(cents * 0.8)}
+    for view in item.get("imageInfo", {}).get("primaryView", []):
+        view["url"] = p["images"][0]["url"]
+    return item
+
+
+class JumboHandler(MockHandler):
+    def route(self, method, path, params):
+        if path == "/v17/search":
+            offset, limit = int(params.get("offset", 0)), int(params.get("limit", 30))
+            if offset == 0:
+                self.catalog.advance()
+            items = self.catalog.items
+            return self._send(200, {"products": {
+                "data": [_jumbo_item(p) for p in items[offset : offset + limit]],
+                "total": len(items),
+                "offset": offset,
+            }})
+        if path.startswith("/v17/products/"):
+            p = self.catalog.by_id.get(path.rsplit("/", 1)[-1].removesuffix("STK"))
+            if p is None:
+                return self._send(404, {"message": "not found"})
+            return self._send(200, {"product": {"data": {
+                **_jumbo_item(p),
+                "ingredientInfo": [{"ingredients": [{"name": name} for name in p["ingredients"].split(", ")]}],
+            }}})
+        self._send(404, {"message": "not found"})
+
+
+def _plus_slug(p):
+    words = re.sub(r"[^a-z0-9]+", "-", p["title"].lower()).strip("-")
+    size = p["salesUnitSize"].split()
+    unit = f"-zak-{size[0]}-{size[1]}" if len(size) == 2 else ""
+    return f"{words}{unit}-{p['webshopId']}"
+
+
+def _plus_tile(p):
+    price = p["priceBeforeBonus"] * (0.8 if p["isBonus"] else 1)
+    whole, dec = f"{price:.2f}".split(".")
+    previous_price = f'{p["priceBeforeBonus"]:.2f}'.replace(".", ",")
+    previous = (
+        f'<div class="plp-item-price-previous PricePrevious"><span class="strike">{previous_price}</span></div>'
+        if p["isBonus"] else ""
+    )
+    title = escape(p["title"])
+    sku = p["webshopId"]
+    return (
+        f'<div class="plp-results-item" data-sku="{sku}">\n'
+        f'  <a class="plp-item-link" href="/product/{_plus_slug(p)}" title="{title}">\n'
+        f'    <div class="plp-item-image"><img alt="{title}" loading="lazy" '
+        f'src="https://images.ctfassets.net/s0lodsnpsezb/{sku}_M/8c1f2e/{sku}_M.png?w=400&amp;h=400&amp;fm=webp"></div>\n'
+        f'    <div class="plp-item-price">\n'
+        f'      <div class="plp-item-price-integer PriceInteger"><span class="font-bold">{whole}.</span></div>\n'
+        f'      <div class="plp-item-price-decimals PriceDecimals"><span class="font-bold">{dec}</span></div>\n'
+        f'      {previous}\n'
+        f'    </div>\n'
+        f'  </a>\n'
+        f'</div>'
+    )
+
+
+def _plus_page(products, links=()):
+    nav = "\n".join(f'<a href="{PLUS_MAIN_CATEGORY}/{c}">{c}</a>' for c in links)
+    tiles = "\n".join(_plus_tile(p) for p in products)
+    return (
+        '<!DOCTYPE html>\n<html lang="nl"><head><meta charset="utf-8"></head><body>'
+        f'<nav class="plp-categories">{nav}</nav>\n<div class="plp-results">\n{tiles}\n</div></body></html>'
+    )
+
+
+class PlusHandler(MockHandler):
+    def route(self, method, path, params):
+        items = self.catalog.items
+        if path == PLUS_MAIN_CATEGORY:
+            self.catalog.advance()
+            return self._send(200, _plus_page(self.catalog.items[:48], PLUS_CATEGORIES), "text/html")
+        if path.startswith(PLUS_MAIN_CATEGORY + "/"):
+            category = path[len(PLUS_MAIN_CATEGORY) + 1 :]
+            if category not in PLUS_CATEGORIES:
+                return self._send(404, "<html>pagina-niet-gevonden</html>", "text/html")
+            index = PLUS_CATEGORIES.index(category)
+            return self._send(200, _plus_page(items[index :: len(PLUS_CATEGORIES)]), "text/html")
+        if path.startswith("/product/"):
+            p = self.catalog.by_id.get(path.rsplit("-", 1)[-1])
+            if p is None:
+                return self._send(404, "<html>pagina-niet-gevonden</html>", "text/html")
+            whole, dec = f"{p['priceBeforeBonus']:.2f}".split(".")
+            return self._send(200, (
+                f'<html><body><h1>{escape(p["title"])}</h1>'
+                f'<div class="PriceInteger"><span>{whole}.</span></div><div class="PriceDecimals"><span>{dec}</span></div>'
+                f'<button id="ingredienten_btn">Ingrediënten</button><div><span data-expression="">'
+                f'{escape(p["ingredients"])}</span></div></body></html>'
+            ), "text/html")
+        self._send(404, "<html>pagina-niet-gevonden</html>", "text/html")
+
+
+HANDLERS = {"ah": AHHandler, "jumbo": JumboHandler, "plus": PlusHandler}
+
+
+def make_servers(products=2000, latency_ms=0, jitter_ms=0, churn=0.05, ports=None):
+    """Eén server per retailer. Retourneert {slug: server}."""
+    servers = {}
+    for index, (slug, handler) in enumerate(HANDLERS.items()):
+        cls = type(f"{handler.__name__}Bound", (handler,), {
+            "catalog": Catalog(products, seed=index + 1, churn=churn),
+            "latency": latency_ms / 1000,
+            "jitter": jitter_ms / 1000,
+        })
+        server = ThreadingHTTPServer(("127.0.0.1", (ports or PORTS)[slug]), cls)
+        server.daemon_threads = True
+        servers[slug] = server
+    return servers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock AH/Jumbo/Plus servers voor loadtests.")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--churn", type=float, default=0.05)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    servers = make_servers(args.products, args.latency_ms, args.jitter_ms, args.churn)
+    for slug, server in servers.items():
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info("%s mock op http://127.0.0.1:%d", slug, server.server_address[1])
+    threading.Event().wait()
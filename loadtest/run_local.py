@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Volledige loadtest op één machine, zonder netwerk: start de Supabase stand-in, de mock-retailers
+en de app als losse processen, draait de loaddriver en ruimt daarna alles op.
+
+De app draait met --server flask (Flask-server met een thread per request) of asgi (uvicorn
+met asgi.py). --server both draait beide na elkaar tegen dezelfde seed en zet de throughput
+en latencies per endpoint naast elkaar; zet --db-latency-ms op een realistische round trip
+(bijv. 20) om het verschil bij I/O-gebonden endpoints te zien.
+
+Gebruik:
+  python3 loadtest/run_local.py [--products 2000] [--snapshots 4] [--db-latency-ms 2]
+      [--retailer-latency-ms 40] [--concurrency 16] [--duration 60] [--snapshot-every 20]
+      [--server flask|asgi|both] [--output loadtest-resultaat.json]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from loadtest import driver
+from loadtest.fake_supabase import DEFAULT_JWT_SECRET, DEFAULT_PORT
+from loadtest.mock_retailers import PORTS
+
+APP_PORT = 5099
+SERVERS = {
+    "flask": ["-m", "flask", "--app", "app", "run", "--port", str(APP_PORT), "--with-threads"],
+    "asgi": ["-m", "uvicorn", "asgi:app", "--port", str(APP_PORT), "--log-level", "warning"],
+}
+
+
+def _wait_for_port(port, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"proces op poort {port} is gestopt (exitcode {process.returncode})")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"poort {port} niet bereikbaar na {timeout} s")
+
+
+def _stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_server(server, args, env):
+    """Start de app met de gegeven server, draai de load en stop de app weer."""
+    app = subprocess.Popen(
+        [sys.executable, *SERVERS[server]], env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_port(APP_PORT, app)
+        report = driver.run(
+            f"http://127.0.0.1:{APP_PORT}", args.concurrency, args.duration, driver.parse_mix(args.mix),
+            args.email, args.password, args.snapshot_every,
+        )
+    finally:
+        _stop(app)
+    report["server"] = server
+    return report
+
+
+def print_comparison(reports):
+    """Throughput en p50/p95 per endpoint per server naast elkaar."""
+    names = list(reports)
+    print(f"\n  {'':<40}" + "".join(f" {name:>26}" for name in names))
+    print(f"  {'totaal req/s':<40}" + "".join(f" {r['rps']:>26.1f}" for r in reports.values()))
+    print(f"  {'endpoint (req/s, p50 / p95 ms)':<40}")
+    endpoints = sorted({e for r in reports.values() for e in r["endpoints"]})
+    for endpoint in endpoints:
+        cells = []
+        for r in reports.values():
+            e = r["endpoints"].get(endpoint)
+            cells.append(f"{e['rps']:7.1f}, {e['p50_ms']:6.1f} / {e['p95_ms']:6.1f}" if e else "-")
+        print(f"  {endpoint:<40}" + "".join(f" {c:>26}" for c in cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loadtest met lokale Supabase stand-in en mock-retailers.")
+    parser.add_argument("--products", type=int, default=2000, help="producten per retailer")
+    parser.add_argument("--snapshots", type=int, default=4, help="snapshots per retailer in de seed")
+    parser.add_argument("--db-latency-ms", type=float, default=0, help="extra vertraging per Supabase-request")
+    parser.add_argument("--retailer-latency-ms", type=float, default=40)
+    parser.add_argument("--retailer-jitter-ms", type=float, default=20)
+    parser.add_argument("--server", choices=(*SERVERS, "both"), default="flask")
+    driver.add_arguments(parser)
+    args = parser.parse_args()
+
+    env = {
+        **os.environ,
+        "SUPABASE_URL": f"http://127.0.0.1:{DEFAULT_PORT}",
+        "SUPABASE_KEY": "loadtest-anon-key",
+        "SUPABASE_JWT_SECRET": DEFAULT_JWT_SECRET,
+        "SECRET_KEY": "loadtest",
+        "AH_API_BASE": f"http://127.0.0.1:{PORTS['ah']}",
+        "JUMBO_API_BASE": f"http://127.0.0.1:{PORTS['jumbo']}",
+        "PLUS_BASE_URL": f"http://127.0.0.1:{PORTS['plus']}",
+    }
+    py = sys.executable
+    processes = []
+    try:
+        supabase = subprocess.Popen([
+            py, str(ROOT / "loadtest" / "fake_supabase.py"), "--products", str(args.products),
+            "--snapshots", str(args.snapshots), "--latency-ms", str(args.db_latency_ms),
+            "--email", args.email, "--password", args.password,
+        ], env=env)
+        processes.append(supabase)
+        retailers = subprocess.Popen([
+            py, str(ROOT / "loadtest" / "mock_retailers.py"), "--products", str(args.products),
+            "--latency-ms", str(args.retailer_latency_ms), "--jitter-ms", str(args.retailer_jitter_ms),
+        ], env=env)
+        processes.append(retailers)
+        _wait_for_port(DEFAULT_PORT, supabase)
+        for port in PORTS.values():
+            _wait_for_port(port, retailers)
+
+        setup = {
+            "products": args.products, "snapshots": args.snapshots, "db_latency_ms": args.db_latency_ms,
+            "retailer_latency_ms": args.retailer_latency_ms, "retailer_jitter_ms": args.retailer_jitter_ms,
+        }
+        reports = {}
+        for server in (SERVERS if args.server == "both" else [args.server]):
+            print(f"[{server}]")
+            reports[server] = {**run_server(server, args, env), "setup": setup}
+            driver.print_report(reports[server])
+        if len(reports) > 1:
+            print_comparison(reports)
+        if args.output:
+            output = reports if len(reports) > 1 else reports[args.server]
+            Path(args.output).write_text(json.dumps(output, indent=2) + "\n")
+    finally:
+        for process in reversed(processes):
+            _stop(process)
@@ -0,0 +1,249 @@
+"""Koppelen van gelijkwaardige producten tussen retailers (AH, Jumbo, Plus).
+
+Titels worden genormaliseerd (zonder huismerken, accenten en stopwoorden) en de verpakkingsgrootte
+wordt eruit gehaald. Producten worden alleen vergeleken binnen hetzelfde blok (zelfde grootte;
+zonder grootte hetzelfde merk, of bij een huismerk hetzelfde eerste titelwoord);
+binnen een blok wordt de similarity gevectoriseerd berekend met NumPy (feature hashing van woorden
+en karakter-trigrammen, cosinus via een matrixproduct). Een groep bevat hoogstens één product per
+retailer. Na elke ingest worden alleen nieuwe of gewijzigde producten opnieuw gescoord.
+
+Volledig opnieuw opbouwen:
+  python3 matching.py
+"""
+import logging
+import re
+import uuid
+import zlib
+
+import numpy as np
+
+import database
+from search import tokenize
+
+logger = logging.getLogger(__name__)
+
+MATCH_THRESHOLD = 0.72
+FEATURE_DIM = 1 << 12
+TRIGRAM_WEIGHT = 0.5
+MATCH_FIELDS = ("id", "retailer", "title", "brand", "sales_unit_size")
+
+# Huismerken en woorden die niets zeggen over het product zelf
+IGNORED_TOKENS = {
+    "ah", "albert", "heijn", "jumbo", "plus", "excellent", "basic", "huismerk",
+    "de", "het", "een", "en", "met", "van", "voor", "per", "stuk", "stuks", "st",
+    "g", "gr", "gram", "kg", "kilo", "zak", "pak", "doos", "x",
+}
+
+_SIZE_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(kg|kilo|gr|gram|g|stuks|stuk|st)\b")
+
+
+def extract_size(*texts):
+    """Verpakkingsgrootte als genormaliseerde sleutel, bijv. '800g' of '6st'. None als onbekend."""
+    for text in texts:
+        if not text:
+            continue
+        m = _SIZE_RE.search(text.lower())
+        if not m:
+            continue
+        amount = float(m.group(1).replace(",", "."))
+        unit = m.group(2)
+        if unit in ("kg", "kilo"):
+            return f"{round(amount * 1000)}g"
+        if unit in ("gr", "gram", "g"):
+            return f"{round(amount)}g"
+        return f"{round(amount)}st"
+    return None
+
+
+def signature(row):
+    """Genormaliseerde tokens en blok-sleutel voor een catalog-rij."""
+    title = row.get("title") or ""
+    size = extract_size(title, row.get("sales_unit_size"))
+    tokens = [
+        t for t in tokenize(f"{row.get('brand') or ''} {title}")
+        if t not in IGNORED_TOKENS and not t.isdigit() and not _SIZE_RE.fullmatch(t)
+    ]
+    tokens = list(dict.fromkeys(tokens))
+    return {"tokens": tokens, "block": size or _sizeless_block(row, tokens)}
+
+
+def _sizeless_block(row, tokens):
+    """Blok voor producten zonder grootte: "?" plus het merk, of bij een huismerk het eerste
+    woord. Eén blok "?" voor alles zou een kwadratische matrix over een groot deel van de catalogus
+    geven, met vooral onzinnige kandidaten."""
+    brand = [t for t in tokenize(row.get("brand")) if t not in IGNORED_TOKENS]
+    key = brand[0] if brand else (tokens[0] if tokens else "")
+    return f"?{key}"
+
+
+def _bucket(feature):
+    return zlib.crc32(feature.encode()) % FEATURE_DIM
+
+
+def feature_matrix(signatures):
+    """L2-genormaliseerde hashed feature-matrix (n x FEATURE_DIM) voor een lijst signatures."""
+    rows, cols, weights = [], [], []
+    for i, sig in enumerate(signatures):
+        for token in sig["tokens"]:
+            rows.append(i)
+            cols.append(_bucket("w:" + token))
+            weights.append(1.0)
+        joined = "".join(sig["tokens"])
+        for j in range(len(joined) - 2):
+            rows.append(i)
+            cols.append(_bucket("c:" + joined[j : j + 3]))
+            weights.append(TRIGRAM_WEIGHT)
+    matrix = np.zeros((len(signatures), FEATURE_DIM), dtype=np.float32)
+    if rows:
+        np.add.at(matrix, (np.asarray(rows), np.asarray(cols)), np.asarray(weights, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def score_matrix(left, right):
+    """Cosinus-similarity tussen twee lijsten rijen; paren van dezelfde retailer krijgen -1."""
+    left_sigs = [signature(r) for r in left]
+    right_sigs = [signature(r) for r in right]
+    scores = feature_matrix(left_sigs) @ feature_matrix(right_sigs).T
+    left_retailers = np.asarray([r["retailer"] for r in left])
+    right_retailers = np.asarray([r["retailer"] for r in right])
+    scores[left_retailers[:, None] == right_retailers[None, :]] = -1.0
+    return scores
+
+
+def _by_block(rows):
+    blocks = {}
+    for row in rows:
+        blocks.setdefault(signature(row)["block"], []).append(row)
+    return blocks
+
+
+def build_groups(rows):
+    """Batch: groepeer alle rijen. Retourneert product_matches-rijen (ook voor ongekoppelde producten)."""
+    out = []
+    for block, members in _by_block(rows).items():
+        group_of = {r["id"]: None for r in members}
+        score_of = {}
+        groups = {}
+        if len(members) > 1:
+            scores = score_matrix(members, members)
+            i_idx, j_idx = np.triu_indices(len(members), k=1)
+            pair_scores = scores[i_idx, j_idx]
+            keep = pair_scores >= MATCH_THRESHOLD
+            order = np.argsort(-pair_scores[keep])
+            for i, j, score in zip(i_idx[keep][order], j_idx[keep][order], pair_scores[keep][order]):
+                a, b = members[i], members[j]
+                ga, gb = group_of[a["id"]], group_of[b["id"]]
+                if ga is not None and ga == gb:
+                    continue
+                members_a = groups[ga] if ga else [a]
+                members_b = groups[gb] if gb else [b]
+                if {m["retailer"] for m in members_a} & {m["retailer"] for m in members_b}:
+                    continue
+                gid = ga or gb or str(uuid.uuid4())
+                merged = members_a + members_b
+                groups.pop(ga, None)
+                groups.pop(gb, None)
+                groups[gid] = merged
+                for m in merged:
+                    group_of[m["id"]] = gid
+                score_of[a["id"]] = max(score_of.get(a["id"], 0.0), float(score))
+                score_of[b["id"]] = max(score_of.get(b["id"], 0.0), float(score))
+        for r in members:
+            out.append(_match_row(r, block, group_of[r["id"]], score_of.get(r["id"])))
+    return out
+
+
+def _match_row(row, block, group_id, score):
+    return {
+        "product_id": row["id"],
+        "retailer": row["retailer"],
+        "match_block": block,
+        "group_id": group_id,
+        "score": round(score, 4) if score is not None else None,
+    }
+
+
+def update_matches(changed_rows):
+    """Incrementeel: scoor alleen de gewijzigde/nieuwe producten tegen hun blok en werk groepen bij."""
+    changed = [r for r in changed_rows if r.get("id") and r.get("retailer")]
+    if not changed:
+        return 0
+    changed_ids = {r["id"] for r in changed}
+    blocks = {signature(r)["block"] for r in changed}
+
+    # Oude groepen van de gewijzigde producten loskoppelen
+    previous = database.get_product_match_rows(product_ids=list(changed_ids))
+    old_groups = {m["group_id"] for m in previous if m.get("group_id")}
+    existing = database.get_product_match_rows(blocks=list(blocks), group_ids=list(old_groups))
+    existing = {m["product_id"]: m for m in existing if m["product_id"] not in changed_ids}
+
+    updates = {}
+    for gid in old_groups:
+        remaining = [m for m in existing.values() if m.get("group_id") == gid]
+        if len(remaining) == 1:
+            updates[remaining[0]["product_id"]] = {**remaining[0], "group_id": None, "score": None}
+            existing[remaining[0]["product_id"]]["group_id"] = None
+
+    candidates = database.get_catalog_rows(
+        [pid for pid, m in existing.items() if m["match_block"] in blocks], fields=MATCH_FIELDS,
+    )
+    group_retailers = {}
+    for m in existing.values():
+        if m.get("group_id"):
+            group_retailers.setdefault(m["group_id"], set()).add(m["retailer"])
+
+    left_by_block = _by_block(changed)
+    right_by_block = _by_block(candidates)
+    for block, left in left_by_block.items():
+        right = right_by_block.get(block, [])
+        assigned = {}
+        if right:
+            scores = score_matrix(left, right)
+            for i in np.argsort(-scores.max(axis=1)):
+                product = left[i]
+                for j in np.argsort(-scores[i]):
+                    score = float(scores[i, j])
+                    if score < MATCH_THRESHOLD:
+                        break
+                    other = existing[right[j]["id"]]
+                    gid = other.get("group_id")
+                    if gid and product["retailer"] in group_retailers.get(gid, ()):
+                        continue
+                    if not gid:
+                        gid = str(uuid.uuid4())
+                        other["group_id"] = gid
+                        group_retailers[gid] = {other["retailer"]}
+                        updates[other["product_id"]] = {**other, "score": round(score, 4)}
+                    group_retailers[gid].add(product["retailer"])
+                    assigned[product["id"]] = (gid, score)
+                    break
+        for product in left:
+            gid, score = assigned.get(product["id"], (None, None))
+            updates[product["id"]] = _match_row(product, block, gid, score)
+
+    database.upsert_product_matches(list(updates.values()))
+    logger.info("matching: %d producten opnieuw gescoord, %d rijen bijgewerkt", len(changed), len(updates))
+    return len(updates)
+
+
+def rebuild_all():
+    """Bouw alle matchgroepen opnieuw op uit de volledige catalogus van alle retailers."""
+    from retailers import RETAILERS
+    rows = []
+    for slug in RETAILERS:
+        rows.extend(database.iter_catalog_products(slug, fields=MATCH_FIELDS))
+    matches = build_groups(rows)
+    database.upsert_product_matches(matches)
+    grouped = sum(1 for m in matches if m["group_id"])
+    logger.info("matching: %d producten, %d gekoppeld", len(matches), grouped)
+    return matches
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    result = rebuild_all()
+    print(f"{len(result)} producten verwerkt, {sum(1 for m in result if m['group_id'])} gekoppeld.")
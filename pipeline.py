@@ -0,0 +1,230 @@
+"""Snapshot-pipeline per retailer: ophalen, verrijken en opslaan, met timings per stage.
+
+run_snapshot() is het ene pad dat de cron, de refresh-knoppen en de API gebruiken. Elke stage
+(fetch, enrich, insert_products, timeline, catalog, facets, met geneste verify, search_index en
+matching) wordt gemeten via instrumentation.stage(): duur, HTTP-requests en bytes naar de
+retailer, database round trips en geschreven rijen. De meting wordt opgeslagen in snapshot_runs,
+gekoppeld aan het snapshot, ook als de run mislukt, samen met het crawl-rapport van de fetcher
+(dekking en overlap per zoekterm of categorie, zie retailers/crawl.py).
+
+run_refresh() is de partiële refresh van één tier (scheduler.py); die wordt op dezelfde manier
+gemeten en vastgelegd, met kind "refresh" en zonder snapshot.
+
+run_all() draait alle retailers tegelijk (de cron en de refresh-all knop), elk met een eigen
+deadline: de wachttijd is die van de traagste retailer in plaats van de som, en een retailer die
+blijft hangen houdt de rest niet op. Fetch en enrich moeten INGEST_BUDGET_S vóór de deadline
+klaar zijn; anders stopt de run vóór er een snapshot wordt geschreven, zodat create_snapshot zelf
+altijd binnen de deadline valt. Op serverless bevriest de functie zodra de response verstuurd is:
+een thread die dan nog loopt, gaat pas verder bij een volgende invocation en stopt daar bij zijn
+eerstvolgende stagegrens. vercel.json geeft de functie daarom maxDuration 300 s, ruim boven
+SNAPSHOT_DEADLINE_S; verhoog die mee als de deadline omhoog gaat. Een circuit breaker slaat een retailer over
+na BREAKER_FAILURES mislukte runs op rij (volgens snapshot_runs), tot BREAKER_COOLDOWN verstreken
+is; daarna mag er weer één run proberen.
+
+Los draaien:
+  python3 pipeline.py [retailer ...]
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+import database
+import instrumentation
+from retailers import enrich_products_with_ingredients, get_fetcher
+
+logger = logging.getLogger(__name__)
+
+# Deadline per retailer in run_all; samen met de overhead binnen maxDuration in vercel.json.
+DEADLINE_S = float(os.environ.get("SNAPSHOT_DEADLINE_S", 240))
+# Tijd die vóór de deadline overblijft voor het schrijven (create_snapshot, apply_partial_refresh).
+INGEST_BUDGET_S = float(os.environ.get("SNAPSHOT_INGEST_BUDGET_S", 60))
+BREAKER_FAILURES = 3
+BREAKER_COOLDOWN = timedelta(hours=6)
+RUN_SUMMARY_FIELDS = {
+    "full": ("product_count", "snapshot_id", "duration_ms", "totals"),
+    "refresh": ("checked", "changed", "duration_ms", "totals"),
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def _check_deadline(slug, deadline):
+    """Raise DeadlineExceeded als er vóór de deadline (time.monotonic()) van de run geen
+    INGEST_BUDGET_S meer over is om de resultaten te schrijven."""
+    if deadline is not None and time.monotonic() > deadline - INGEST_BUDGET_S:
+        raise DeadlineExceeded(f"{slug}: deadline overschreden (geen {INGEST_BUDGET_S:.0f} s meer om te schrijven)")
+
+
+def _recorded_run(slug, work, kind="full", tier=None):
+    """Voer work(result) uit als gemeten run en leg die vast in snapshot_runs. work vult result
+    aan (snapshot_id, product_count en eventuele extra tellers)."""
+    run_id = database.start_snapshot_run(slug, kind=kind, tier=tier)
+    run, token = instrumentation.start_run(slug)
+    started = time.perf_counter()
+    result = {"snapshot_id": None, "product_count": 0}
+    error = None
+    try:
+        work(result)
+    except Exception as exc:
+        error = exc
+        raise
+    finally:
+        instrumentation.end_run(token)
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        totals = run.totals()
+        database.finish_snapshot_run(
+            run_id,
+            snapshot_id=result["snapshot_id"],
+            status="error" if error else "ok",
+            error=str(error) if error else None,
+            duration_ms=duration_ms,
+            product_count=result["product_count"],
+            stages=run.stages,
+            crawl=run.crawl,
+            **totals,
+        )
+        logger.info(json.dumps({
+            "event": "snapshot_run",
+            "kind": kind,
+            "tier": tier,
+            "retailer": slug,
+            "status": "error" if error else "ok",
+            "duration_ms": duration_ms,
+            "product_count": result["product_count"],
+            **totals,
+        }))
+    return {
+        **result,
+        "duration_ms": duration_ms,
+        "stages": run.stages,
+        "totals": totals,
+        "crawl": run.crawl,
+    }
+
+
+def run_snapshot(slug, deadline=None):
+    """Maak een snapshot voor één retailer. Retourneert een dict met snapshot_id, product_count,
+    duration_ms, stages en totals. Met deadline (time.monotonic()) stopt de run met
+    DeadlineExceeded na fetch of enrich als er minder dan INGEST_BUDGET_S over is. Fouten (ook NotImplementedError)
+    worden na het vastleggen van de run opnieuw geraised."""
+    def work(result):
+        fetcher = get_fetcher(slug)
+        with instrumentation.stage("fetch"):
+            products = fetcher.fetch_all_products()
+        result["product_count"] = len(products)
+        _check_deadline(slug, deadline)
+        with instrumentation.stage("enrich"):
+            enrich_products_with_ingredients(fetcher, products)
+        _check_deadline(slug, deadline)
+        result["snapshot_id"] = database.create_snapshot(products, retailer=slug)
+
+    return _recorded_run(slug, work)
+
+
+def run_refresh(slug, tier, deadline=None):
+    """Partiële refresh van één tier (zie scheduler.py), vastgelegd als run van kind "refresh"
+    zonder snapshot. product_count is het aantal gecontroleerde producten; het resultaat bevat
+    daarnaast checked, found en changed."""
+    import scheduler
+
+    def work(result):
+        counts = scheduler.refresh_tier(slug, tier, check_deadline=lambda: _check_deadline(slug, deadline))
+        result.update(counts, product_count=counts["checked"])
+
+    return _recorded_run(slug, work, kind="refresh", tier=tier)
+
+
+def _run_failed(run, now):
+    """Telt een eerdere run als mislukt voor de circuit breaker? Een run die na twee deadlines nog
+    op running staat, is in een bevroren of gestopte functie blijven hangen."""
+    if run.get("status") == "error":
+        return True
+    if run.get("status") != "running" or not run.get("started_at"):
+        return False
+    started = datetime.fromisoformat(run["started_at"].replace("Z", "+00:00"))
+    return now - started > timedelta(seconds=2 * DEADLINE_S)
+
+
+def breaker_open(slug, kind="full"):
+    """True als de laatste BREAKER_FAILURES runs van deze soort allemaal mislukt zijn en de
+    laatste minder dan BREAKER_COOLDOWN geleden begon."""
+    runs = database.get_recent_runs(slug, kind=kind, limit=BREAKER_FAILURES)
+    now = datetime.now(timezone.utc)
+    if len(runs) < BREAKER_FAILURES or not all(_run_failed(r, now) for r in runs):
+        return False
+    last = datetime.fromisoformat(runs[0]["started_at"].replace("Z", "+00:00"))
+    return now - last < BREAKER_COOLDOWN
+
+
+def run_all(slugs, tier=None, deadline_s=None):
+    """Draai run_snapshot (of met tier run_refresh) voor alle slugs tegelijk, elk in een eigen
+    thread met een eigen deadline van deadline_s (standaard DEADLINE_S) seconden. Retourneert per
+    retailer ok plus de samenvatting uit RUN_SUMMARY_FIELDS, of ok False met error (en skipped
+    voor een open circuit breaker, timed_out voor een verstreken deadline). Een run die zijn
+    deadline voorbij is, loopt op de achtergrond door tot zijn volgende stagegrens."""
+    kind = "refresh" if tier else "full"
+    deadline_s = deadline_s or DEADLINE_S
+    results = {}
+    futures = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, len(slugs)), thread_name_prefix="pipeline")
+    for slug in slugs:
+        if breaker_open(slug, kind):
+            logger.warning("%s overgeslagen: %d mislukte runs op rij", slug, BREAKER_FAILURES)
+            results[slug] = {
+                "ok": False,
+                "skipped": True,
+                "error": f"Overgeslagen na {BREAKER_FAILURES} mislukte runs op rij",
+            }
+            continue
+        deadline = time.monotonic() + deadline_s
+        if tier:
+            futures[executor.submit(run_refresh, slug, tier, deadline)] = (slug, deadline)
+        else:
+            futures[executor.submit(run_snapshot, slug, deadline)] = (slug, deadline)
+    wait(futures, timeout=max((d for _, d in futures.values()), default=0) - time.monotonic())
+    for future, (slug, _deadline) in futures.items():
+        if not future.done():
+            results[slug] = {"ok": False, "timed_out": True, "error": f"Geen resultaat binnen {deadline_s:.0f} s"}
+            continue
+        try:
+            run = future.result()
+        except Exception as e:
+            results[slug] = {"ok": False, "timed_out": isinstance(e, DeadlineExceeded), "error": str(e)}
+            continue
+        results[slug] = {"ok": True, **{k: run[k] for k in RUN_SUMMARY_FIELDS[kind]}}
+    executor.shutdown(wait=False)
+    return {slug: results[slug] for slug in slugs}
+
+
+if __name__ == "__main__":
+    import sys
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    from retailers import RETAILERS
+    slugs = sys.argv[1:] or [slug for slug, info in RETAILERS.items() if info["active"]]
+    for slug in slugs:
+        result = run_snapshot(slug)
+        print(f"{slug}: {result['product_count']} producten in {result['duration_ms']} ms")
+        for s in result["stages"]:
+            print(
+                f"  {s['name']:<24} {s['ms']:9.1f} ms  http {s['http_requests']:5d} ({s['http_bytes'] / 1024:9.1f} KiB)"
+                f"  db {s['db_round_trips']:5d}  rijen {s['rows_written']:6d}"
+            )
+        crawl = result["crawl"]
+        if crawl:
+            print(f"  crawl: {crawl['products']} unieke producten, {crawl['pages']} pagina's ({crawl['skipped_pages']} dubbel overgeslagen)")
+            for query, q in crawl["queries"].items():
+                print(
+                    f"    {query:<40} {q['found']:6d} gevonden ({q['coverage']:.0%})  {q['new']:6d} eerst hier"
+                    f"  {q['only_here']:6d} alleen hier  {q['pages']:4d} pagina's"
+                )
+            for pair, count in crawl["overlap"].items():
+                print(f"    overlap {pair}: {count}")
@@ -37,18 +37,23 @@ def get_fetcher(slug):
     raise ValueError(f"Onbekende retailer: {slug}")
 
 
-def verify_products_exist(slug, webshop_ids):
-    """Controleer via de retailer-API welke webshop_ids nog bestaan.
-    Retourneert set van webshop_id strings die nog bestaan.
-    Geeft een lege set terug als de retailer geen verify ondersteunt."""
+def can_verify(slug):
+    """Of de fetcher van een retailer verify_products ondersteunt."""
     try:
         fetcher = get_fetcher(slug)
     except ValueError:
-        return set()
-    fn = getattr(fetcher, "verify_products_exist", None)
-    if not callable(fn):
-        return set()
-    return fn(webshop_ids)
+        return False
+    return callable(getattr(fetcher, "verify_products", None))
+
+
+def verify_products(slug, webshop_ids):
+    """Controleer via de retailer-API welke webshop_ids nog bestaan.
+    Retourneert {webshop_id_str: bool} met alleen definitieve antwoorden; ids waarvoor de
+    retailer een fout gaf (time-out, 429, 5xx) ontbreken. Leeg als de retailer geen verify
+    ondersteunt."""
+    if not can_verify(slug):
+        return {}
+    return get_fetcher(slug).verify_products(webshop_ids)
 
 
 def enrich_products_with_ingredients(fetcher, products):
@@ -1,16 +1,27 @@
 """Albert Heijn product fetcher via de AH mobiele API."""
 import json
+import os
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 
+import instrumentation
+from retailers.crawl import Crawl, normalize_queries
+
 _token_cache = {"token": None, "expires_at": 0}
 
-API_BASE = "https://api.ah.nl"
+# AH_API_BASE overschrijft de host, bijv. voor de mock-retailers in loadtest/
+API_BASE = os.environ.get("AH_API_BASE", "https://api.ah.nl")
 AUTH_URL = f"{API_BASE}/mobile-auth/v1/auth/token/anonymous"
 SEARCH_URL = f"{API_BASE}/mobile-services/product/search/v2"
+DETAIL_URL = f"{API_BASE}/mobile-services/product/detail/v4/fir"
 GRAPHQL_URL = f"{API_BASE}/graphql"
 BATCH_SIZE = 50
+SEARCH_PAGE_SIZE = 200
+# Zoektermen voor de catalogus; pagina's van alle termen delen MAX_WORKERS gelijktijdige requests.
+QUERIES = ("brood",)
+MAX_WORKERS = 4
 
 HEADERS = {
     "User-Agent": "Appie/8.22.3",
@@ -32,6 +43,7 @@ def _curl(method, url, body=None, extra_headers=None):
     result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
     if result.returncode != 0:
         raise RuntimeError(f"curl failed: {result.stderr}")
+    instrumentation.record_http("ah", len(result.stdout))
     return json.loads(result.stdout)
 
 
@@ -46,23 +58,45 @@ def _get_token():
     return _token_cache["token"]
 
 
-def fetch_all_products(query="brood"):
-    """Haal alle broodproducten op via paginatie. Retourneert list[dict]."""
+def fetch_all_products(queries=QUERIES):
+    """Haal alle producten voor een of meer zoektermen op via paginatie, ontdubbeld op webshopId.
+    De dekking per zoekterm gaat naar de lopende snapshot-run. Retourneert list[dict]."""
     token = _get_token()
     extra = {"Authorization": f"Bearer {token}"}
 
-    all_products = []
-    page = 0
-    while True:
-        params = urlencode({"query": query, "size": 200, "page": page, "sortOn": "RELEVANCE"})
+    def fetch_page(query, page):
+        params = urlencode({"query": query, "size": SEARCH_PAGE_SIZE, "page": page, "sortOn": "RELEVANCE"})
         data = _curl("GET", f"{SEARCH_URL}?{params}", extra_headers=extra)
-        all_products.extend(data["products"])
+        return data["products"], data["page"]["totalPages"]
 
-        if page >= data["page"]["totalPages"] - 1:
-            break
-        page += 1
+    with Crawl("ah", MAX_WORKERS) as crawl:
+        crawl.paginate(normalize_queries(queries), fetch_page)
+    instrumentation.record_crawl(crawl.report())
+    return crawl.products()
 
-    return all_products
+
+def fetch_product_details(webshop_ids):
+    """Actuele gegevens van losse producten via het detail-endpoint (zelfde velden als de
+    zoekresultaten, zonder ingrediënten), voor partiële refreshes. Retourneert
+    dict[webshop_id_str, product]; producten die niet (meer) bestaan ontbreken."""
+    if not webshop_ids:
+        return {}
+    token = _get_token()
+    extra = {"Authorization": f"Bearer {token}"}
+
+    def fetch_one(wid):
+        pid = _parse_ah_product_id(wid)
+        if pid is None:
+            return str(wid), None
+        try:
+            data = _curl("GET", f"{DETAIL_URL}/{pid}", extra_headers=extra)
+        except Exception:
+            return str(wid), None
+        card = data.get("productCard") if isinstance(data, dict) else None
+        return str(wid), card if isinstance(card, dict) and card.get("webshopId") is not None else None
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        return {wid: card for wid, card in executor.map(fetch_one, webshop_ids) if card}
 
 
 def _parse_ah_product_id(webshop_id):
@@ -77,17 +111,20 @@ def _parse_ah_product_id(webshop_id):
     return int(s)
 
 
-def verify_products_exist(webshop_ids):
-    """Batch-verify via GraphQL welke producten nog bestaan. Retourneert set van webshop_id strings die bestaan."""
+def verify_products(webshop_ids):
+    """Batch-verify via GraphQL welke producten nog bestaan. Retourneert {webshop_id_str: bool}
+    met alleen definitieve antwoorden: ids van een mislukte batch ontbreken."""
     if not webshop_ids:
-        return set()
+        return {}
     token = _get_token()
     extra = {"Authorization": f"Bearer {token}"}
-    existing = set()
+    result = {}
     ids_with_key = []
     for wid in webshop_ids:
         pid = _parse_ah_product_id(wid)
-        if pid is not None:
+        if pid is None:
+            result[str(wid)] = False
+        else:
             ids_with_key.append((str(wid), pid))
     for i in range(0, len(ids_with_key), BATCH_SIZE):
         chunk = ids_with_key[i : i + BATCH_SIZE]
@@ -100,12 +137,13 @@ def verify_products_exist(webshop_ids):
             data = _curl("POST", GRAPHQL_URL, body={"query": query}, extra_headers=extra)
         except Exception:
             continue
-        gql_data = data.get("data") or {}
+        gql_data = data.get("data") if isinstance(data, dict) else None
+        if not isinstance(gql_data, dict):
+            continue
         for key_str, pid in chunk:
             node = gql_data.get(f"p{pid}")
-            if node and isinstance(node, dict) and node.get("id"):
-                existing.add(key_str)
-    return existing
+            result[key_str] = bool(node and isinstance(node, dict) and node.get("id"))
+    return result
 
 
 def fetch_ingredients(webshop_ids):
@@ -0,0 +1,135 @@
+"""Gedeelde crawl-state voor fetchers die meerdere zoektermen of categorieën doorlopen.
+
+Eén Crawl per fetch_all_products-aanroep:
+  - alle pagina's van alle zoektermen/categorieën delen één thread pool (één concurrency-budget
+    naar de retailer), in plaats van een pool of lus per zoekterm;
+  - elke pagina (sleutel naar keuze, bijv. (zoekterm, pagina) of een categorie-URL) wordt maar
+    één keer opgehaald, ook als hij via meerdere zoektermen of categorieën bereikbaar is;
+  - producten worden op webshopId ontdubbeld zodra een pagina binnenkomt; de eerste vondst wint;
+  - report() geeft per zoekterm de dekking (gevonden, als eerste gevonden, alleen hier gevonden)
+    en de overlap tussen zoektermen, voor snapshot_runs.crawl.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import combinations
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_queries(queries, ignore_case=True):
+    """Eén zoekterm of een lijst -> lijst zonder lege en dubbele termen (volgorde behouden).
+    Zoektermen worden naar kleine letters gezet; met ignore_case=False (URL-paden, zoals de
+    categorieën van Plus) blijft de schrijfwijze staan."""
+    if isinstance(queries, str):
+        queries = [queries]
+    result = []
+    for q in queries:
+        q = (q or "").strip()
+        if ignore_case:
+            q = q.lower()
+        if q and q not in result:
+            result.append(q)
+    return result
+
+
+class Crawl:
+    def __init__(self, retailer, workers):
+        self.retailer = retailer
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._pages = set()
+        self._products = {}
+        self._found_by = {}
+        self._stats = {}
+        self.skipped_pages = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown(wait=True, cancel_futures=exc[0] is not None)
+
+    def _query_stats(self, query):
+        return self._stats.setdefault(query, {"pages": 0, "results": 0, "new": 0})
+
+    def claim_page(self, key):
+        """True als de pagina nog niet is opgehaald (en nu geclaimd is), anders False."""
+        with self._lock:
+            if key in self._pages:
+                self.skipped_pages += 1
+                return False
+            self._pages.add(key)
+            return True
+
+    def add(self, query, products):
+        """Voeg de producten van één opgehaalde pagina toe. Retourneert het aantal nieuwe producten."""
+        new = 0
+        with self._lock:
+            stats = self._query_stats(query)
+            stats["pages"] += 1
+            for p in products:
+                wid = p.get("webshopId")
+                if wid is None:
+                    continue
+                wid = str(wid)
+                stats["results"] += 1
+                self._found_by.setdefault(wid, set()).add(query)
+                if wid not in self._products:
+                    self._products[wid] = p
+                    new += 1
+            stats["new"] += new
+        return new
+
+    def paginate(self, queries, fetch_page):
+        """Haal alle pagina's van alle zoektermen op via de gedeelde pool.
+        fetch_page(query, page) -> (producten, aantal pagina's). Zodra de eerste pagina van een
+        zoekterm binnen is, worden de overige pagina's ingepland. Fouten worden doorgegeven."""
+        def task(query, page):
+            if not self.claim_page((query, page)):
+                return 0
+            products, pages = fetch_page(query, page)
+            self.add(query, products)
+            return pages
+
+        for query in queries:
+            self._query_stats(query)
+        firsts = {self.executor.submit(task, q, 0): q for q in queries}
+        rest = []
+        for future in as_completed(firsts):
+            query = firsts[future]
+            rest += [self.executor.submit(task, query, page) for page in range(1, future.result())]
+        for future in rest:
+            future.result()
+
+    def products(self):
+        """Ontdubbelde producten, in volgorde van eerste vondst."""
+        with self._lock:
+            return list(self._products.values())
+
+    def report(self):
+        """Dekking per zoekterm en overlap tussen zoektermen."""
+        with self._lock:
+            total = len(self._products)
+            queries = {}
+            for query, stats in self._stats.items():
+                found = sum(1 for sources in self._found_by.values() if query in sources)
+                only = sum(1 for sources in self._found_by.values() if sources == {query})
+                queries[query] = {
+                    **stats,
+                    "found": found,
+                    "only_here": only,
+                    "coverage": round(found / total, 3) if total else 0.0,
+                }
+            overlap = {}
+            for a, b in combinations(self._stats, 2):
+                both = sum(1 for sources in self._found_by.values() if a in sources and b in sources)
+                if both:
+                    overlap[f"{a} & {b}"] = both
+            return {
+                "products": total,
+                "pages": len(self._pages),
+                "skipped_pages": self.skipped_pages,
+                "queries": queries,
+                "overlap": overlap,
+            }
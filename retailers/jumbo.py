@@ -1,12 +1,19 @@
 """Jumbo product fetcher via de Jumbo mobiele API."""
+import os
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlencode
 
-API_BASE = "https://mobileapi.jumbo.com"
+import instrumentation
+from retailers.crawl import Crawl, normalize_queries
+
+# JUMBO_API_BASE overschrijft de host, bijv. voor de mock-retailers in loadtest/
+API_BASE = os.environ.get("JUMBO_API_BASE", "https://mobileapi.jumbo.com")
 SEARCH_URL = f"{API_BASE}/v17/search"
 PRODUCT_DETAIL_URL = f"{API_BASE}/v17/products"
 MAX_WORKERS = 10
+# Zoektermen voor de catalogus; pagina's van alle termen delen MAX_WORKERS gelijktijdige requests.
+QUERIES = ("brood",)
 
 HEADERS = {
     "User-Agent": "Jumbo/9.5.1 (Android 12)",
@@ -23,6 +30,7 @@ def _get_session():
     if _session is None:
         _session = requests.Session()
         _session.headers.update(HEADERS)
+        _session.hooks["response"].append(instrumentation.requests_hook("jumbo"))
     return _session
 
 
@@ -87,26 +95,40 @@ def _map_product(p):
     }
 
 
-def fetch_all_products(query="brood"):
-    """Haal alle broodproducten op via paginatie. Retourneert list[dict]."""
-    all_products = []
-    offset = 0
+def fetch_all_products(queries=QUERIES):
+    """Haal alle producten voor een of meer zoektermen op via paginatie, ontdubbeld op webshopId.
+    De dekking per zoekterm gaat naar de lopende snapshot-run. Retourneert list[dict]."""
+    def fetch_page(query, page):
+        params = urlencode({"q": query, "offset": page * PAGE_SIZE, "limit": PAGE_SIZE})
+        products_data = _get(f"{SEARCH_URL}?{params}").get("products", {})
+        total = products_data.get("total", 0)
+        return [_map_product(p) for p in products_data.get("data", [])], -(-total // PAGE_SIZE)
 
-    while True:
-        params = urlencode({"q": query, "offset": offset, "limit": PAGE_SIZE})
-        data = _get(f"{SEARCH_URL}?{params}")
+    with Crawl("jumbo", MAX_WORKERS) as crawl:
+        crawl.paginate(normalize_queries(queries), fetch_page)
+    instrumentation.record_crawl(crawl.report())
+    return crawl.products()
 
-        products_data = data.get("products", {})
-        items = products_data.get("data", [])
-        total = products_data.get("total", 0)
 
-        all_products.extend(_map_product(p) for p in items)
+def _detail_node(data):
+    node = data.get("product", {}).get("data", data.get("product", data))
+    return node if isinstance(node, dict) else None
 
-        offset += PAGE_SIZE
-        if offset >= total:
-            break
 
-    return all_products
+def _ingredients_from_detail(node):
+    """Ingrediënten als tekst uit een product-detailresponse, of None."""
+    ingredient_info = node.get("ingredientInfo")
+    if not isinstance(ingredient_info, list) or not ingredient_info:
+        return None
+    first = ingredient_info[0]
+    ingredients_list = first.get("ingredients")
+    if not isinstance(ingredients_list, list):
+        return None
+    names = []
+    for item in ingredients_list:
+        if isinstance(item, dict) and item.get("name"):
+            names.append(str(item["name"]).strip())
+    return ", ".join(names) if names else None
 
 
 def _fetch_one_ingredients(product_id):
@@ -117,47 +139,53 @@ def _fetch_one_ingredients(product_id):
         data = _get(f"{PRODUCT_DETAIL_URL}/{product_id}")
     except Exception:
         return (str(product_id), None)
-    product_node = data.get("product", {}).get("data", data.get("product", data))
-    if not isinstance(product_node, dict):
+    product_node = _detail_node(data)
+    if product_node is None:
         return (str(product_id), None)
-    ingredient_info = product_node.get("ingredientInfo")
-    if not isinstance(ingredient_info, list) or not ingredient_info:
-        return (str(product_id), None)
-    first = ingredient_info[0]
-    ingredients_list = first.get("ingredients")
-    if not isinstance(ingredients_list, list):
-        return (str(product_id), None)
-    names = []
-    for item in ingredients_list:
-        if isinstance(item, dict) and item.get("name"):
-            names.append(str(item["name"]).strip())
-    text = ", ".join(names) if names else None
-    return (str(product_id), text)
+    return (str(product_id), _ingredients_from_detail(product_node))
 
 
-def verify_products_exist(webshop_ids):
-    """Verify via product detail API welke producten nog bestaan. Retourneert set van webshop_id strings die bestaan."""
+def fetch_product_details(product_ids):
+    """Actuele gegevens (incl. ingrediënten) van losse producten via het detail-endpoint, voor
+    partiële refreshes. Retourneert dict[product_id_str, product]; producten die niet (meer)
+    bestaan ontbreken."""
+    if not product_ids:
+        return {}
+
+    def fetch_one(product_id):
+        try:
+            node = _detail_node(_get(f"{PRODUCT_DETAIL_URL}/{product_id}"))
+        except Exception:
+            return str(product_id), None
+        if not node or not node.get("id"):
+            return str(product_id), None
+        product = _map_product(node)
+        product["ingredients"] = _ingredients_from_detail(node)
+        return str(product_id), product
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        return {pid: product for pid, product in executor.map(fetch_one, product_ids) if product}
+
+
+def verify_products(webshop_ids):
+    """Verify via product detail API welke producten nog bestaan. Retourneert {webshop_id_str: bool}
+    met alleen definitieve antwoorden (gevonden of 404); time-outs en andere fouten ontbreken."""
     if not webshop_ids:
-        return set()
-    existing = set()
+        return {}
 
     def _check_one(product_id):
         try:
-            data = _get(f"{PRODUCT_DETAIL_URL}/{product_id}")
-            node = data.get("product", {}).get("data", data.get("product", data))
-            if isinstance(node, dict) and node.get("id"):
-                return str(product_id)
+            node = _detail_node(_get(f"{PRODUCT_DETAIL_URL}/{product_id}"))
+            return str(product_id), bool(node and node.get("id"))
+        except requests.HTTPError as exc:
+            if exc.response is not None and exc.response.status_code == 404:
+                return str(product_id), False
         except Exception:
             pass
-        return None
+        return str(product_id), None
 
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(_check_one, pid): pid for pid in webshop_ids}
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                existing.add(result)
-    return existing
+        return {pid: present for pid, present in executor.map(_check_one, webshop_ids) if present is not None}
 
 
 def fetch_ingredients(product_ids):
@@ -1,14 +1,24 @@
 """Plus supermarkt product fetcher via server-side rendered HTML (Googlebot prerender)."""
 import logging
+import os
 import re
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from html import unescape
 
+import instrumentation
+from retailers.crawl import Crawl, normalize_queries
+
 logger = logging.getLogger(__name__)
 
-BASE_URL = "https://www.plus.nl"
+# PLUS_BASE_URL overschrijft de host, bijv. voor de mock-retailers in loadtest/
+BASE_URL = os.environ.get("PLUS_BASE_URL", "https://www.plus.nl")
 MAIN_CATEGORY = "/producten/brood-gebak-bakproducten"
+# Hoofdcategorieën die gecrawld worden, met hun naam (mainCategory van de producten). Leaf-
+# categorieën die onder meerdere hoofdcategorieën hangen worden één keer opgehaald.
+CATEGORIES = {
+    MAIN_CATEGORY: "Brood, gebak & bakproducten",
+}
 EXCLUDED_SUBCATEGORIES = (
     "bakproducten",
     "luxe-cake-en-koek",
@@ -34,6 +44,7 @@ def _get_session():
     if _session is None:
         _session = requests.Session()
         _session.headers.update(HEADERS)
+        _session.hooks["response"].append(instrumentation.requests_hook("plus"))
     return _session
 
 
@@ -44,7 +55,7 @@ def _fetch_html(url):
     return resp.text
 
 
-def _parse_product_list(html):
+def _parse_product_list(html, main_category=CATEGORIES[MAIN_CATEGORY]):
     """Parse product links, titles, prices, images and bonus from a PLP page."""
     products = []
 
@@ -110,7 +121,7 @@ def _parse_product_list(html):
             "salesUnitSize": _extract_unit(slug),
             "priceBeforeBonus": prev_price if is_bonus else price,
             "unitPriceDescription": None,
-            "mainCategory": "Brood, gebak & bakproducten",
+            "mainCategory": main_category,
             "subCategory": None,
             "nutriscore": None,
             "isBonus": is_bonus,
@@ -146,18 +157,18 @@ def _extract_unit(slug):
     return None
 
 
-def _discover_leaf_categories():
-    """Ontdek alle leaf-subcategorieën van de broodcategorie."""
-    url = f"{BASE_URL}{MAIN_CATEGORY}"
+def _discover_leaf_categories(category=MAIN_CATEGORY):
+    """Ontdek alle leaf-subcategorieën van een hoofdcategorie. Retourneert (leaves, html)."""
+    url = f"{BASE_URL}{category}"
     html = _fetch_html(url)
     all_cats = list(set(re.findall(
-        rf'href="({re.escape(MAIN_CATEGORY)}/[^"]+)"', html
+        rf'href="({re.escape(category)}/[^"]+)"', html
     )))
     all_cats.sort()
 
     leaves = []
     for cat in all_cats:
-        segment = cat.replace(MAIN_CATEGORY + "/", "").split("/")[0]
+        segment = cat.replace(category + "/", "").split("/")[0]
         if segment in EXCLUDED_SUBCATEGORIES:
             continue
         is_parent = any(
@@ -168,38 +179,44 @@ def _discover_leaf_categories():
     return leaves, html
 
 
-def _scrape_category(url):
+def _scrape_category(url, main_category=CATEGORIES[MAIN_CATEGORY]):
     """Scrape een enkele categorie-URL en retourneer producten."""
     try:
         html = _fetch_html(url)
-        return _parse_product_list(html)
+        return _parse_product_list(html, main_category)
     except Exception as exc:
         logger.warning("Plus: fout bij ophalen %s: %s", url, exc)
         return []
 
 
-def fetch_all_products(query="brood"):
-    """Haal alle broodproducten op via alle subcategorieën. Retourneert list[dict]."""
-    logger.info("Plus: ontdekken subcategorieën van %s", MAIN_CATEGORY)
-    leaves, main_html = _discover_leaf_categories()
-    logger.info("Plus: %d leaf-categorieën gevonden", len(leaves))
+def fetch_all_products(categories=None):
+    """Haal alle producten op uit de leaf-subcategorieën van een of meer hoofdcategorieën
+    (standaard CATEGORIES), ontdubbeld op webshopId. Alle pagina's delen MAX_WORKERS gelijktijdige
+    requests; de dekking per hoofdcategorie gaat naar de lopende snapshot-run. Retourneert list[dict]."""
+    categories = normalize_queries(categories or list(CATEGORIES), ignore_case=False)
 
-    seen = {}
-    main_products = _parse_product_list(main_html)
-    for p in main_products:
-        seen[p["webshopId"]] = p
+    with Crawl("plus", MAX_WORKERS) as crawl:
+        def scrape_leaf(category, url):
+            if crawl.claim_page(url):
+                crawl.add(category, _scrape_category(url, CATEGORIES.get(category)))
 
-    urls = [f"{BASE_URL}{cat}" for cat in leaves]
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(_scrape_category, url): url for url in urls}
-        for future in as_completed(futures):
-            for p in future.result():
-                if p["webshopId"] not in seen:
-                    seen[p["webshopId"]] = p
+        def discover(category):
+            logger.info("Plus: ontdekken subcategorieën van %s", category)
+            crawl.claim_page(f"{BASE_URL}{category}")
+            leaves, main_html = _discover_leaf_categories(category)
+            crawl.add(category, _parse_product_list(main_html, CATEGORIES.get(category)))
+            logger.info("Plus: %d leaf-categorieën gevonden in %s", len(leaves), category)
+            return [crawl.executor.submit(scrape_leaf, category, f"{BASE_URL}{cat}") for cat in leaves]
 
-    products = list(seen.values())
+        discoveries = [crawl.executor.submit(discover, category) for category in categories]
+        for future in discoveries:
+            for leaf in future.result():
+                leaf.result()
+
+    products = crawl.products()
     for p in products:
         _slug_cache[p["webshopId"]] = p.get("_plus_slug", "")
+    instrumentation.record_crawl(crawl.report())
 
     logger.info("Plus: %d unieke producten opgehaald", len(products))
     return products
@@ -260,29 +277,54 @@ def _fetch_one_ingredients(product_id):
     return (pid, detail.get("ingredients"))
 
 
-def verify_products_exist(webshop_ids):
-    """Verify via product detail page welke producten nog bestaan. Retourneert set van webshop_id strings."""
+def fetch_product_details(product_ids):
+    """Actuele prijs, bonus en ingrediënten van losse producten via de PDP, voor partiële
+    refreshes. Zonder bekende slug werkt /product/x-<sku> ook. Retourneert
+    dict[product_id_str, product]; producten zonder prijs op de PDP ontbreken."""
+    if not product_ids:
+        return {}
+
+    def fetch_one(product_id):
+        pid = str(product_id)
+        detail = _fetch_product_detail(_slug_cache.get(pid) or f"x-{pid}")
+        if not detail or detail.get("price") is None:
+            return pid, None
+        previous = detail.get("previousPrice")
+        return pid, {
+            "webshopId": pid,
+            "priceBeforeBonus": previous if previous is not None else detail["price"],
+            "isBonus": previous is not None,
+            "ingredients": detail.get("ingredients"),
+        }
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        return {pid: product for pid, product in executor.map(fetch_one, product_ids) if product}
+
+
+def verify_products(webshop_ids):
+    """Verify via product detail page welke producten nog bestaan. Retourneert {webshop_id_str: bool}
+    met alleen definitieve antwoorden; time-outs, 429 en 5xx ontbreken."""
     if not webshop_ids:
-        return set()
-    existing = set()
+        return {}
 
     def _check_one(product_id):
+        # /product/x-<sku> redirect naar de canonieke PDP of naar pagina-niet-gevonden; de
+        # Location is genoeg, zonder de redirect (en de hele PDP) op te halen.
         url = f"{BASE_URL}/product/x-{product_id}"
         try:
-            resp = _get_session().get(url, timeout=REQUEST_TIMEOUT, allow_redirects=True)
-            if resp.status_code == 200 and "pagina-niet-gevonden" not in resp.url:
-                return str(product_id)
+            resp = _get_session().get(url, timeout=REQUEST_TIMEOUT, allow_redirects=False)
         except Exception:
-            pass
-        return None
+            return str(product_id), None
+        if resp.is_redirect:
+            return str(product_id), "pagina-niet-gevonden" not in resp.headers.get("Location", "")
+        if resp.status_code == 200:
+            return str(product_id), True
+        if resp.status_code in (404, 410):
+            return str(product_id), False
+        return str(product_id), None
 
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(_check_one, pid): pid for pid in webshop_ids}
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                existing.add(result)
-    return existing
+        return {pid: present for pid, present in executor.map(_check_one, webshop_ids) if present is not None}
 
 
 def fetch_ingredients(product_ids):
@@ -0,0 +1,113 @@
+"""Getrapte refresh: vaak veranderende producten vaker verversen dan de rest.
+
+classify() deelt na elke volledige crawl de beschikbare producten van een retailer in op basis
+van product_history over de laatste CLASSIFY_DAYS dagen:
+  hot   minstens HOT_MIN_CHANGES prijs- of bonuswijzigingen, of nu in de bonus;
+  warm  minstens één prijs- of bonuswijziging, of nieuw in het venster;
+  cold  de rest: alleen de volledige crawl.
+refresh_tier() haalt de hot of warm producten die langer dan de maximale leeftijd van hun tier
+niet gezien of gecontroleerd zijn op via het detail-endpoint van de retailer
+(fetch_product_details) in plaats van de hele categorie te crawlen. Wijzigingen gaan als
+product_history zonder snapshot naar de catalog (database.apply_partial_refresh); er ontstaat
+geen snapshot, dus timeline_events en snapshot-diffs blijven van volledige crawl tot volledige
+crawl. De volledige crawl kan daardoor een paar keer per week in plaats van dagelijks.
+
+Los draaien:
+  python3 scheduler.py classify [retailer ...]
+  python3 scheduler.py hot|warm [retailer ...]
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import database
+import instrumentation
+from retailers import get_fetcher
+
+logger = logging.getLogger(__name__)
+
+CLASSIFY_DAYS = 28
+HOT_MIN_CHANGES = 2
+# Maximale leeftijd (sinds laatst gezien of gecontroleerd) voordat een product opnieuw wordt opgehaald.
+TIERS = {
+    "hot": timedelta(hours=4),
+    "warm": timedelta(hours=24),
+}
+# Marge op de maximale leeftijd: een product dat de vorige cron-run (precies een tier-leeftijd
+# geleden) gecontroleerd werd, moet nu weer aan de beurt zijn.
+CHECK_GRACE = timedelta(minutes=30)
+# Bovengrens per partiële refresh; de rest komt bij de volgende run (langst niet gecontroleerd eerst).
+MAX_PARTIAL_PRODUCTS = 500
+CATALOG_FIELDS = ("id", "refresh_tier", "is_bonus", "first_seen_at")
+
+
+def _tier(changes, is_bonus, is_new):
+    if changes >= HOT_MIN_CHANGES or is_bonus:
+        return "hot"
+    if changes or is_new:
+        return "warm"
+    return "cold"
+
+
+def classify(retailer, now=None):
+    """Bepaal de refresh tier van alle beschikbare producten en schrijf de gewijzigde tiers.
+    Retourneert het aantal producten per tier."""
+    now = now or datetime.now(timezone.utc)
+    since = (now - timedelta(days=CLASSIFY_DAYS)).isoformat()
+    changes = Counter(
+        h["product_id"]
+        for h in database.iter_product_history(retailer, since=since, columns="product_id, changes")
+        if "price" in (h.get("changes") or {}) or "bonus" in (h.get("changes") or {})
+    )
+    counts = Counter()
+    changed = {}
+    catalog = database.iter_catalog_products(retailer, filters={"is_available": True}, fields=CATALOG_FIELDS)
+    for row in catalog:
+        is_new = (row.get("first_seen_at") or "") >= since
+        tier = _tier(changes[row["id"]], bool(row.get("is_bonus")), is_new)
+        counts[tier] += 1
+        if row.get("refresh_tier") != tier:
+            changed[row["id"]] = tier
+    database.update_refresh_tiers(changed)
+    logger.info("refresh tiers %s: %s (%d gewijzigd)", retailer, dict(counts), len(changed))
+    return dict(counts)
+
+
+def refresh_tier(retailer, tier, now=None, limit=MAX_PARTIAL_PRODUCTS, check_deadline=None):
+    """Partiële refresh van één tier. Retourneert checked, found en changed. check_deadline wordt
+    na het ophalen aangeroepen en kan de refresh afbreken voordat er iets geschreven wordt."""
+    if tier not in TIERS:
+        raise ValueError(f"Onbekende refresh tier: {tier}")
+    now = now or datetime.now(timezone.utc)
+    candidates = database.get_refresh_candidates(retailer, tier, now - TIERS[tier] + CHECK_GRACE, limit)
+    details = {}
+    if candidates:
+        fetcher = get_fetcher(retailer)
+        with instrumentation.stage("fetch"):
+            details = fetcher.fetch_product_details([c["webshop_id"] for c in candidates])
+    if check_deadline:
+        check_deadline()
+    with instrumentation.stage("catalog"):
+        history = database.apply_partial_refresh(retailer, candidates, details, checked_at=now)
+    return {"checked": len(candidates), "found": len(details), "changed": len(history)}
+
+
+if __name__ == "__main__":
+    import sys
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    from retailers import RETAILERS
+    command = sys.argv[1] if len(sys.argv) > 1 else "classify"
+    for slug in sys.argv[2:] or [slug for slug, info in RETAILERS.items() if info["active"]]:
+        if command == "classify":
+            print(f"{slug}: {classify(slug)}")
+        else:
+            import pipeline
+            result = pipeline.run_refresh(slug, command)
+            print(
+                f"{slug} ({command}): {result['checked']} gecontroleerd, {result['changed']} gewijzigd"
+                f" in {result['duration_ms']} ms, http {result['totals']['http_requests']}"
+            )
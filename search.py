@@ -0,0 +1,300 @@
+"""In-process zoekindex over product_catalog (titel, merk, ingrediënten, categorie).
+
+Inverted index met trigram-fuzzy matching en prefix-autocomplete. De index wordt bij de
+eerste zoekopdracht op de achtergrond opgebouwd uit product_catalog en daarna incrementeel
+bijgewerkt met de rijen die _update_catalog_and_history aanraakt. Zolang de index nog niet
+klaar is, valt search() terug op de pg_trgm-functie search_products in Postgres.
+
+Een ingest in een ander proces ziet deze index niet; daarom onthoudt de index de externe generatie
+(database.get_external_generation) waarop hij gebouwd is en wordt hij opnieuw opgebouwd zodra die
+verandert. Schrijfpaden in dit proces werken de index zelf bij en veranderen die generatie niet,
+dus een ingest hier leidt niet tot een volledige herbouw. Een nieuwe index vervangt de oude pas
+als hij volledig geladen is.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Veld -> gewicht in de score
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "brand": 2.0,
+    "sub_category": 1.5,
+    "main_category": 1.0,
+    "ingredients": 0.5,
+}
+# Velden die in een zoekresultaat worden teruggegeven
+RESULT_FIELDS = (
+    "id", "retailer", "webshop_id", "title", "brand", "price", "image_url",
+    "sub_category", "is_available",
+)
+INDEX_FIELDS = tuple(dict.fromkeys(RESULT_FIELDS + tuple(FIELD_WEIGHTS)))
+
+FUZZY_MIN_SIMILARITY = 0.45
+FUZZY_MAX_TERMS = 8
+PREFIX_MAX_TERMS = 50
+# Wachttijd na een mislukte opbouw voordat het opnieuw geprobeerd wordt.
+BUILD_RETRY_SECONDS = 60
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """Kleine letters, zonder accenten (ë -> e)."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def _trigrams(term):
+    padded = f"  {term} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Inverted index: term -> {product_id: gewicht}, plus trigram -> termen voor fuzzy matching."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}
+        self._postings = {}
+        self._trigrams = {}
+        self._sorted_terms = []
+        self._terms_dirty = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    def upsert(self, rows):
+        """Voeg rijen toe of werk ze bij. Elke rij heeft minstens een id."""
+        with self._lock:
+            for row in rows:
+                product_id = row.get("id")
+                if not product_id:
+                    continue
+                old = self._docs.get(product_id)
+                merged = {**(old["row"] if old else {}), **{k: row[k] for k in INDEX_FIELDS if k in row}}
+                self._remove(product_id)
+                self._add(product_id, merged)
+
+    def remove(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+
+    def _add(self, product_id, row):
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(row.get(field)):
+                terms[term] = max(terms.get(term, 0.0), weight)
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                for gram in _trigrams(term):
+                    self._trigrams.setdefault(gram, set()).add(term)
+                self._terms_dirty = True
+            postings[product_id] = weight
+        self._docs[product_id] = {"row": row, "terms": terms}
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if not doc:
+            return
+        for term in doc["terms"]:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                for gram in _trigrams(term):
+                    terms = self._trigrams.get(gram)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._trigrams[gram]
+                self._terms_dirty = True
+
+    def _terms_with_prefix(self, prefix, limit):
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._terms_dirty = False
+        i = bisect.bisect_left(self._sorted_terms, prefix)
+        out = []
+        while i < len(self._sorted_terms) and len(out) < limit:
+            term = self._sorted_terms[i]
+            if not term.startswith(prefix):
+                break
+            out.append(term)
+            i += 1
+        return out
+
+    def _fuzzy_terms(self, token):
+        """Termen met trigram-Jaccard-similarity >= FUZZY_MIN_SIMILARITY, als (term, similarity)."""
+        grams = _trigrams(token)
+        overlap = {}
+        for gram in grams:
+            for term in self._trigrams.get(gram, ()):
+                overlap[term] = overlap.get(term, 0) + 1
+        scored = []
+        for term, shared in overlap.items():
+            sim = shared / (len(grams) + len(_trigrams(term)) - shared)
+            if sim >= FUZZY_MIN_SIMILARITY:
+                scored.append((term, sim))
+        scored.sort(key=lambda ts: -ts[1])
+        return scored[:FUZZY_MAX_TERMS]
+
+    def _matches(self, token, prefix):
+        """Kandidaat-termen voor één zoekterm als {term: factor}."""
+        matches = {}
+        if token in self._postings:
+            matches[token] = 1.0
+        if prefix:
+            for term in self._terms_with_prefix(token, PREFIX_MAX_TERMS):
+                matches.setdefault(term, 0.8)
+        if not matches:
+            for term, sim in self._fuzzy_terms(token):
+                matches[term] = sim * 0.7
+        return matches
+
+    def search(self, query, retailer=None, limit=20):
+        """Zoek producten; alle zoektermen moeten matchen (de laatste ook als prefix).
+        Retourneert een lijst result-dicts met score, beste eerst."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            scores = None
+            for i, token in enumerate(tokens):
+                token_scores = {}
+                for term, factor in self._matches(token, prefix=i == len(tokens) - 1).items():
+                    for product_id, weight in self._postings[term].items():
+                        score = weight * factor
+                        if score > token_scores.get(product_id, 0.0):
+                            token_scores[product_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pid: s + token_scores[pid] for pid, s in scores.items() if pid in token_scores}
+                if not scores:
+                    return []
+
+            results = []
+            for product_id, score in scores.items():
+                row = self._docs[product_id]["row"]
+                if retailer and row.get("retailer") != retailer:
+                    continue
+                if row.get("is_available") is False:
+                    score *= 0.5
+                results.append({**{k: row.get(k) for k in RESULT_FIELDS}, "score": round(score, 3)})
+        results.sort(key=lambda r: (-r["score"], r.get("title") or ""))
+        return results[:limit]
+
+    def autocomplete(self, prefix, limit=10):
+        """Vul de laatste term van prefix aan; termen die in de meeste producten voorkomen eerst."""
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+        head = " ".join(tokens[:-1])
+        with self._lock:
+            terms = self._terms_with_prefix(tokens[-1], PREFIX_MAX_TERMS * 4)
+            terms.sort(key=lambda t: (-len(self._postings[t]), t))
+        return [f"{head} {term}".strip() for term in terms[:limit]]
+
+
+_index = SearchIndex()
+_state = {"ready": False, "building": False, "generation": None, "pending": [], "failed_at": None}
+_state_lock = threading.Lock()
+
+
+def _build():
+    """Bouw een nieuwe index op uit product_catalog van alle retailers en wissel hem pas in als
+    alles geladen is; bij een fout blijft de vorige index (of de database-fallback) in gebruik."""
+    global _index
+    from retailers import RETAILERS
+    generation = database.get_external_generation()
+    index = SearchIndex()
+    try:
+        count = 0
+        for slug in RETAILERS:
+            batch = []
+            for row in database.iter_catalog_products(slug, fields=INDEX_FIELDS):
+                batch.append(row)
+                if len(batch) >= database.PAGE_SIZE:
+                    index.upsert(batch)
+                    count += len(batch)
+                    batch = []
+            index.upsert(batch)
+            count += len(batch)
+    except Exception as exc:
+        logger.warning("zoekindex opbouwen mislukt: %s", exc)
+        with _state_lock:
+            _state.update(building=False, pending=[], failed_at=time.monotonic())
+        return
+    with _state_lock:
+        # Rijen die tijdens het laden door een ingest zijn bijgewerkt.
+        index.upsert(_state["pending"])
+        _index = index
+        _state.update(ready=True, building=False, generation=generation, pending=[], failed_at=None)
+    logger.info("zoekindex opgebouwd: %d producten", count)
+
+
+def _stale():
+    """Is de index gebouwd vóór een wijziging uit een ander proces?"""
+    return _state["generation"] != database.get_external_generation()
+
+
+def ensure_index():
+    """Start het (opnieuw) opbouwen van de index op de achtergrond als hij er nog niet is of
+    achterloopt op wijzigingen uit een ander proces."""
+    failed_at = _state["failed_at"]
+    if failed_at is not None and time.monotonic() - failed_at < BUILD_RETRY_SECONDS:
+        return
+    stale = not _state["ready"] or _stale()
+    with _state_lock:
+        if _state["building"] or not stale:
+            return
+        _state["building"] = True
+    threading.Thread(target=_build, name="search-index-build", daemon=True).start()
+
+
+def index_products(rows):
+    """Werk de index bij met catalog-rijen die dit proces heeft geschreven (ingest, partiële
+    refresh, lazy aangemaakte rijen)."""
+    if not rows:
+        return
+    with _state_lock:
+        if _state["building"]:
+            _state["pending"].extend(rows)
+        index = _index if _state["ready"] else None
+    if index is not None:
+        index.upsert(rows)
+
+
+def search(query, retailer=None, limit=20):
+    """Zoek in de catalogus. Retourneert (results, source) met source 'index' of 'database'.
+    Een verouderde index blijft antwoorden terwijl de nieuwe op de achtergrond wordt opgebouwd."""
+    ensure_index()
+    if _state["ready"]:
+        return _index.search(query, retailer=retailer, limit=limit), "index"
+    return database.search_catalog(query, retailer=retailer, limit=limit), "database"
+
+
+def autocomplete(prefix, limit=10):
+    """Suggesties voor een zoekprefix. Retourneert (suggestions, source)."""
+    ensure_index()
+    if _state["ready"]:
+        return _index.autocomplete(prefix, limit=limit), "index"
+    titles = [r["title"] for r in database.search_catalog(prefix, limit=limit) if r.get("title")]
+    return list(dict.fromkeys(titles)), "database"
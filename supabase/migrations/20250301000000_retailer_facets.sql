@@ -0,0 +1,18 @@
+-- Facet-index per retailer: aantallen per merk, subcategorie, nutriscore, bonus en prijsklasse.
+-- Wordt bij elke snapshot opnieuw berekend door create_snapshot.
+create table if not exists retailer_facets (
+  retailer text primary key,
+  snapshot_id uuid references snapshots(id) on delete set null,
+  facets jsonb not null default '{}'::jsonb,
+  updated_at timestamptz default now()
+);
+
+-- Indexes voor server-side facet-filters op product_catalog
+create index if not exists product_catalog_retailer_brand_idx on product_catalog(retailer, brand);
+create index if not exists product_catalog_retailer_sub_category_idx on product_catalog(retailer, sub_category);
+create index if not exists product_catalog_retailer_price_idx on product_catalog(retailer, price);
+
+-- RLS
+alter table retailer_facets enable row level security;
+drop policy if exists "Allow all for anon" on retailer_facets;
+create policy "Allow all for anon" on retailer_facets for all using (true) with check (true);
@@ -0,0 +1,14 @@
+-- Indexes voor server-side paginatie, sortering en tekstfilter op product_catalog.
+-- Keyset-paginatie sorteert op (kolom, id) binnen een retailer.
+create extension if not exists pg_trgm;
+
+drop index if exists product_catalog_retailer_price_idx;
+create index if not exists product_catalog_retailer_title_id_idx on product_catalog(retailer, title, id);
+create index if not exists product_catalog_retailer_price_id_idx on product_catalog(retailer, price, id);
+create index if not exists product_catalog_retailer_last_seen_id_idx on product_catalog(retailer, last_seen_at, id);
+create index if not exists product_catalog_retailer_price_desc_id_idx on product_catalog(retailer, price desc nulls last, id);
+create index if not exists product_catalog_retailer_last_seen_desc_id_idx on product_catalog(retailer, last_seen_at desc nulls last, id);
+
+-- Tekstfilter (q=): ilike '%term%' op titel en merk
+create index if not exists product_catalog_title_trgm_idx on product_catalog using gin (title gin_trgm_ops);
+create index if not exists product_catalog_brand_trgm_idx on product_catalog using gin (brand gin_trgm_ops);
@@ -0,0 +1,39 @@
+-- Zoeken in product_catalog met pg_trgm (terugval voor de in-process zoekindex).
+create extension if not exists pg_trgm;
+
+create index if not exists product_catalog_ingredients_trgm_idx on product_catalog using gin (ingredients gin_trgm_ops);
+
+create or replace function search_products(q text, retailer_filter text default null, max_results int default 20)
+returns table (
+  id uuid,
+  retailer text,
+  webshop_id text,
+  title text,
+  brand text,
+  price numeric,
+  image_url text,
+  sub_category text,
+  is_available boolean,
+  score real
+)
+language sql
+stable
+as $$
+  select
+    c.id, c.retailer, c.webshop_id, c.title, c.brand, c.price, c.image_url, c.sub_category, c.is_available,
+    greatest(
+      word_similarity(q, coalesce(c.title, '')),
+      word_similarity(q, coalesce(c.brand, '')) * 0.8,
+      word_similarity(q, coalesce(c.ingredients, '')) * 0.4
+    ) as score
+  from product_catalog c
+  where (retailer_filter is null or c.retailer = retailer_filter)
+    and (
+      q <% c.title
+      or q <% c.brand
+      or q <% c.ingredients
+      or c.title ilike '%' || q || '%'
+    )
+  order by score desc, c.title
+  limit max_results;
+$$;
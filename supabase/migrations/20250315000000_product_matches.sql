@@ -0,0 +1,44 @@
+-- Koppeling van gelijkwaardige producten tussen retailers (gevuld door matching.py).
+-- Een rij per gescoord product; producten met dezelfde group_id zijn gelijkwaardig.
+create table if not exists product_matches (
+  product_id uuid primary key references product_catalog(id) on delete cascade,
+  retailer text not null,
+  match_block text not null,
+  group_id uuid,
+  score real,
+  updated_at timestamptz default now()
+);
+
+create index if not exists product_matches_group_idx on product_matches(group_id);
+create index if not exists product_matches_block_idx on product_matches(match_block);
+
+-- Alle producten uit de groep van pid, goedkoopste eerst (één lookup voor prijsvergelijking)
+create or replace function product_match_group(pid uuid)
+returns table (
+  id uuid,
+  retailer text,
+  webshop_id text,
+  title text,
+  brand text,
+  price numeric,
+  sales_unit_size text,
+  image_url text,
+  is_bonus boolean,
+  is_available boolean,
+  score real
+)
+language sql
+stable
+as $$
+  select c.id, c.retailer, c.webshop_id, c.title, c.brand, c.price, c.sales_unit_size,
+         c.image_url, c.is_bonus, c.is_available, m.score
+  from product_matches self
+  join product_matches m on m.group_id = self.group_id
+  join product_catalog c on c.id = m.product_id
+  where self.product_id = pid
+  order by c.price nulls last, c.retailer;
+$$;
+
+alter table product_matches enable row level security;
+drop policy if exists "Allow all for anon" on product_matches;
+create policy "Allow all for anon" on product_matches for all using (true) with check (true);
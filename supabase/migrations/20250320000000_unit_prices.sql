@@ -0,0 +1,15 @@
+-- Genormaliseerde eenheidsprijzen (€/kg, €/l, €/stuk), berekend bij ingest door unit_prices.py.
+-- Bestaande catalog-rijen vullen: python3 unit_prices.py
+alter table products add column if not exists unit_quantity numeric;
+alter table products add column if not exists unit text;
+alter table products add column if not exists price_per_unit numeric;
+
+alter table product_catalog add column if not exists unit_quantity numeric;
+alter table product_catalog add column if not exists unit text;
+alter table product_catalog add column if not exists price_per_unit numeric;
+
+-- Sorteren op eenheidsprijs binnen een retailer (keyset op (price_per_unit, id))
+create index if not exists product_catalog_retailer_price_per_unit_id_idx on product_catalog(retailer, price_per_unit, id);
+create index if not exists product_catalog_retailer_price_per_unit_desc_id_idx on product_catalog(retailer, price_per_unit desc nulls last, id);
+-- Goedkoopste per eenheid over alle retailers
+create index if not exists product_catalog_unit_price_per_unit_idx on product_catalog(unit, price_per_unit) where is_available;
@@ -0,0 +1,35 @@
+-- Laatste N history-entries en (optioneel) de prijsreeks voor een lijst producten in één query.
+-- Eén rij per product met jsonb-arrays, zodat de PostgREST max-rows limiet niet in de weg zit.
+-- Gebruikt product_history_product_created_idx (product_id, created_at desc).
+create or replace function product_batch_history(pids uuid[], per_product int default 1, with_series boolean default false)
+returns table (
+  product_id uuid,
+  history jsonb,
+  price_series jsonb
+)
+language sql
+stable
+as $$
+  select
+    p.id as product_id,
+    coalesce(latest.history, '[]'::jsonb) as history,
+    case when with_series then coalesce(series.points, '[]'::jsonb) end as price_series
+  from unnest(pids) as p(id)
+  left join lateral (
+    select jsonb_agg(to_jsonb(h) order by h.created_at desc) as history
+    from (
+      select *
+      from product_history
+      where product_history.product_id = p.id
+      order by created_at desc
+      limit per_product
+    ) h
+  ) latest on true
+  left join lateral (
+    select jsonb_agg(jsonb_build_array(s.created_at, s.price_at_snapshot) order by s.created_at) as points
+    from product_history s
+    where with_series
+      and s.product_id = p.id
+      and s.price_at_snapshot is not null
+  ) series on true;
+$$;
@@ -0,0 +1,21 @@
+-- Gematerialiseerde diffs tussen snapshots. Snapshots veranderen niet meer na het schrijven,
+-- dus een diff wordt één keer berekend (opeenvolgende snapshots al bij de ingest) en daarna
+-- via de primary key gelezen door compare_snapshots.
+create table if not exists snapshot_diffs (
+  old_snapshot_id uuid not null references snapshots(id) on delete cascade,
+  new_snapshot_id uuid not null references snapshots(id) on delete cascade,
+  new_count int not null default 0,
+  removed_count int not null default 0,
+  price_change_count int not null default 0,
+  bonus_change_count int not null default 0,
+  diff jsonb not null,
+  created_at timestamptz default now(),
+  primary key (old_snapshot_id, new_snapshot_id)
+);
+
+create index if not exists snapshot_diffs_new_snapshot_idx on snapshot_diffs(new_snapshot_id);
+
+-- RLS
+alter table snapshot_diffs enable row level security;
+drop policy if exists "Allow all for anon" on snapshot_diffs;
+create policy "Allow all for anon" on snapshot_diffs for all using (true) with check (true);
@@ -0,0 +1,72 @@
+-- Snapshot-diff in de database: full outer join op webshop_id tussen twee snapshots.
+-- Retourneert alleen gewijzigde producten, met de kolommen die de vergelijkpagina toont,
+-- als één jsonb-document in dezelfde vorm als database.compare_snapshots (plus product_counts).
+create index if not exists products_snapshot_webshop_idx on products(snapshot_id, webshop_id);
+
+create or replace function snapshot_diff(old_id uuid, new_id uuid)
+returns jsonb
+language sql
+stable
+as $$
+  with old_products as (
+    select distinct on (webshop_id) *
+    from products
+    where snapshot_id = old_id and webshop_id is not null
+    order by webshop_id, id
+  ),
+  new_products as (
+    select distinct on (webshop_id) *
+    from products
+    where snapshot_id = new_id and webshop_id is not null
+    order by webshop_id, id
+  ),
+  changed as (
+    select
+      coalesce(n.webshop_id, o.webshop_id) as webshop_id,
+      o.webshop_id is not null as in_old,
+      n.webshop_id is not null as in_new,
+      coalesce(o.price, 0) as old_price,
+      coalesce(n.price, 0) as new_price,
+      o.is_bonus as was_bonus,
+      n.is_bonus as is_bonus,
+      case when n.webshop_id is not null then jsonb_build_object(
+        'id', n.id, 'webshop_id', n.webshop_id, 'title', n.title, 'brand', n.brand, 'price', n.price,
+        'sales_unit_size', n.sales_unit_size, 'nutriscore', n.nutriscore, 'sub_category', n.sub_category,
+        'is_bonus', n.is_bonus, 'image_url', n.image_url
+      ) end as new_row,
+      case when o.webshop_id is not null then jsonb_build_object(
+        'id', o.id, 'webshop_id', o.webshop_id, 'title', o.title, 'brand', o.brand, 'price', o.price,
+        'sales_unit_size', o.sales_unit_size, 'nutriscore', o.nutriscore, 'sub_category', o.sub_category,
+        'is_bonus', o.is_bonus, 'image_url', o.image_url
+      ) end as old_row
+    from old_products o
+    full outer join new_products n on n.webshop_id = o.webshop_id
+    where o.webshop_id is null
+       or n.webshop_id is null
+       or coalesce(o.price, 0) <> coalesce(n.price, 0)
+       or o.is_bonus is distinct from n.is_bonus
+  )
+  select jsonb_build_object(
+    'new_products', coalesce(
+      (select jsonb_agg(new_row order by webshop_id) from changed where not in_old), '[]'::jsonb),
+    'removed_products', coalesce(
+      (select jsonb_agg(old_row order by webshop_id) from changed where not in_new), '[]'::jsonb),
+    'price_changes', coalesce(
+      (select jsonb_agg(jsonb_build_object(
+         'product', new_row,
+         'old_price', old_price,
+         'new_price', new_price,
+         'pct_change', case when old_price <> 0 then round((new_price - old_price) / old_price * 100, 1) else 0 end
+       ) order by webshop_id)
+       from changed where in_old and in_new and old_price <> new_price), '[]'::jsonb),
+    'bonus_changes', coalesce(
+      (select jsonb_agg(jsonb_build_object('product', new_row, 'was_bonus', was_bonus, 'is_bonus', is_bonus)
+         order by webshop_id)
+       from changed where in_old and in_new and was_bonus is distinct from is_bonus), '[]'::jsonb),
+    -- Aantal rijen per snapshot, zodat de aanroeper alleen diffs van volledige snapshots bewaart
+    'product_counts', jsonb_build_object(
+      'old', (select count(*) from products where snapshot_id = old_id),
+      'new', (select count(*) from products where snapshot_id = new_id)
+    )
+  );
+$$;
@@ -0,0 +1,27 @@
+-- Timings en tellers per snapshot-run (pipeline.run_snapshot). Ook mislukte runs worden
+-- vastgelegd; snapshot_id is dan null. stages is een lijst van
+-- {name, ms, http_requests, http_bytes, db_round_trips, rows_written}, geneste stages als "catalog/verify".
+create table if not exists snapshot_runs (
+  id uuid primary key default gen_random_uuid(),
+  snapshot_id uuid references snapshots(id) on delete set null,
+  retailer text not null,
+  status text not null default 'running',
+  error text,
+  started_at timestamptz default now(),
+  finished_at timestamptz,
+  duration_ms int,
+  product_count int,
+  stages jsonb not null default '[]'::jsonb,
+  http_requests int not null default 0,
+  http_bytes bigint not null default 0,
+  db_round_trips int not null default 0,
+  rows_written int not null default 0
+);
+
+create index if not exists snapshot_runs_snapshot_idx on snapshot_runs(snapshot_id);
+create index if not exists snapshot_runs_retailer_started_idx on snapshot_runs(retailer, started_at desc);
+
+-- RLS
+alter table snapshot_runs enable row level security;
+drop policy if exists "Allow all for anon" on snapshot_runs;
+create policy "Allow all for anon" on snapshot_runs for all using (true) with check (true);
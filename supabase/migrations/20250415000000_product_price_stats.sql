@@ -0,0 +1,35 @@
+-- Prijsstatistieken per product (analytics.py), herberekend na elke ingest van de retailer.
+-- Vensters van 30/90/365 dagen over de dagprijzen; change_zscore is de laatste prijssprong als
+-- robuuste z-score t.o.v. de 90 dagen ervoor, is_anomaly als |change_zscore| > 3.5.
+create table if not exists product_price_stats (
+  product_id uuid primary key references product_catalog(id) on delete cascade,
+  retailer text not null,
+  price numeric,
+  min_30d numeric,
+  max_30d numeric,
+  median_30d numeric,
+  min_90d numeric,
+  max_90d numeric,
+  median_90d numeric,
+  min_365d numeric,
+  max_365d numeric,
+  median_365d numeric,
+  volatility_90d numeric,
+  bonus_share_90d numeric,
+  price_changes_365d int not null default 0,
+  last_price_change_at timestamptz,
+  days_since_change int,
+  last_change_pct numeric,
+  change_zscore numeric,
+  is_anomaly boolean not null default false,
+  computed_at timestamptz default now()
+);
+
+create index if not exists product_price_stats_anomaly_idx on product_price_stats(retailer, is_anomaly);
+create index if not exists product_price_stats_volatility_idx on product_price_stats(retailer, volatility_90d desc nulls last);
+create index if not exists product_price_stats_days_since_idx on product_price_stats(retailer, days_since_change);
+
+-- RLS
+alter table product_price_stats enable row level security;
+drop policy if exists "Allow all for anon" on product_price_stats;
+create policy "Allow all for anon" on product_price_stats for all using (true) with check (true);
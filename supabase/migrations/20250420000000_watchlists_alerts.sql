@@ -0,0 +1,41 @@
+-- Server-side watchlists: per gebruiker de gevolgde producten met een regel (zie alerts.py).
+-- Bij elke ingest zoekt _update_catalog_and_history via watchlists_product_idx de watchers van
+-- de gewijzigde producten op en schrijft de treffers naar de inbox (alerts).
+create table if not exists watchlists (
+  id uuid primary key default gen_random_uuid(),
+  user_id uuid not null references auth.users(id) on delete cascade,
+  product_id uuid not null references product_catalog(id) on delete cascade,
+  rule text not null default 'any_change'
+    check (rule in ('any_change', 'price_change', 'price_drop', 'bonus_start', 'ingredients_change')),
+  threshold_pct numeric,
+  created_at timestamptz default now(),
+  unique (user_id, product_id, rule)
+);
+
+-- Inbox: een rij per (watchlist-regel, history-entry) die matchte.
+create table if not exists alerts (
+  id uuid primary key default gen_random_uuid(),
+  user_id uuid not null references auth.users(id) on delete cascade,
+  watchlist_id uuid references watchlists(id) on delete set null,
+  product_id uuid not null references product_catalog(id) on delete cascade,
+  history_id uuid references product_history(id) on delete cascade,
+  rule text not null,
+  event_type text not null,
+  changes jsonb default '{}'::jsonb,
+  created_at timestamptz default now(),
+  read_at timestamptz,
+  unique (watchlist_id, history_id)
+);
+
+create index if not exists watchlists_product_idx on watchlists(product_id);
+create index if not exists watchlists_user_idx on watchlists(user_id, created_at desc);
+create index if not exists alerts_user_created_idx on alerts(user_id, created_at desc);
+create index if not exists alerts_user_unread_idx on alerts(user_id, created_at desc) where read_at is null;
+
+-- RLS
+alter table watchlists enable row level security;
+alter table alerts enable row level security;
+drop policy if exists "Allow all for anon" on watchlists;
+drop policy if exists "Allow all for anon" on alerts;
+create policy "Allow all for anon" on watchlists for all using (true) with check (true);
+create policy "Allow all for anon" on alerts for all using (true) with check (true);
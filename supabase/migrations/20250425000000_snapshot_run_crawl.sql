@@ -0,0 +1,3 @@
+-- Crawl-rapport per snapshot-run (retailers/crawl.py): unieke producten, opgehaalde en dubbel
+-- overgeslagen pagina's, dekking per zoekterm/categorie en overlap tussen zoektermen.
+alter table snapshot_runs add column if not exists crawl jsonb;
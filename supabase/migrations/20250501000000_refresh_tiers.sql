@@ -0,0 +1,15 @@
+-- Getrapte refresh (scheduler.py): producten krijgen een tier op basis van hoe vaak ze de
+-- afgelopen weken veranderden. Hot en warm producten worden tussen de volledige crawls door via
+-- de detail-endpoints ververst; die partiële refreshes schrijven product_history zonder snapshot.
+alter table product_history alter column snapshot_id drop not null;
+
+alter table product_catalog add column if not exists refresh_tier text not null default 'cold'
+  check (refresh_tier in ('hot', 'warm', 'cold'));
+alter table product_catalog add column if not exists last_checked_at timestamptz;
+
+create index if not exists product_catalog_retailer_tier_checked_idx
+  on product_catalog(retailer, refresh_tier, last_checked_at nulls first) where is_available;
+
+-- snapshot_runs legt ook partiële refreshes vast (kind 'refresh', zonder snapshot_id).
+alter table snapshot_runs add column if not exists kind text not null default 'full';
+alter table snapshot_runs add column if not exists tier text;
@@ -0,0 +1,15 @@
+-- Cache van verify-resultaten (verification.py): of een product dat uit de crawl verdween bij de
+-- retailer nog bestaat. Binnen de TTL (korter voor present, langer voor verdwenen producten)
+-- wordt een product niet opnieuw bij de retailer gecontroleerd.
+create table if not exists product_verifications (
+  retailer text not null,
+  webshop_id text not null,
+  present boolean not null,
+  checked_at timestamptz not null default now(),
+  primary key (retailer, webshop_id)
+);
+
+-- RLS
+alter table product_verifications enable row level security;
+drop policy if exists "Allow all for anon" on product_verifications;
+create policy "Allow all for anon" on product_verifications for all using (true) with check (true);
@@ -0,0 +1,66 @@
+-- snapshot_diff gaf alleen de kolommen van de vergelijkpagina terug; timeline-events en de
+-- catalog-update missen dan main_category, ingredients, unit_price_description en retailer.
+-- Nu alle productkolommen behalve raw_json, dezelfde vorm als de Python-diff (_diff_products).
+create or replace function snapshot_diff(old_id uuid, new_id uuid)
+returns jsonb
+language sql
+stable
+as $$
+  with old_products as (
+    select distinct on (webshop_id) *
+    from products
+    where snapshot_id = old_id and webshop_id is not null
+    order by webshop_id, id
+  ),
+  new_products as (
+    select distinct on (webshop_id) *
+    from products
+    where snapshot_id = new_id and webshop_id is not null
+    order by webshop_id, id
+  ),
+  changed as (
+    select
+      coalesce(n.webshop_id, o.webshop_id) as webshop_id,
+      o.webshop_id is not null as in_old,
+      n.webshop_id is not null as in_new,
+      coalesce(o.price, 0) as old_price,
+      coalesce(n.price, 0) as new_price,
+      o.is_bonus as was_bonus,
+      n.is_bonus as is_bonus,
+      -- Alle kolommen behalve raw_json, net als database._strip_product in de Python-diff.
+      case when n.webshop_id is not null then to_jsonb(n) - 'raw_json' end as new_row,
+      case when o.webshop_id is not null then to_jsonb(o) - 'raw_json' end as old_row
+    from old_products o
+    full outer join new_products n on n.webshop_id = o.webshop_id
+    where o.webshop_id is null
+       or n.webshop_id is null
+       or coalesce(o.price, 0) <> coalesce(n.price, 0)
+       or o.is_bonus is distinct from n.is_bonus
+  )
+  select jsonb_build_object(
+    'new_products', coalesce(
+      (select jsonb_agg(new_row order by webshop_id) from changed where not in_old), '[]'::jsonb),
+    'removed_products', coalesce(
+      (select jsonb_agg(old_row order by webshop_id) from changed where not in_new), '[]'::jsonb),
+    'price_changes', coalesce(
+      (select jsonb_agg(jsonb_build_object(
+         'product', new_row,
+         'old_price', old_price,
+         'new_price', new_price,
+         'pct_change', case when old_price <> 0 then round((new_price - old_price) / old_price * 100, 1) else 0 end
+       ) order by webshop_id)
+       from changed where in_old and in_new and old_price <> new_price), '[]'::jsonb),
+    'bonus_changes', coalesce(
+      (select jsonb_agg(jsonb_build_object('product', new_row, 'was_bonus', was_bonus, 'is_bonus', is_bonus)
+         order by webshop_id)
+       from changed where in_old and in_new and was_bonus is distinct from is_bonus), '[]'::jsonb),
+    -- Aantal rijen per snapshot, zodat de aanroeper alleen diffs van volledige snapshots bewaart
+    'product_counts', jsonb_build_object(
+      'old', (select count(*) from products where snapshot_id = old_id),
+      'new', (select count(*) from products where snapshot_id = new_id)
+    )
+  );
+$$;
+
+-- Opgeslagen diffs zijn met de oude kolommen berekend; compare_snapshots berekent ze opnieuw.
+delete from snapshot_diffs;
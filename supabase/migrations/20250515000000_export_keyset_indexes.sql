@@ -0,0 +1,5 @@
+-- Exports en analytics doorlopen product_history en timeline_events in tijdsvolgorde met een
+-- keyset op (created_at, id) (database._iter_by_time); zonder deze indexes wordt elke pagina
+-- een sortering van de hele tabel.
+create index if not exists product_history_created_id_idx on product_history(created_at, id);
+create index if not exists timeline_events_created_id_idx on timeline_events(created_at, id);
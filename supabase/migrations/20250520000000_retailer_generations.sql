@@ -0,0 +1,24 @@
+-- Data-generatie per retailer (database.get_generation): elk schrijfpad verhoogt de teller, zodat
+-- ETags en gecachte antwoorden in alle processen tegelijk verouderen, ook na een partiële
+-- refresh of een lazy aangemaakte catalog-rij zonder nieuw snapshot.
+create table if not exists retailer_generations (
+  retailer text primary key,
+  generation bigint not null default 0,
+  updated_at timestamptz default now()
+);
+
+-- Atomisch ophogen; retourneert de nieuwe generatie.
+create or replace function bump_retailer_generation(p_retailer text)
+returns bigint
+language sql
+as $$
+  insert into retailer_generations as g (retailer, generation)
+  values (p_retailer, 1)
+  on conflict (retailer) do update set generation = g.generation + 1, updated_at = now()
+  returning g.generation;
+$$;
+
+-- RLS
+alter table retailer_generations enable row level security;
+drop policy if exists "Allow all for anon" on retailer_generations;
+create policy "Allow all for anon" on retailer_generations for all using (true) with check (true);
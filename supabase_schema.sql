@@ -1,6 +1,8 @@
 -- Broodradar: Volledig schema (fresh install)
 -- Run dit in: Supabase Dashboard → SQL Editor → New query
 
+create extension if not exists pg_trgm;
+
 -- Tabel: snapshots
 create table if not exists snapshots (
   id uuid primary key default gen_random_uuid(),
@@ -34,7 +36,10 @@ create table if not exists products (
   available_online boolean default true,
   order_availability_status text,
   raw_json jsonb,
-  ingredients text
+  ingredients text,
+  unit_quantity numeric,
+  unit text,
+  price_per_unit numeric
 );
 
 -- Tabel: timeline_events
@@ -70,31 +75,356 @@ create table if not exists product_catalog (
   last_seen_at timestamptz default now(),
   created_at timestamptz default now(),
   updated_at timestamptz default now(),
+  unit_quantity numeric,
+  unit text,
+  price_per_unit numeric,
+  refresh_tier text not null default 'cold' check (refresh_tier in ('hot', 'warm', 'cold')),
+  last_checked_at timestamptz,
   unique(retailer, webshop_id)
 );
 
--- Tabel: product_history (een rij per product per snapshot)
+-- Tabel: product_history (een rij per product per snapshot; snapshot_id null bij een partiële refresh)
 create table if not exists product_history (
   id uuid primary key default gen_random_uuid(),
   product_id uuid not null references product_catalog(id) on delete cascade,
-  snapshot_id uuid not null references snapshots(id) on delete cascade,
+  snapshot_id uuid references snapshots(id) on delete cascade,
   event_type text not null,
   changes jsonb default '{}'::jsonb,
   price_at_snapshot numeric,
   created_at timestamptz default now()
 );
 
+-- Tabel: retailer_facets (facet-index per retailer, berekend bij elke snapshot)
+create table if not exists retailer_facets (
+  retailer text primary key,
+  snapshot_id uuid references snapshots(id) on delete set null,
+  facets jsonb not null default '{}'::jsonb,
+  updated_at timestamptz default now()
+);
+
+-- Tabel: product_matches (gelijkwaardige producten tussen retailers, gevuld door matching.py)
+create table if not exists product_matches (
+  product_id uuid primary key references product_catalog(id) on delete cascade,
+  retailer text not null,
+  match_block text not null,
+  group_id uuid,
+  score real,
+  updated_at timestamptz default now()
+);
+
+-- Tabel: snapshot_diffs (gematerialiseerde diffs, onveranderlijk; gelezen door compare_snapshots)
+create table if not exists snapshot_diffs (
+  old_snapshot_id uuid not null references snapshots(id) on delete cascade,
+  new_snapshot_id uuid not null references snapshots(id) on delete cascade,
+  new_count int not null default 0,
+  removed_count int not null default 0,
+  price_change_count int not null default 0,
+  bonus_change_count int not null default 0,
+  diff jsonb not null,
+  created_at timestamptz default now(),
+  primary key (old_snapshot_id, new_snapshot_id)
+);
+
+-- Tabel: snapshot_runs (timings en tellers per stage van elke snapshot-run, zie pipeline.py)
+create table if not exists snapshot_runs (
+  id uuid primary key default gen_random_uuid(),
+  snapshot_id uuid references snapshots(id) on delete set null,
+  retailer text not null,
+  status text not null default 'running',
+  error text,
+  started_at timestamptz default now(),
+  finished_at timestamptz,
+  duration_ms int,
+  product_count int,
+  stages jsonb not null default '[]'::jsonb,
+  http_requests int not null default 0,
+  http_bytes bigint not null default 0,
+  db_round_trips int not null default 0,
+  rows_written int not null default 0,
+  crawl jsonb,
+  kind text not null default 'full',
+  tier text
+);
+
+-- Tabel: product_price_stats (prijsstatistieken en anomalieën per product, gevuld door analytics.py)
+create table if not exists product_price_stats (
+  product_id uuid primary key references product_catalog(id) on delete cascade,
+  retailer text not null,
+  price numeric,
+  min_30d numeric,
+  max_30d numeric,
+  median_30d numeric,
+  min_90d numeric,
+  max_90d numeric,
+  median_90d numeric,
+  min_365d numeric,
+  max_365d numeric,
+  median_365d numeric,
+  volatility_90d numeric,
+  bonus_share_90d numeric,
+  price_changes_365d int not null default 0,
+  last_price_change_at timestamptz,
+  days_since_change int,
+  last_change_pct numeric,
+  change_zscore numeric,
+  is_anomaly boolean not null default false,
+  computed_at timestamptz default now()
+);
+
+-- Tabel: watchlists (gevolgde producten per gebruiker met een alertregel, zie alerts.py)
+create table if not exists watchlists (
+  id uuid primary key default gen_random_uuid(),
+  user_id uuid not null references auth.users(id) on delete cascade,
+  product_id uuid not null references product_catalog(id) on delete cascade,
+  rule text not null default 'any_change'
+    check (rule in ('any_change', 'price_change', 'price_drop', 'bonus_start', 'ingredients_change')),
+  threshold_pct numeric,
+  created_at timestamptz default now(),
+  unique (user_id, product_id, rule)
+);
+
+-- Tabel: alerts (inbox per gebruiker, gevuld bij de ingest)
+create table if not exists alerts (
+  id uuid primary key default gen_random_uuid(),
+  user_id uuid not null references auth.users(id) on delete cascade,
+  watchlist_id uuid references watchlists(id) on delete set null,
+  product_id uuid not null references product_catalog(id) on delete cascade,
+  history_id uuid references product_history(id) on delete cascade,
+  rule text not null,
+  event_type text not null,
+  changes jsonb default '{}'::jsonb,
+  created_at timestamptz default now(),
+  read_at timestamptz,
+  unique (watchlist_id, history_id)
+);
+
+-- Tabel: product_verifications (cache van verify-resultaten per product, zie verification.py)
+create table if not exists product_verifications (
+  retailer text not null,
+  webshop_id text not null,
+  present boolean not null,
+  checked_at timestamptz not null default now(),
+  primary key (retailer, webshop_id)
+);
+
+-- Tabel: retailer_generations (data-generatie per retailer, opgehoogd door elk schrijfpad)
+create table if not exists retailer_generations (
+  retailer text primary key,
+  generation bigint not null default 0,
+  updated_at timestamptz default now()
+);
+
 -- Indexes
 create index if not exists snapshots_retailer_idx on snapshots(retailer);
 create index if not exists products_snapshot_id_idx on products(snapshot_id);
 create index if not exists products_webshop_id_idx on products(webshop_id);
 create index if not exists products_retailer_idx on products(retailer);
+create index if not exists products_snapshot_webshop_idx on products(snapshot_id, webshop_id);
 create index if not exists timeline_events_created_idx on timeline_events(created_at desc);
+create index if not exists timeline_events_created_id_idx on timeline_events(created_at, id);
 create index if not exists timeline_events_retailer_idx on timeline_events(retailer);
 create index if not exists product_catalog_retailer_webshop_idx on product_catalog(retailer, webshop_id);
+create index if not exists product_catalog_retailer_brand_idx on product_catalog(retailer, brand);
+create index if not exists product_catalog_retailer_sub_category_idx on product_catalog(retailer, sub_category);
+create index if not exists product_catalog_retailer_title_id_idx on product_catalog(retailer, title, id);
+create index if not exists product_catalog_retailer_price_id_idx on product_catalog(retailer, price, id);
+create index if not exists product_catalog_retailer_last_seen_id_idx on product_catalog(retailer, last_seen_at, id);
+create index if not exists product_catalog_retailer_price_desc_id_idx on product_catalog(retailer, price desc nulls last, id);
+create index if not exists product_catalog_retailer_last_seen_desc_id_idx on product_catalog(retailer, last_seen_at desc nulls last, id);
+create index if not exists product_catalog_retailer_price_per_unit_id_idx on product_catalog(retailer, price_per_unit, id);
+create index if not exists product_catalog_retailer_price_per_unit_desc_id_idx on product_catalog(retailer, price_per_unit desc nulls last, id);
+create index if not exists product_catalog_unit_price_per_unit_idx on product_catalog(unit, price_per_unit) where is_available;
+create index if not exists product_catalog_retailer_tier_checked_idx on product_catalog(retailer, refresh_tier, last_checked_at nulls first) where is_available;
+create index if not exists product_catalog_title_trgm_idx on product_catalog using gin (title gin_trgm_ops);
+create index if not exists product_catalog_brand_trgm_idx on product_catalog using gin (brand gin_trgm_ops);
+create index if not exists product_catalog_ingredients_trgm_idx on product_catalog using gin (ingredients gin_trgm_ops);
+create index if not exists snapshot_diffs_new_snapshot_idx on snapshot_diffs(new_snapshot_id);
+create index if not exists snapshot_runs_snapshot_idx on snapshot_runs(snapshot_id);
+create index if not exists snapshot_runs_retailer_started_idx on snapshot_runs(retailer, started_at desc);
+create index if not exists product_matches_group_idx on product_matches(group_id);
+create index if not exists product_matches_block_idx on product_matches(match_block);
+create index if not exists product_price_stats_anomaly_idx on product_price_stats(retailer, is_anomaly);
+create index if not exists product_price_stats_volatility_idx on product_price_stats(retailer, volatility_90d desc nulls last);
+create index if not exists product_price_stats_days_since_idx on product_price_stats(retailer, days_since_change);
+create index if not exists watchlists_product_idx on watchlists(product_id);
+create index if not exists watchlists_user_idx on watchlists(user_id, created_at desc);
+create index if not exists alerts_user_created_idx on alerts(user_id, created_at desc);
+create index if not exists alerts_user_unread_idx on alerts(user_id, created_at desc) where read_at is null;
 create index if not exists product_history_product_id_idx on product_history(product_id);
 create index if not exists product_history_product_created_idx on product_history(product_id, created_at desc);
 create index if not exists product_history_snapshot_id_idx on product_history(snapshot_id);
+create index if not exists product_history_created_id_idx on product_history(created_at, id);
+
+-- Functie: zoeken met pg_trgm (terugval voor de in-process zoekindex)
+create or replace function search_products(q text, retailer_filter text default null, max_results int default 20)
+returns table (
+  id uuid,
+  retailer text,
+  webshop_id text,
+  title text,
+  brand text,
+  price numeric,
+  image_url text,
+  sub_category text,
+  is_available boolean,
+  score real
+)
+language sql
+stable
+as $$
+  select
+    c.id, c.retailer, c.webshop_id, c.title, c.brand, c.price, c.image_url, c.sub_category, c.is_available,
+    greatest(
+      word_similarity(q, coalesce(c.title, '')),
+      word_similarity(q, coalesce(c.brand, '')) * 0.8,
+      word_similarity(q, coalesce(c.ingredients, '')) * 0.4
+    ) as score
+  from product_catalog c
+  where (retailer_filter is null or c.retailer = retailer_filter)
+    and (
+      q <% c.title
+      or q <% c.brand
+      or q <% c.ingredients
+      or c.title ilike '%' || q || '%'
+    )
+  order by score desc, c.title
+  limit max_results;
+$$;
+
+-- Functie: alle producten uit de matchgroep van pid, goedkoopste eerst
+create or replace function product_match_group(pid uuid)
+returns table (
+  id uuid,
+  retailer text,
+  webshop_id text,
+  title text,
+  brand text,
+  price numeric,
+  sales_unit_size text,
+  image_url text,
+  is_bonus boolean,
+  is_available boolean,
+  score real
+)
+language sql
+stable
+as $$
+  select c.id, c.retailer, c.webshop_id, c.title, c.brand, c.price, c.sales_unit_size,
+         c.image_url, c.is_bonus, c.is_available, m.score
+  from product_matches self
+  join product_matches m on m.group_id = self.group_id
+  join product_catalog c on c.id = m.product_id
+  where self.product_id = pid
+  order by c.price nulls last, c.retailer;
+$$;
+
+-- Functie: laatste N history-entries en prijsreeks per product (batch-endpoint)
+-- Gebruikt product_history_product_created_idx (product_id, created_at desc).
+create or replace function product_batch_history(pids uuid[], per_product int default 1, with_series boolean default false)
+returns table (
+  product_id uuid,
+  history jsonb,
+  price_series jsonb
+)
+language sql
+stable
+as $$
+  select
+    p.id as product_id,
+    coalesce(latest.history, '[]'::jsonb) as history,
+    case when with_series then coalesce(series.points, '[]'::jsonb) end as price_series
+  from unnest(pids) as p(id)
+  left join lateral (
+    select jsonb_agg(to_jsonb(h) order by h.created_at desc) as history
+    from (
+      select *
+      from product_history
+      where product_history.product_id = p.id
+      order by created_at desc
+      limit per_product
+    ) h
+  ) latest on true
+  left join lateral (
+    select jsonb_agg(jsonb_build_array(s.created_at, s.price_at_snapshot) order by s.created_at) as points
+    from product_history s
+    where with_series
+      and s.product_id = p.id
+      and s.price_at_snapshot is not null
+  ) series on true;
+$$;
+
+-- Functie: generatie van een retailer atomisch ophogen, gebruikt door database.bump_generation
+create or replace function bump_retailer_generation(p_retailer text)
+returns bigint
+language sql
+as $$
+  insert into retailer_generations as g (retailer, generation)
+  values (p_retailer, 1)
+  on conflict (retailer) do update set generation = g.generation + 1, updated_at = now()
+  returning g.generation;
+$$;
+
+-- Functie: snapshot-diff (full outer join op webshop_id), gebruikt door compare_snapshots
+create or replace function snapshot_diff(old_id uuid, new_id uuid)
+returns jsonb
+language sql
+stable
+as $$
+  with old_products as (
+    select distinct on (webshop_id) *
+    from products
+    where snapshot_id = old_id and webshop_id is not null
+    order by webshop_id, id
+  ),
+  new_products as (
+    select distinct on (webshop_id) *
+    from products
+    where snapshot_id = new_id and webshop_id is not null
+    order by webshop_id, id
+  ),
+  changed as (
+    select
+      coalesce(n.webshop_id, o.webshop_id) as webshop_id,
+      o.webshop_id is not null as in_old,
+      n.webshop_id is not null as in_new,
+      coalesce(o.price, 0) as old_price,
+      coalesce(n.price, 0) as new_price,
+      o.is_bonus as was_bonus,
+      n.is_bonus as is_bonus,
+      -- Alle kolommen behalve raw_json, net als database._strip_product in de Python-diff.
+      case when n.webshop_id is not null then to_jsonb(n) - 'raw_json' end as new_row,
+      case when o.webshop_id is not null then to_jsonb(o) - 'raw_json' end as old_row
+    from old_products o
+    full outer join new_products n on n.webshop_id = o.webshop_id
+    where o.webshop_id is null
+       or n.webshop_id is null
+       or coalesce(o.price, 0) <> coalesce(n.price, 0)
+       or o.is_bonus is distinct from n.is_bonus
+  )
+  select jsonb_build_object(
+    'new_products', coalesce(
+      (select jsonb_agg(new_row order by webshop_id) from changed where not in_old), '[]'::jsonb),
+    'removed_products', coalesce(
+      (select jsonb_agg(old_row order by webshop_id) from changed where not in_new), '[]'::jsonb),
+    'price_changes', coalesce(
+      (select jsonb_agg(jsonb_build_object(
+         'product', new_row,
+         'old_price', old_price,
+         'new_price', new_price,
+         'pct_change', case when old_price <> 0 then round((new_price - old_price) / old_price * 100, 1) else 0 end
+       ) order by webshop_id)
+       from changed where in_old and in_new and old_price <> new_price), '[]'::jsonb),
+    'bonus_changes', coalesce(
+      (select jsonb_agg(jsonb_build_object('product', new_row, 'was_bonus', was_bonus, 'is_bonus', is_bonus)
+         order by webshop_id)
+       from changed where in_old and in_new and was_bonus is distinct from is_bonus), '[]'::jsonb),
+    -- Aantal rijen per snapshot, zodat de aanroeper alleen diffs van volledige snapshots bewaart
+    'product_counts', jsonb_build_object(
+      'old', (select count(*) from products where snapshot_id = old_id),
+      'new', (select count(*) from products where snapshot_id = new_id)
+    )
+  );
+$$;
 
 -- RLS policies
 alter table snapshots enable row level security;
@@ -102,14 +432,41 @@ alter table products enable row level security;
 alter table timeline_events enable row level security;
 alter table product_catalog enable row level security;
 alter table product_history enable row level security;
+alter table retailer_facets enable row level security;
+alter table product_matches enable row level security;
+alter table snapshot_diffs enable row level security;
+alter table snapshot_runs enable row level security;
+alter table product_price_stats enable row level security;
+alter table watchlists enable row level security;
+alter table alerts enable row level security;
+alter table product_verifications enable row level security;
+alter table retailer_generations enable row level security;
 
 drop policy if exists "Allow all for anon" on snapshots;
 drop policy if exists "Allow all for anon" on products;
 drop policy if exists "Allow all for anon" on timeline_events;
 drop policy if exists "Allow all for anon" on product_catalog;
 drop policy if exists "Allow all for anon" on product_history;
+drop policy if exists "Allow all for anon" on retailer_facets;
+drop policy if exists "Allow all for anon" on product_matches;
+drop policy if exists "Allow all for anon" on snapshot_diffs;
+drop policy if exists "Allow all for anon" on snapshot_runs;
+drop policy if exists "Allow all for anon" on product_price_stats;
+drop policy if exists "Allow all for anon" on watchlists;
+drop policy if exists "Allow all for anon" on alerts;
+drop policy if exists "Allow all for anon" on product_verifications;
+drop policy if exists "Allow all for anon" on retailer_generations;
 create policy "Allow all for anon" on snapshots for all using (true) with check (true);
 create policy "Allow all for anon" on products for all using (true) with check (true);
 create policy "Allow all for anon" on timeline_events for all using (true) with check (true);
 create policy "Allow all for anon" on product_catalog for all using (true) with check (true);
 create policy "Allow all for anon" on product_history for all using (true) with check (true);
+create policy "Allow all for anon" on retailer_facets for all using (true) with check (true);
+create policy "Allow all for anon" on product_matches for all using (true) with check (true);
+create policy "Allow all for anon" on snapshot_diffs for all using (true) with check (true);
+create policy "Allow all for anon" on snapshot_runs for all using (true) with check (true);
+create policy "Allow all for anon" on product_price_stats for all using (true) with check (true);
+create policy "Allow all for anon" on watchlists for all using (true) with check (true);
+create policy "Allow all for anon" on alerts for all using (true) with check (true);
+create policy "Allow all for anon" on product_verifications for all using (true) with check (true);
+create policy "Allow all for anon" on retailer_generations for all using (true) with check (true);
@@ -0,0 +1,146 @@
+"""Normalisatie van eenheidsprijzen naar numerieke kolommen.
+
+Elke retailer levert de eenheidsprijs als vrije tekst in een eigen vorm:
+  AH      sales_unit_size "800 g", unit_price_description "prijs per kg €2,99"
+  Jumbo   unit_price_description "€2.99/kg" (uit jumbo._map_product)
+  Plus    sales_unit_size "400 g" (geraden uit de slug door plus._extract_unit)
+
+normalize_rows() zet een hele snapshot in één keer om naar unit ('kg', 'l' of 'piece'),
+unit_quantity (in die eenheid) en price_per_unit (€ per kg/l/stuk). De teksten worden als
+één blok door de reguliere expressies gehaald en de rekenstappen gebeuren met NumPy-arrays.
+
+Bestaande catalog-rijen bijwerken:
+  python3 unit_prices.py
+"""
+import logging
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+UNIT_COLUMNS = ("unit_quantity", "unit", "price_per_unit")
+
+# Eenheid in de tekst -> (genormaliseerde eenheid, factor naar die eenheid)
+_UNITS = {
+    "kg": ("kg", 1.0), "kilo": ("kg", 1.0),
+    "g": ("kg", 0.001), "gr": ("kg", 0.001), "gram": ("kg", 0.001),
+    "l": ("l", 1.0), "liter": ("l", 1.0), "lt": ("l", 1.0),
+    "cl": ("l", 0.01), "ml": ("l", 0.001),
+    "st": ("piece", 1.0), "stuk": ("piece", 1.0), "stuks": ("piece", 1.0),
+    "piece": ("piece", 1.0), "pieces": ("piece", 1.0),
+}
+_UNIT_ALT = "|".join(sorted(_UNITS, key=len, reverse=True))
+_NUM = r"\d+(?:[.,]\d+)?"
+
+# Verpakkingsgrootte: "800 g", "2 x 13 stuks", "per stuk"
+_SIZE_RE = re.compile(
+    rf"^[^\n]*?(?:(?P<count>\d+)\s*x\s*)?(?P<amount>{_NUM})?\s*(?P<unit>{_UNIT_ALT})\b[^\n]*$",
+    re.MULTILINE,
+)
+# Eenheidsprijs: "€2.99/kg", "€0.45/100g" (Jumbo) of "prijs per kg €2,99" (AH)
+_UNIT_PRICE_RE = re.compile(
+    rf"^[^\n]*?(?:€\s*(?P<price_a>{_NUM})\s*/\s*(?P<per_a>{_NUM})?\s*(?P<unit_a>{_UNIT_ALT})\b"
+    rf"|per\s+(?P<per_b>{_NUM})?\s*(?P<unit_b>{_UNIT_ALT})\b\D*?(?P<price_b>{_NUM}))[^\n]*$",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+def _number(text):
+    return float(text.replace(",", ".")) if text else np.nan
+
+
+def _scan(pattern, texts, groups):
+    """Match pattern tegen alle teksten in één pass. Retourneert per groep een lijst met een waarde
+    (of None) per tekst, op dezelfde positie als in texts."""
+    cleaned = [(t or "").replace("\n", " ").lower() for t in texts]
+    joined = "\n".join(cleaned)
+    starts = np.cumsum([0] + [len(t) + 1 for t in cleaned[:-1]]) if cleaned else np.array([], dtype=int)
+    out = {g: [None] * len(texts) for g in groups}
+    for m in pattern.finditer(joined):
+        line = int(np.searchsorted(starts, m.start(), side="right") - 1)
+        for g in groups:
+            out[g][line] = m.group(g)
+    return out
+
+
+def _unit_arrays(unit_texts):
+    """Zet eenheidsteksten om naar (genormaliseerde eenheden, factoren)."""
+    units = np.array([_UNITS[u][0] if u else None for u in unit_texts], dtype=object)
+    factors = np.array([_UNITS[u][1] if u else np.nan for u in unit_texts], dtype=float)
+    return units, factors
+
+
+def normalize(sales_unit_sizes, unit_price_descriptions, prices):
+    """Vectoriseerde normalisatie van drie parallelle lijsten.
+    Retourneert (unit_quantity, unit, price_per_unit) als lijsten met None waar onbekend."""
+    price = np.array([float(p) if p is not None else np.nan for p in prices], dtype=float)
+
+    size = _scan(_SIZE_RE, sales_unit_sizes, ("count", "amount", "unit"))
+    count = np.array([_number(c) for c in size["count"]], dtype=float)
+    amount = np.array([_number(a) for a in size["amount"]], dtype=float)
+    size_units, size_factors = _unit_arrays(size["unit"])
+    # "per stuk" zonder getal betekent 1; "2 x 13 stuks" betekent 26
+    amount = np.where(np.isnan(amount) & (size_units != None), 1.0, amount)  # noqa: E711
+    quantity = np.where(np.isnan(count), 1.0, count) * amount * size_factors
+
+    up = _scan(_UNIT_PRICE_RE, unit_price_descriptions, ("price_a", "per_a", "unit_a", "price_b", "per_b", "unit_b"))
+    up_price = np.array([_number(a or b) for a, b in zip(up["price_a"], up["price_b"])], dtype=float)
+    up_per = np.array([_number(a or b) for a, b in zip(up["per_a"], up["per_b"])], dtype=float)
+    up_units, up_factors = _unit_arrays([a or b for a, b in zip(up["unit_a"], up["unit_b"])])
+    # "€0.45/100g" -> prijs per 0.1 kg -> €4.50 per kg
+    up_base = np.where(np.isnan(up_per), 1.0, up_per) * up_factors
+    with np.errstate(divide="ignore", invalid="ignore"):
+        from_description = up_price / up_base
+        from_size = price / quantity
+
+    has_description = np.isfinite(from_description) & (from_description > 0)
+    has_size = np.isfinite(from_size) & (quantity > 0)
+    per_unit = np.where(has_description, from_description, np.where(has_size, from_size, np.nan))
+    unit = np.where(has_description, up_units, np.where(has_size, size_units, None))
+    quantity = np.where(np.isfinite(quantity) & (quantity > 0), quantity, np.nan)
+    # Hoeveelheid alleen bewaren als die in dezelfde eenheid staat als de eenheidsprijs
+    quantity = np.where(has_description & (size_units != up_units), np.nan, quantity)
+
+    return (
+        [round(float(q), 4) if np.isfinite(q) else None for q in quantity],
+        list(unit),
+        [round(float(p), 4) if np.isfinite(p) else None for p in per_unit],
+    )
+
+
+def normalize_rows(rows):
+    """Vul unit_quantity, unit en price_per_unit in op snapshot- of catalog-rijen (mutates rows)."""
+    if not rows:
+        return rows
+    quantities, units, per_unit = normalize(
+        [r.get("sales_unit_size") for r in rows],
+        [r.get("unit_price_description") for r in rows],
+        [r.get("price") for r in rows],
+    )
+    for r, q, u, p in zip(rows, quantities, units, per_unit):
+        r["unit_quantity"] = q
+        r["unit"] = u
+        r["price_per_unit"] = p
+    return rows
+
+
+def backfill_catalog():
+    """Normaliseer alle bestaande product_catalog rijen opnieuw."""
+    import database
+    from retailers import RETAILERS
+    fields = ("id", "retailer", "webshop_id", "price", "sales_unit_size", "unit_price_description")
+    total = 0
+    for slug in RETAILERS:
+        rows = normalize_rows(list(database.iter_catalog_products(slug, fields=fields)))
+        database.update_catalog_unit_prices(rows)
+        total += len(rows)
+        logger.info("unit prices %s: %d rijen", slug, len(rows))
+    return total
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    print(f"{backfill_catalog()} catalog-rijen bijgewerkt.")
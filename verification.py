@@ -0,0 +1,82 @@
+"""Verificatie van verdwenen producten, gedeeld binnen één ingest en gecachet tussen ingests.
+
+Een product dat in het vorige snapshot stond maar niet in de nieuwe crawl, wordt bij de retailer
+gecontroleerd voordat het als verdwenen geldt (retailers.verify_products). Zowel
+_generate_timeline_events als _update_catalog_and_history hebben dat resultaat nodig; create_snapshot
+maakt per ingest één Verifier die beide gebruiken, zodat elk product hoogstens één keer per ingest
+wordt opgevraagd.
+
+Resultaten gaan ook naar product_verifications. Een product dat binnen de TTL al gecontroleerd
+is, wordt niet opnieuw opgevraagd: bestaande producten PRESENT_TTL, verdwenen producten
+MISSING_TTL (langer: een verdwenen product komt zelden terug, en dan staat het weer in de crawl).
+Alleen definitieve antwoorden worden opgeslagen; een product waarvoor de retailer een fout gaf
+(time-out, 429, 5xx) telt deze ingest als nog aanwezig en wordt de volgende keer opnieuw gevraagd.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+import database
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+PRESENT_TTL = timedelta(hours=24)
+MISSING_TTL = timedelta(days=7)
+
+
+def _fresh(present, checked_at, now):
+    try:
+        checked = datetime.fromisoformat(checked_at.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return False
+    if checked.tzinfo is None:
+        checked = checked.replace(tzinfo=timezone.utc)
+    return now - checked < (PRESENT_TTL if present else MISSING_TTL)
+
+
+class Verifier:
+    """Verify-resultaten van één ingest voor één retailer."""
+
+    def __init__(self, retailer, now=None):
+        self.retailer = retailer
+        self.now = now or datetime.now(timezone.utc)
+        self._present = {}
+        self.probed = 0
+        self.cache_hits = 0
+
+    def existing(self, webshop_ids):
+        """Welke webshop_ids (strings) nog bestaan. Alleen ids die deze ingest nog niet gezien
+        heeft en niet (vers) in de cache staan, gaan naar de retailer."""
+        wids = {str(w) for w in webshop_ids if w}
+        unknown = wids - self._present.keys()
+        if unknown:
+            for wid, (present, checked_at) in database.get_verifications(self.retailer, unknown).items():
+                if _fresh(present, checked_at, self.now):
+                    self._present[wid] = present
+                    self.cache_hits += 1
+            to_probe = sorted(unknown - self._present.keys())
+            if to_probe:
+                self._probe(to_probe)
+        return {w for w in wids if self._present.get(w)}
+
+    def _probe(self, wids):
+        from retailers import can_verify, verify_products
+        if not can_verify(self.retailer):
+            # Zonder verify geldt alles wat uit de crawl verdween als verdwenen (niet opgeslagen).
+            self._present.update((wid, False) for wid in wids)
+            return
+        with instrumentation.stage("verify"):
+            answers = verify_products(self.retailer, wids)
+        self.probed += len(wids)
+        failed = [wid for wid in wids if wid not in answers]
+        self._present.update(answers)
+        self._present.update((wid, True) for wid in failed)
+        checked_at = self.now.isoformat()
+        database.upsert_verifications([
+            {"retailer": self.retailer, "webshop_id": wid, "present": present, "checked_at": checked_at}
+            for wid, present in answers.items()
+        ])
+        logger.info(
+            "verify %s: %d opgevraagd (%d nog aanwezig, %d zonder antwoord), %d uit cache",
+            self.retailer, len(wids), sum(answers.values()), len(failed), self.cache_hits,
+        )